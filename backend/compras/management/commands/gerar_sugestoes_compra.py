@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from compras import reposicao
+from farmacias.models import Farmacia
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula e guarda em cache as sugestões de compra de cada farmácia ativa. '
+        'Agendar todas as noites (depois do fecho do dia).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farmacia', type=int, action='append', help='Apenas estas farmácias (id).')
+
+    def handle(self, *args, **options):
+        farmacias = Farmacia.objects.filter(is_ativa=True).order_by('id')
+        if options['farmacia']:
+            farmacias = farmacias.filter(pk__in=options['farmacia'])
+
+        motor = 'NumPy' if reposicao.np is not None else 'Python'
+        inicio = time.perf_counter()
+        total = sugestoes = 0
+        for farmacia in farmacias.iterator():
+            sugestoes += len(reposicao.sugestoes(farmacia, atualizar=True))
+            total += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Sugestões de compra de {total} farmácias recalculadas ({motor}): {sugestoes} produtos a repor "
+            f"({time.perf_counter() - inicio:.1f}s)."
+        ))
@@ -0,0 +1,232 @@
+"""
+Sugestão de compras (reposição) por farmácia.
+
+Os dados saem de duas agregações:
+- unidades vendidas por dia e produto nos últimos JANELA_DIAS (baixas por
+  lote das vendas, ou a quantidade dos itens sem baixa; pedidos cancelados
+  fora), na mesma unidade do estoque;
+- estoque vendável e `quantidade_minima` por produto (EstoqueProduto).
+Mais uma pequena consulta ao fornecedor da última entrada de cada produto,
+que dá o prazo de entrega (`Fornecedor.prazo_entrega_dias`).
+
+O cálculo é feito sobre a matriz produtos x dias de uma só vez (NumPy):
+- velocidade: média móvel exponencial das vendas diárias (meia-vida de
+  MEIA_VIDA_DIAS), que reage a mudanças recentes sem esquecer o trimestre;
+- sazonalidade semanal: fator de cada dia da semana (vendas médias desse
+  dia / média geral) para produtos com vendas regulares;
+- previsão para o prazo de entrega e para prazo + COBERTURA_DIAS;
+- estoque de segurança: o maior entre `quantidade_minima` e Z x desvio
+  diário x raiz(prazo).
+Sugere-se comprar quando o estoque não chega ao ponto de encomenda
+(previsão no prazo + segurança), a quantidade que repõe a meta.
+
+O resultado fica em cache por farmácia e é recalculado todas as noites
+pelo comando `gerar_sugestoes_compra`.
+"""
+import datetime
+import math
+
+from django.core.cache import cache
+from django.utils import timezone
+
+import numpy as np
+
+JANELA_DIAS = 90
+MEIA_VIDA_DIAS = 14
+COBERTURA_DIAS = 30
+PRAZO_ENTREGA_PADRAO = 7
+MIN_DIAS_COM_VENDA = 14  # abaixo disto o fator semanal é ruído
+Z_SERVICO = 1.65  # ~95% de nível de serviço
+TIMEOUT = 60 * 60 * 26  # até ao recálculo da noite seguinte, com folga
+
+
+def _chave(farmacia_id):
+    return f'compras:reposicao:{farmacia_id}'
+
+
+def sugestoes(farmacia, atualizar=False):
+    """Sugestões em cache para a farmácia; calcula (e guarda) se faltarem ou se `atualizar`."""
+    resultado = None if atualizar else cache.get(_chave(farmacia.id))
+    if resultado is None:
+        resultado = calcular(farmacia)
+        cache.set(_chave(farmacia.id), resultado, TIMEOUT)
+    return resultado
+
+
+def _vendas_diarias(farmacia_id, inicio, fim):
+    """
+    [(produto_id, dia, unidades)] vendidas por dia, pedidos cancelados fora.
+    Linhas com baixa por lote (ItemPedidoLote) contam as unidades baixadas; as
+    outras contam a quantidade do item, multiplicada por `unidades_por_caixa`
+    nas vendas de balcão de caixas inteiras (onde a quantidade é em caixas).
+    """
+    from django.db.models import Case, F, IntegerField, Q, Sum, When
+    from django.db.models.functions import TruncDate
+    from pedidos.models import ItemPedido, ItemPedidoLote, Pedido
+
+    filtro = dict(
+        pedido__farmacia_id=farmacia_id,
+        pedido__data_criacao__gte=inicio,
+        pedido__data_criacao__lt=fim,
+        produto_id__isnull=False,
+    )
+    baixadas = ItemPedidoLote.objects.filter(
+        **{f'item__{campo}': valor for campo, valor in filtro.items()}
+    ).exclude(
+        item__pedido__status=Pedido.StatusPedido.CANCELADO
+    ).order_by().values_list(
+        'item__produto_id', TruncDate('item__pedido__data_criacao')
+    ).annotate(total=Sum('quantidade'))
+
+    sem_baixa = ItemPedido.objects.filter(lotes__isnull=True, **filtro).exclude(
+        pedido__status=Pedido.StatusPedido.CANCELADO
+    ).order_by().values_list(
+        'produto_id', TruncDate('pedido__data_criacao')
+    ).annotate(total=Sum(Case(
+        When(Q(pedido__sessao_caixa__isnull=False, is_avulso=False),
+             then=F('quantidade') * F('produto__unidades_por_caixa')),
+        default=F('quantidade'),
+        output_field=IntegerField(),
+    )))
+    return list(baixadas) + list(sem_baixa)
+
+
+def _estoque(farmacia_id, hoje):
+    from django.db.models import Max, Q, Sum
+    from django.db.models.functions import Coalesce
+    from produtos.models import EstoqueProduto
+
+    vendavel = Q(is_disponivel=True) & (Q(data_validade__isnull=True) | Q(data_validade__gte=hoje))
+    return EstoqueProduto.objects.filter(farmacia_id=farmacia_id).order_by().values(
+        'produto_id', 'produto__nome', 'produto__unidades_por_caixa'
+    ).annotate(
+        estoque=Coalesce(Sum('quantidade', filter=vendavel), 0),
+        minimo=Max('quantidade_minima'),
+    )
+
+
+def _fornecedores(farmacia_id, produto_ids):
+    """{produto_id: dados do fornecedor da entrada mais recente}."""
+    from django.db.models import Max
+    from produtos.models import ItemEntrada
+
+    linhas = ItemEntrada.objects.filter(
+        entrada__farmacia_id=farmacia_id, produto_id__in=produto_ids
+    ).order_by().values(
+        'produto_id', 'entrada__fornecedor_id', 'entrada__fornecedor__nome_fantasia',
+        'entrada__fornecedor__razao_social', 'entrada__fornecedor__prazo_entrega_dias',
+        'entrada__fornecedor__prazo_pagamento_dias',
+    ).annotate(ultima=Max('entrada__data_entrada'))
+
+    fornecedores = {}
+    for linha in linhas:
+        atual = fornecedores.get(linha['produto_id'])
+        if atual is None or linha['ultima'] > atual['ultima']:
+            fornecedores[linha['produto_id']] = linha
+    return fornecedores
+
+
+def _previsoes(matriz, dias_semana, prazos, hoje):
+    vendas = np.asarray(matriz, dtype=float).reshape(len(matriz), JANELA_DIAS)
+    prazos = np.asarray(prazos, dtype=int)
+
+    pesos = 0.5 ** (np.arange(JANELA_DIAS - 1, -1, -1) / MEIA_VIDA_DIAS)
+    velocidade = vendas @ pesos / pesos.sum()
+    desvio = vendas.std(axis=1)
+
+    media = vendas.mean(axis=1)
+    por_dia_semana = np.stack([vendas[:, dias_semana == k].mean(axis=1) for k in range(7)], axis=1)
+    regulares = ((vendas > 0).sum(axis=1) >= MIN_DIAS_COM_VENDA) & (media > 0)
+    fatores = np.ones_like(por_dia_semana)
+    fatores[regulares] = por_dia_semana[regulares] / media[regulares, None]
+
+    # Dias de cada dia da semana no horizonte, por produto (o prazo varia com o fornecedor)
+    deslocamento = (np.arange(7) - hoje.weekday()) % 7
+
+    def previsao(horizontes):
+        semanas, resto = np.divmod(horizontes, 7)
+        contagem = semanas[:, None] + (deslocamento[None, :] < resto[:, None])
+        return velocidade * (fatores * contagem).sum(axis=1)
+
+    return (
+        velocidade.tolist(), desvio.tolist(),
+        previsao(prazos).tolist(), previsao(prazos + COBERTURA_DIAS).tolist(),
+    )
+
+
+def calcular(farmacia):
+    """Sugestões de compra da farmácia, das mais urgentes (menos dias de cobertura) para as sem vendas."""
+    from produtos.models import Produto
+
+    hoje = timezone.localdate()
+    # Janela de dias completos: de hoje - JANELA_DIAS até ontem
+    dias = [hoje - datetime.timedelta(days=JANELA_DIAS - j) for j in range(JANELA_DIAS)]
+    indice_dia = {dia: j for j, dia in enumerate(dias)}
+    inicio = timezone.make_aware(datetime.datetime.combine(dias[0], datetime.time.min))
+    fim = timezone.make_aware(datetime.datetime.combine(hoje, datetime.time.min))
+
+    estoques = {linha['produto_id']: linha for linha in _estoque(farmacia.id, hoje)}
+    vendas = {}
+    for produto_id, dia, total in _vendas_diarias(farmacia.id, inicio, fim):
+        if dia in indice_dia:
+            vendas.setdefault(produto_id, [0] * JANELA_DIAS)[indice_dia[dia]] += total
+
+    produto_ids = sorted(set(estoques) | set(vendas))
+    if not produto_ids:
+        return []
+
+    # Produtos vendidos que já não têm lote na farmácia
+    sem_estoque = [pid for pid in produto_ids if pid not in estoques]
+    for produto in Produto.objects.filter(pk__in=sem_estoque).only('id', 'nome', 'unidades_por_caixa'):
+        estoques[produto.id] = {
+            'produto_id': produto.id, 'produto__nome': produto.nome,
+            'produto__unidades_por_caixa': produto.unidades_por_caixa, 'estoque': 0, 'minimo': 0,
+        }
+
+    fornecedores = _fornecedores(farmacia.id, produto_ids)
+    prazos = [
+        fornecedores[pid]['entrada__fornecedor__prazo_entrega_dias'] if pid in fornecedores else PRAZO_ENTREGA_PADRAO
+        for pid in produto_ids
+    ]
+    matriz = [vendas.get(pid, [0] * JANELA_DIAS) for pid in produto_ids]
+    dias_semana = [dia.weekday() for dia in dias]
+
+    velocidades, desvios, no_prazo, na_meta = _previsoes(matriz, np.asarray(dias_semana), prazos, hoje)
+
+    resultado = []
+    for i, pid in enumerate(produto_ids):
+        estoque = estoques[pid]
+        atual, prazo = estoque['estoque'], prazos[i]
+        seguranca = max(estoque['minimo'], math.ceil(Z_SERVICO * desvios[i] * math.sqrt(prazo)))
+        ponto_encomenda = no_prazo[i] + seguranca
+        if atual > ponto_encomenda:
+            continue
+        quantidade = math.ceil(na_meta[i] + seguranca - atual)
+        if quantidade <= 0:
+            continue
+
+        fornecedor = fornecedores.get(pid)
+        unidades_por_caixa = estoque['produto__unidades_por_caixa'] or 1
+        resultado.append({
+            'id': pid,
+            'nome': estoque['produto__nome'],
+            'vendido_30d': sum(matriz[i][-30:]),
+            'vendido_90d': sum(matriz[i]),
+            'stock_atual': atual,
+            'quantidade_minima': estoque['minimo'],
+            'velocidade_diaria': round(velocidades[i], 2),
+            'dias_cobertura': round(atual / velocidades[i], 1) if velocidades[i] > 0 else None,
+            'prazo_entrega_dias': prazo,
+            'estoque_seguranca': seguranca,
+            'ponto_encomenda': math.ceil(ponto_encomenda),
+            'sugestao_compra': quantidade,
+            'sugestao_caixas': math.ceil(quantidade / unidades_por_caixa),
+            'fornecedor': {
+                'id': fornecedor['entrada__fornecedor_id'],
+                'nome': fornecedor['entrada__fornecedor__nome_fantasia'] or fornecedor['entrada__fornecedor__razao_social'],
+                'prazo_pagamento_dias': fornecedor['entrada__fornecedor__prazo_pagamento_dias'],
+            } if fornecedor else None,
+        })
+
+    resultado.sort(key=lambda s: (s['dias_cobertura'] is None, s['dias_cobertura'] or 0, s['nome']))
+    return resultado
@@ -1,3 +1,67 @@
-from django.test import TestCase
+import datetime
+import shutil
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import User
+from caixa.models import Caixa, SessaoCaixa
+from farmacias.models import Farmacia
+from pedidos.models import Pedido
+from pedidos.serializers import VendaBalcaoSerializer
+from produtos.models import EstoqueProduto, Produto
+
+from . import reposicao
+
+MEDIA_TESTES = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TESTES)
+class ReposicaoUnidadesTest(TestCase):
+    """A procura é contada em unidades de estoque, também nas vendas de caixas inteiras."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_TESTES, ignore_errors=True)
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(email='farmacia@teste.com', password='x', tipo_usuario='FARMACIA')
+        self.farmacia = Farmacia.objects.create(
+            usuario=self.usuario, nome='Farmácia Teste', nuit='123456789', telefone_principal='840000000',
+            email=self.usuario.email, endereco='-', bairro='-', cidade='Maputo', provincia='Maputo',
+            latitude=Decimal('-25.96'), longitude=Decimal('32.58'),
+        )
+        self.usuario = User.objects.get(pk=self.usuario.pk)
+        caixa = Caixa.objects.create(farmacia=self.farmacia, nome='Caixa 01', codigo='CX01')
+        SessaoCaixa.objects.create(caixa=caixa, operador=self.usuario, status='ABERTO')
+
+        self.produto = Produto.objects.create(
+            nome='Paracetamol 500mg', codigo_barras='560000000001', unidades_por_caixa=10
+        )
+        EstoqueProduto.objects.create(
+            farmacia=self.farmacia, produto=self.produto, lote='A', quantidade=12,
+            preco_custo=Decimal('10'), preco_venda=Decimal('30'),
+        )
+
+    def test_caixa_inteira_conta_unidades(self):
+        request = APIRequestFactory().post('/')
+        request.user = self.usuario
+        serializer = VendaBalcaoSerializer(data={
+            'tipo_pagamento': 'DINHEIRO',
+            'itens': [{'produto_id': self.produto.id, 'quantidade': 1, 'preco_unitario': '300'}],
+        }, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        pedido = serializer.save()
+        # A janela termina ontem
+        Pedido.objects.filter(pk=pedido.pk).update(data_criacao=timezone.now() - datetime.timedelta(days=1))
+
+        sugestao = next(s for s in reposicao.calcular(self.farmacia) if s['id'] == self.produto.id)
+
+        pesos = [0.5 ** ((reposicao.JANELA_DIAS - 1 - j) / reposicao.MEIA_VIDA_DIAS) for j in range(reposicao.JANELA_DIAS)]
+        self.assertEqual(sugestao['vendido_90d'], 10)
+        self.assertEqual(sugestao['stock_atual'], 2)
+        self.assertEqual(sugestao['velocidade_diaria'], round(10 * pesos[-1] / sum(pesos), 2))
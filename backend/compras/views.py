@@ -70,36 +70,15 @@ class OrdemCompraViewSet(viewsets.ModelViewSet):
     def sugerir_compras(self, request):
         """
         SUPERANDO PRIMAVERA: Inteligência de Reposição.
-        Sugere o que comprar baseado na velocidade de venda (últimos 30 dias).
+        Sugere o que comprar pela velocidade de venda (90 dias, com sazonalidade semanal),
+        estoque mínimo e prazo de entrega do fornecedor. Ver compras/reposicao.py.
+        O resultado vem do cache da noite; ?atualizar=1 recalcula na hora.
         """
-        from pedidos.models import Pedido
-        from django.db.models import Sum
-        from django.utils import timezone
-        import datetime
+        from .reposicao import sugestoes
 
-        há_30_dias = timezone.now() - datetime.timedelta(days=30)
-        
-        # Produtos que venderam nos últimos 30 dias
-        # Precisamos de ItensPedido para saber o produto
-        from pedidos.models import ItemPedido
-        vendas = ItemPedido.objects.filter(
-            pedido__farmacia=request.user.farmacia,
-            pedido__data_pedido__gte=há_30_dias
-        ).values('produto').annotate(total_venda=Sum('quantidade'))
-
-        sugestoes = []
-        for v in vendas:
-            p = Produto.objects.get(id=v['produto'])
-            stock_atual = EstoqueProduto.objects.filter(produto=p, farmacia=request.user.farmacia).aggregate(Sum('quantidade'))['quantidade__sum'] or 0
-            
-            # Se o stock atual for menor que o vendido em 30 dias (ou se tivermos uma meta de stock)
-            if stock_atual < v['total_venda']:
-                sugestoes.append({
-                    'id': p.id,
-                    'nome': p.nome,
-                    'vendido_30d': v['total_venda'],
-                    'stock_atual': stock_atual,
-                    'sugestao_compra': v['total_venda'] - stock_atual + (v['total_venda'] // 2) # Exemplo: 1.5x o giro
-                })
+        farmacia = request.user.farmacia
+        if not farmacia:
+            return Response([])
 
-        return Response(sugestoes)
+        atualizar = request.query_params.get('atualizar') in ('1', 'true')
+        return Response(sugestoes(farmacia, atualizar=atualizar))
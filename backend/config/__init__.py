@@ -0,0 +1,6 @@
+try:
+    from .celery import app as celery_app
+except ImportError:  # Celery é opcional fora de produção (RELATORIOS_EXECUTOR='thread')
+    celery_app = None
+
+__all__ = ('celery_app',)
@@ -0,0 +1,82 @@
+"""
+Cache HTTP condicional (ETag / Last-Modified / 304) para endpoints públicos.
+
+Cada tabela tem um carimbo de alteração no cache partilhado
+(`http:alteracao:<tabela>`), renovado pelos signals de save/delete
+depois do commit (antes dele, um GET concorrente guardaria o ETag novo
+com os dados antigos).
+Na falta do carimbo (cache limpo) usa-se o maior `data_atualizacao` da
+tabela, ou o instante atual se o modelo não tiver esse campo.
+
+O ETag combina os carimbos das tabelas de que a resposta depende com o
+caminho completo (inclui paginação e filtros), por isso muda sempre que
+um dado exibido muda.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from produtos.transacao import agendar_pos_commit
+
+
+def _chave(model):
+    return f'http:alteracao:{model._meta.db_table}'
+
+
+def marcar_alteracao(model):
+    """Renova o carimbo da tabela de `model` depois do commit (chamado pelos signals)."""
+    agendar_pos_commit('config.cache_http', [model], _marcar)
+
+
+def _marcar(models):
+    agora = timezone.now().timestamp()
+    for model in models:
+        cache.set(_chave(model), agora, None)
+
+
+def carimbo(model):
+    carimbo = cache.get(_chave(model))
+    if carimbo is None:
+        ultima = None
+        if any(f.name == 'data_atualizacao' for f in model._meta.get_fields()):
+            ultima = model.objects.aggregate(ultima=Max('data_atualizacao'))['ultima']
+        carimbo = (ultima or timezone.now()).timestamp()
+        cache.add(_chave(model), carimbo, None)
+        carimbo = cache.get(_chave(model), carimbo)
+    return carimbo
+
+
+class CacheCondicionalMixin:
+    """
+    Para APIViews/generics com GET público. Declarar:
+        modelos_cache = (Modelo, ...)   # tabelas de que a resposta depende
+        max_age_cache = 60              # segundos
+    Atua no dispatch, por isso vale também para views que definem o próprio get().
+    """
+    modelos_cache = ()
+    max_age_cache = 60
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        carimbos = [carimbo(model) for model in self.modelos_cache]
+        etag = '"{}"'.format(hashlib.md5(
+            '{}|{}'.format(':'.join(repr(c) for c in carimbos), request.get_full_path()).encode()
+        ).hexdigest())
+        ultima_alteracao = int(max(carimbos)) if carimbos else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=ultima_alteracao)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            response['ETag'] = etag
+            if ultima_alteracao is not None:
+                response['Last-Modified'] = http_date(ultima_alteracao)
+            patch_cache_control(response, public=True, max_age=self.max_age_cache, must_revalidate=True)
+        return response
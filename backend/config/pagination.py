@@ -0,0 +1,89 @@
+"""
+Paginação das listagens que só crescem (kardex, pedidos, notificações).
+
+Por padrão mantém o comportamento de PageNumberPagination (`?page=`, com
+`count`). Com `?cursor=` (vazio na primeira página) passa a paginar por
+keyset sobre `view.ordenacao_cursor`, ex. ('-data_criacao', '-id'):
+sem COUNT(*) nem OFFSET, cada página é uma faixa do índice composto.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class PaginacaoCursorOpcional(PageNumberPagination):
+    cursor_query_param = 'cursor'
+    ordenacao_padrao = ('-data_criacao', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.modo_cursor = self.cursor_query_param in request.query_params
+        if not self.modo_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordenacao = tuple(getattr(view, 'ordenacao_cursor', self.ordenacao_padrao))
+        page_size = self.get_page_size(request)
+
+        posicao = self._decodificar(request.query_params.get(self.cursor_query_param))
+        queryset = queryset.order_by(*self.ordenacao)
+        if posicao is not None:
+            queryset = queryset.filter(self._apos(posicao))
+
+        pagina = list(queryset[:page_size + 1])
+        self.proxima = None
+        if len(pagina) > page_size:
+            pagina = pagina[:page_size]
+            self.proxima = [self._valor(pagina[-1], campo) for campo in self.ordenacao]
+        return pagina
+
+    def get_paginated_response(self, data):
+        if not getattr(self, 'modo_cursor', False):
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self._link(self.proxima)),
+            ('results', data),
+        ]))
+
+    # --- keyset ---
+
+    def _apos(self, posicao):
+        """
+        Condição "depois de `posicao`" para a ordenação (a, b, ...):
+        a > x OR (a = x AND b > y) ... com < para campos descendentes.
+        """
+        condicao = Q()
+        iguais = {}
+        for campo, valor in zip(self.ordenacao, posicao):
+            nome = campo.lstrip('-')
+            operador = 'lt' if campo.startswith('-') else 'gt'
+            condicao |= Q(**iguais, **{f'{nome}__{operador}': valor})
+            iguais[nome] = valor
+        return condicao
+
+    @staticmethod
+    def _valor(obj, campo):
+        valor = getattr(obj, campo.lstrip('-'))
+        return valor.isoformat() if hasattr(valor, 'isoformat') else valor
+
+    def _decodificar(self, cursor):
+        if not cursor:
+            return None
+        try:
+            posicao = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (TypeError, ValueError, UnicodeEncodeError):
+            raise NotFound('Cursor inválido.')
+        if not isinstance(posicao, list) or len(posicao) != len(self.ordenacao):
+            raise NotFound('Cursor inválido.')
+        return posicao
+
+    def _link(self, posicao):
+        if posicao is None:
+            return None
+        cursor = base64.urlsafe_b64encode(json.dumps(posicao).encode()).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
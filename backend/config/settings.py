@@ -105,6 +105,10 @@ DATABASES = {
     }
 }
 
+# Lookups de busca textual/trigramas (produtos.search) só existem no PostgreSQL
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -220,6 +224,11 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Relatórios em segundo plano (pedidos.relatorios): 'celery' com Redis, senão numa thread do processo
+RELATORIOS_EXECUTOR = config('RELATORIOS_EXECUTOR', default='celery' if REDIS_URL else 'thread')
+# Ficheiros dos relatórios: fora do MEDIA_ROOT (não servidos em /media/), só pela view de download
+RELATORIOS_ROOT = config('RELATORIOS_ROOT', default=str(BASE_DIR / 'privado' / 'relatorios'))
+
 # Email Configuration
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
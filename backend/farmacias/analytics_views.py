@@ -2,12 +2,12 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions, status
 from django.db import models
-from django.db.models import Sum, Avg, Count, Q, F, Case, When, Value, ExpressionWrapper
+from django.db.models import Sum, Q, F, Case, When, Value, ExpressionWrapper
 from django.utils import timezone
-from datetime import timedelta, datetime
-from pedidos.models import Pedido
+from datetime import date, timedelta, datetime
+from pedidos.models import VendaDiaria, VendaProdutoDiaria
 from produtos.models import EstoqueProduto
-from farmacias.models import Notificacao
+from farmacias import painel, transacoes
 
 class DashboardStatsView(APIView):
     """View para estatísticas em tempo real do Dashboard da Farmácia."""
@@ -17,129 +17,64 @@ class DashboardStatsView(APIView):
         if not hasattr(request.user, 'farmacia'):
             return Response({'error': 'Acesso restrito a farmácias'}, status=status.HTTP_403_FORBIDDEN)
         
-        farmacia = request.user.farmacia
-        hoje = timezone.now().date()
-        
-        # 1. Vendas Hoje
-        pedidos_hoje = Pedido.objects.filter(
-            farmacia=farmacia, 
-            data_criacao__date=hoje
-        )
-        vendas_hoje = pedidos_hoje.aggregate(total=Sum('total'))['total'] or 0
-        
-        # 2. Ticket Médio Hoje
-        ticket_medio = pedidos_hoje.aggregate(media=Avg('total'))['media'] or 0
-        
-        # 3. Pedidos Pendentes
-        pendentes = Pedido.objects.filter(
-            farmacia=farmacia, 
-            status__in=['PENDENTE', 'CONFIRMADO', 'PREPARANDO']
-        ).count()
-        
-        # 4. Estoque Crítico (Baixo ou Ruptura)
-        estoques = EstoqueProduto.objects.filter(farmacia=farmacia)
-        ruptura = estoques.filter(quantidade=0).count()
-        critico = estoques.filter(quantidade__gt=0, quantidade__lte=F('quantidade_minima')).count()
-        
-        # 5. Entregas Concluídas Hoje
-        entregas_concluidas = Pedido.objects.filter(
-            farmacia=farmacia, 
-            status='ENTREGUE',
-            data_entrega__date=hoje
-        ).count()
-        
-        # 6. Vendas Recentes (Últimos 10)
-        vendas_recentes = Pedido.objects.filter(farmacia=farmacia).order_by('-data_criacao')[:10]
-        vendas_data = []
-        for v in vendas_recentes:
-            vendas_data.append({
-                'id': v.id,
-                'numero': v.numero_pedido,
-                'total': v.total,
-                'status': v.status,
-                'cliente': v.cliente.get_full_name() if v.cliente else 'Consumidor Final',
-                'data_criacao': v.data_criacao
-            })
-
-        # 7. Produtos Próximos do Vencimento (Próximos 90 dias)
-        noventa_dias = hoje + timedelta(days=90)
-        vencendo_breve = estoques.filter(
-            data_validade__gt=hoje, 
-            data_validade__lte=noventa_dias
-        ).count()
-        
-        expirados = estoques.filter(data_validade__lte=hoje).count()
-
-        # 8. Alertas Críticos (Ruptura, Baixo Stock e Validade)
-        avisos = []
-        # Rupturas
-        for e in estoques.filter(quantidade=0)[:5]:
-            avisos.append({
-                'id': f'rupt-{e.id}',
-                'tipo': 'RUPTURA',
-                'titulo': f'Stock Zerado: {e.produto.nome}',
-                'mensagem': f'O produto da {e.produto.fabricante or "N/D"} está esgotado no local {e.local}.'
-            })
-        
-        # Expirados
-        for e in estoques.filter(data_validade__lte=hoje)[:5]:
-            avisos.append({
-                'id': f'exp-{e.id}',
-                'tipo': 'EXPIRADO',
-                'titulo': f'Lote Expirado: {e.produto.nome}',
-                'mensagem': f'Lote {e.lote} expirou em {e.data_validade.strftime("%d/%m/%Y")}. Remova da prateleira.'
-            })
-
-        # 9. Notificações Críticas (Geral)
-        alertas = Notificacao.objects.filter(farmacia=farmacia, lida=False).count()
+        # Fotografia consolidada em cache (farmacias.painel), invalidada por vendas, lotes e notificações
+        dados = painel.snapshot(request.user.farmacia)
 
         return Response({
-            'vendas_hoje': vendas_hoje,
-            'ticket_medio_hoje': ticket_medio,
-            'pedidos_pendentes': pendentes,
-            'ruptura_stock': ruptura,
-            'estoque_critico': critico,
-            'vencendo_vencedor': vencendo_breve,
-            'expirados': expirados,
-            'entregas_concluidas': entregas_concluidas,
-            'vendas_recentes': vendas_data,
-            'avisos': avisos,
-            'alertas_pendentes': alertas
+            'vendas_hoje': dados['vendas_hoje'],
+            'ticket_medio_hoje': dados['ticket_medio_hoje'],
+            'pedidos_pendentes': dados['em_curso'],
+            'ruptura_stock': dados['ruptura'],
+            'estoque_critico': dados['critico'],
+            'vencendo_vencedor': dados['vencendo'],
+            'expirados': dados['expirados'],
+            'entregas_concluidas': dados['entregues_hoje'],
+            'vendas_recentes': dados['vendas_recentes'],
+            'avisos': dados['avisos'],
+            'alertas_pendentes': dados['alertas_pendentes']
         })
 
 from financeiro.models import Despesa
 
+def _periodo(request):
+    """Período dos relatórios: ?data_inicio=&data_fim= ou os últimos ?periodo= dias (padrão 7)."""
+    data_inicio_str = request.query_params.get('data_inicio')
+    data_fim_str = request.query_params.get('data_fim')
+    periodo = request.query_params.get('periodo', '7')
+
+    if data_inicio_str and data_fim_str:
+        start_date = datetime.strptime(data_inicio_str, '%Y-%m-%d').date()
+        end_date = datetime.strptime(data_fim_str, '%Y-%m-%d').date()
+        days = (end_date - start_date).days
+    else:
+        days = int(periodo)
+        end_date = timezone.localdate()
+        start_date = end_date - timedelta(days=days)
+    return start_date, end_date, days
+
+
 class AnalyticsReportView(APIView):
     """Relatório detalhado para análise (Gráficos e Fluxo de Caixa)."""
     permission_classes = [permissions.IsAuthenticated]
+    TRANSACOES_NO_RELATORIO = 50
+    # Pedidos que contam como receita na análise (ENTREGUE inclui as vendas de balcão/POS)
+    STATUS_VENDA = ['ENTREGUE', 'PAGO', 'CONFIRMADO']
 
     def get(self, request):
         farmacia = request.user.farmacia
         
         # Filtros de Data
-        data_inicio_str = request.query_params.get('data_inicio')
-        data_fim_str = request.query_params.get('data_fim')
-        periodo = request.query_params.get('periodo', '7')
-        
-        if data_inicio_str and data_fim_str:
-            start_date = datetime.strptime(data_inicio_str, '%Y-%m-%d').date()
-            end_date = datetime.strptime(data_fim_str, '%Y-%m-%d').date()
-            days = (end_date - start_date).days
-        else:
-            days = int(periodo)
-            end_date = timezone.now().date()
-            start_date = end_date - timedelta(days=days)
-
-        # 1. Receitas (Vendas)
-        # Incluímos ENTREGUE (vendas de balcão/POS) e outros status concluídos
-        vendas = Pedido.objects.filter(
-            farmacia=farmacia,
-            data_criacao__date__gte=start_date,
-            data_criacao__date__lte=end_date,
-            status__in=['ENTREGUE', 'PAGO', 'CONFIRMADO'] 
-        ).select_related('cliente', 'vendedor')
-        
-        total_receita = vendas.aggregate(total=Sum('total'))['total'] or 0
+        start_date, end_date, days = _periodo(request)
+
+        # 1. Receitas (Vendas): totais dos resumos diários, só dos pedidos em STATUS_VENDA
+        resumo = VendaDiaria.objects.filter(
+            farmacia=farmacia, dia__gte=start_date, dia__lte=end_date, status__in=self.STATUS_VENDA
+        )
+        resumo_produtos = VendaProdutoDiaria.objects.filter(
+            farmacia=farmacia, dia__gte=start_date, dia__lte=end_date, status__in=self.STATUS_VENDA
+        )
+        totais = resumo.aggregate(receita=Sum('receita'), iva=Sum('iva'), vendas=Sum('num_vendas'))
+        total_receita = totais['receita'] or 0
 
         # 2. Despesas
         despesas = Despesa.objects.filter(
@@ -163,9 +98,9 @@ class AnalyticsReportView(APIView):
             dias_map[d_str] = {'data': d_str, 'receita': 0, 'despesa': 0, 'saldo': 0}
 
         # Popular Vendas
-        vendas_dia = vendas.values('data_criacao__date').annotate(total=Sum('total'))
+        vendas_dia = resumo.values('dia').annotate(total=Sum('receita'))
         for v in vendas_dia:
-            d_str = v['data_criacao__date'].strftime('%d/%m')
+            d_str = v['dia'].strftime('%d/%m')
             if d_str in dias_map:
                 dias_map[d_str]['receita'] = float(v['total'])
 
@@ -187,76 +122,34 @@ class AnalyticsReportView(APIView):
         grafico_dias.sort(key=lambda x: datetime.strptime(x['data'] + '/' + str(timezone.now().year), '%d/%m/%Y'))
 
         # 3. Balanço de Pagamentos
-        balanco_pagamento = vendas.values('forma_pagamento').annotate(
-            total=Sum('total'),
-            qtd=Count('id')
-        )
-        
-        # 4. Transações detalhadas
-        transacoes_list = []
-        for pedido in vendas.prefetch_related('itens__produto').order_by('-data_criacao'):
-            cliente = pedido.cliente.get_full_name() if pedido.cliente else 'Consumidor Final'
-            itens = list(pedido.itens.all()[:2])
-            desc = ', '.join([i.produto.nome for i in itens]) 
-            if pedido.itens.count() > 2: desc += '...'
-            
-            transacoes_list.append({
-                'id': f"V-{pedido.id}",
-                'data': pedido.data_criacao, # Aware datetime
-                'tipo': 'ENTRADA',
-                'descricao': f"Venda #{pedido.numero_pedido} - {cliente}",
-                'detalhe': desc,
-                'categoria': 'Vendas',
-                'valor': float(pedido.total),
-                'forma_pagamento': pedido.forma_pagamento,
-                'status': pedido.status
-            })
-
-        for d in despesas:
-            data_ref = d.data_pagamento if d.status == 'PAGO' and d.data_pagamento else d.data_vencimento
-            if not data_ref: continue
-            
-            # Converter Date para Aware Datetime para evitar erro de comparação no sort
-            dt = timezone.make_aware(datetime.combine(data_ref, datetime.min.time()))
-            
-            status_desc = 'PENDENTE' if d.status == 'PENDENTE' else 'SAÍDA'
-            transacoes_list.append({
-                'id': f"D-{d.id}",
-                'data': dt, 
-                'tipo': status_desc,
-                'descricao': d.titulo,
-                'detalhe': d.observacoes or d.categoria.nome,
-                'categoria': d.categoria.nome,
-                'valor': float(d.valor) * -1,
-                'forma_pagamento': 'Caixa/Banco',
-                'status': d.status
-            })
+        balanco_pagamento = resumo.values('forma_pagamento').annotate(
+            total=Sum('receita'),
+            qtd=Sum('num_vendas')
+        ).filter(qtd__gt=0).order_by('forma_pagamento')
         
-        # O sort agora funciona pois todos são aware datetimes
-        transacoes_list.sort(key=lambda x: x['data'], reverse=True)
+        # 4. Transações: só as mais recentes; o extrato completo está em TransacoesView
+        transacoes_list, _ = transacoes.pagina(farmacia, start_date, end_date, self.TRANSACOES_NO_RELATORIO)
+        # O extrato lista todos os pedidos não cancelados, como o endpoint de transações
+        vendas_extrato = VendaDiaria.objects.filter(
+            farmacia=farmacia, dia__gte=start_date, dia__lte=end_date
+        ).exclude(status='CANCELADO').aggregate(n=Sum('num_vendas'))['n']
+        transacoes_total = (vendas_extrato or 0) + len(despesas)
 
         # 5. Mais Vendidos e Menos Vendidos
-        from pedidos.models import ItemPedido
-        itens_query = ItemPedido.objects.filter(
-            pedido__farmacia=farmacia,
-            pedido__data_criacao__date__gte=start_date,
-            pedido__status__in=['ENTREGUE', 'PAGO', 'CONFIRMADO']
-        )
-        
-        ranking_produtos = itens_query.values(
+        ranking_produtos = resumo_produtos.values(
             'produto__id', 'produto__nome'
         ).annotate(
             total_qtd=Sum('quantidade'),
-            total_venda=Sum('subtotal'),
-        ).order_by('-total_qtd')
+            total_venda=Sum('receita'),
+        ).filter(total_qtd__gt=0).order_by('-total_qtd', 'produto__id')
 
         # 6. Vendas por Usuário (Vendedor)
-        vendas_vendedor = vendas.values(
+        vendas_vendedor = resumo.values(
             'vendedor__id', 'vendedor__first_name', 'vendedor__last_name', 'vendedor__email'
         ).annotate(
-            total_vendas=Sum('total'),
-            count=Count('id')
-        ).order_by('-total_vendas')
+            total_vendas=Sum('receita'),
+            count=Sum('num_vendas')
+        ).filter(count__gt=0).order_by('-total_vendas')
 
         # 7. Produtos com maior margem
         maiores_margens_qs = EstoqueProduto.objects.filter(
@@ -275,18 +168,16 @@ class AnalyticsReportView(APIView):
             )
         ).order_by('-margem_percentual')[:10]
 
-        # 8. IVA Estimado
+        # 8. IVA (somado item a item na venda, conforme a taxa de cada produto)
         taxa_iva = float(farmacia.percentual_iva or 16)
-        fator = 1 + (taxa_iva / 100)
-        base_tributavel = float(total_receita) / fator if total_receita > 0 else 0
-        total_iva = float(total_receita) - base_tributavel
+        total_iva = totais['iva'] or 0
 
         # 9. Lucro por Categoria
-        lucro_categoria = itens_query.values(
+        lucro_categoria = resumo_produtos.values(
             categoria_nome=F('produto__categoria__nome')
         ).annotate(
-            receita=Sum('subtotal'),
-            custo=Sum(F('quantidade') * F('estoque__preco_custo')),
+            receita=Sum('receita'),
+            custo=Sum('custo'),
         ).annotate(
             lucro=F('receita') - F('custo')
         ).order_by('-lucro')
@@ -302,6 +193,7 @@ class AnalyticsReportView(APIView):
             },
             'balanco_pagamento': balanco_pagamento,
             'transacoes': transacoes_list,
+            'transacoes_total': transacoes_total,
             'mais_vendidos': ranking_produtos[:10],
             'menos_vendidos': ranking_produtos.reverse()[:10],
             'vendas_vendedor': vendas_vendedor,
@@ -316,3 +208,77 @@ class AnalyticsReportView(APIView):
                 } for m in maiores_margens_qs
             ]
         })
+
+
+class TransacoesView(APIView):
+    """
+    Extrato de transações (vendas e despesas) do período, paginado por keyset.
+    ?cursor= continua a partir do `next` da página anterior; ?page_size= (máx. 500).
+    ?formato=ndjson devolve o período inteiro em streaming, uma transação JSON por linha.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 500
+
+    def get(self, request):
+        farmacia = getattr(request.user, 'farmacia', None)
+        if not farmacia:
+            return Response({'error': 'Acesso restrito a farmácias'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            start_date, end_date, _ = _periodo(request)
+        except ValueError:
+            return Response({'error': 'Período inválido. Use AAAA-MM-DD ou periodo=<dias>.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.query_params.get('formato') == 'ndjson':
+            return self._ndjson(farmacia, start_date, end_date)
+
+        try:
+            tamanho = min(int(request.query_params.get('page_size', self.PAGE_SIZE)), self.MAX_PAGE_SIZE)
+            posicao = self._decodificar(request.query_params.get('cursor'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Cursor ou page_size inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultados, proxima = transacoes.pagina(farmacia, start_date, end_date, max(tamanho, 1), posicao)
+        return Response({
+            'next': self._link(request, proxima),
+            'results': resultados,
+        })
+
+    def _ndjson(self, farmacia, start_date, end_date):
+        import json
+        from django.core.serializers.json import DjangoJSONEncoder
+        from django.http import StreamingHttpResponse
+
+        def linhas():
+            for bloco in transacoes.blocos(farmacia, start_date, end_date):
+                yield ''.join(json.dumps(t, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n' for t in bloco)
+
+        response = StreamingHttpResponse(linhas(), content_type='application/x-ndjson; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="transacoes_{start_date:%Y%m%d}_{end_date:%Y%m%d}.ndjson"'
+        return response
+
+    @staticmethod
+    def _decodificar(cursor):
+        import base64
+        import json
+
+        if not cursor:
+            return None
+        dia, origem, momento, ref = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if origem == transacoes.ORIGEM_VENDA and momento is None:
+            raise ValueError('Cursor de venda sem momento.')
+        return (
+            date.fromisoformat(dia), str(origem),
+            datetime.fromisoformat(momento) if momento is not None else None, int(ref)
+        )
+
+    @staticmethod
+    def _link(request, posicao):
+        import base64
+        import json
+        from rest_framework.utils.urls import replace_query_param
+
+        if posicao is None:
+            return None
+        cursor = base64.urlsafe_b64encode(json.dumps(posicao).encode()).decode('ascii')
+        return replace_query_param(request.build_absolute_uri(), 'cursor', cursor)
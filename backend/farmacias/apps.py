@@ -5,3 +5,6 @@ from pathlib import Path
 class FarmaciasConfig(AppConfig):
     name = 'farmacias'
     path = str(Path(__file__).resolve().parent)
+
+    def ready(self):
+        import farmacias.signals
@@ -3,15 +3,24 @@ from rest_framework.response import Response
 from rest_framework import permissions
 from .models import Farmacia
 from .serializers import FarmaciaListSerializer
-from produtos.models import Produto, EstoqueProduto
+from config.cache_http import CacheCondicionalMixin
+from .geo import aplicar_filtro_geografico
+from produtos.models import Produto, OfertaProduto
 from produtos.serializers import ProdutoSerializer
 
-class ClientFarmaciaListView(APIView):
-    """Lista todas as farmácias ativas para clientes."""
+class ClientFarmaciaListView(CacheCondicionalMixin, APIView):
+    """
+    Lista todas as farmácias ativas para clientes (com ETag/304).
+    Com ?lat=&lng=&raio_km= (e ?entrega=true) devolve só as próximas, da mais perto para a mais longe.
+    """
     permission_classes = [permissions.AllowAny]
+    modelos_cache = (Farmacia,)
 
     def get(self, request):
         farmacias = Farmacia.objects.filter(is_ativa=True)
+        farmacias, com_distancia = aplicar_filtro_geografico(farmacias, request)
+        if com_distancia:
+            farmacias = farmacias.order_by('distancia')
         # Usar um serializer simples ou manual para evitar overhead
         data = []
         for f in farmacias:
@@ -27,6 +36,9 @@ class ClientFarmaciaListView(APIView):
                 'aceita_entregas': f.aceita_entregas,
                 'taxa_entrega': float(f.taxa_entrega)
             })
+            if com_distancia:
+                data[-1]['distancia'] = round(f.distancia, 2)
+                data[-1]['entrega_disponivel'] = f.aceita_entregas and f.distancia <= float(f.raio_entrega_km)
         return Response(data)
 
 class ClientFarmaciaProdutosView(APIView):
@@ -34,23 +46,22 @@ class ClientFarmaciaProdutosView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, farmacia_id):
-        # Buscar apenas produtos que tenham estoque > 0 nesta farmácia
-        estoques = EstoqueProduto.objects.filter(
-            farmacia_id=farmacia_id, 
-            quantidade__gt=0
-        ).select_related('produto')
+        # Uma linha por produto (projeção OfertaProduto): só produtos com estoque vendável
+        ofertas = OfertaProduto.objects.filter(
+            farmacia_id=farmacia_id
+        ).select_related('produto', 'produto__categoria')
         
         data = []
-        for e in estoques:
+        for o in ofertas:
             data.append({
-                'id': e.produto.id,
-                'estoque_id': e.id,
-                'nome': e.produto.nome,
-                'categoria': e.produto.categoria.nome if e.produto.categoria else None,
-                'preco': float(e.preco_venda),
-                'imagem': e.produto.imagem_principal.url if e.produto.imagem_principal else None,
-                'descricao': e.produto.descricao,
-                'requer_receita': e.produto.requer_receita,
-                'disponivel': e.quantidade
+                'id': o.produto.id,
+                'estoque_id': o.estoque_referencia_id,
+                'nome': o.produto.nome,
+                'categoria': o.produto.categoria.nome if o.produto.categoria else None,
+                'preco': float(o.preco_venda),
+                'imagem': o.produto.imagem_principal.url if o.produto.imagem_principal else None,
+                'descricao': o.produto.descricao,
+                'requer_receita': o.produto.requer_receita,
+                'disponivel': o.quantidade_total
             })
         return Response(data)
@@ -0,0 +1,170 @@
+"""
+Camada de busca espacial sobre Farmacia.latitude/longitude.
+
+Funciona em SQLite e PostgreSQL sem PostGIS:
+1. Índice por geohash (`Farmacia.geohash`, prefixo indexado) para escolher
+   as células vizinhas ao ponto de busca;
+2. Pré-filtro por bounding box em latitude/longitude;
+3. Refinamento pela fórmula de haversine, anotada como `distancia` (km).
+"""
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+from rest_framework.exceptions import ValidationError
+
+RAIO_TERRA_KM = 6371.0
+KM_POR_GRAU_LAT = 111.32
+RAIO_PADRAO_KM = 10.0
+RAIO_MAXIMO_KM = 100.0
+PRECISAO_GEOHASH = 9  # Precisão armazenada (~5m)
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(latitude, longitude, precisao=PRECISAO_GEOHASH):
+    """Codifica um ponto em geohash."""
+    lat_int = [-90.0, 90.0]
+    lng_int = [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    resultado = []
+    bits, bit, par = 0, 0, True
+    while len(resultado) < precisao:
+        intervalo, valor = (lng_int, longitude) if par else (lat_int, latitude)
+        meio = (intervalo[0] + intervalo[1]) / 2
+        if valor >= meio:
+            bits = (bits << 1) | 1
+            intervalo[0] = meio
+        else:
+            bits = bits << 1
+            intervalo[1] = meio
+        par = not par
+        bit += 1
+        if bit == 5:
+            resultado.append(_BASE32[bits])
+            bits, bit = 0, 0
+    return ''.join(resultado)
+
+
+def _dimensoes_celula(precisao):
+    """Altura e largura (em graus) de uma célula geohash."""
+    total = 5 * precisao
+    bits_lng = (total + 1) // 2
+    bits_lat = total // 2
+    return 180.0 / (2 ** bits_lat), 360.0 / (2 ** bits_lng)
+
+
+def _km_por_grau_lng(latitude):
+    return max(KM_POR_GRAU_LAT * math.cos(math.radians(latitude)), 0.01)
+
+
+def celulas_vizinhas(latitude, longitude, raio_km):
+    """
+    Retorna os prefixos geohash (célula central + 8 vizinhas) que cobrem o raio.
+    A precisão é a maior em que uma célula ainda é maior que o raio.
+    """
+    precisao = 1
+    for p in range(PRECISAO_GEOHASH, 0, -1):
+        altura, largura = _dimensoes_celula(p)
+        if (altura * KM_POR_GRAU_LAT >= raio_km and
+                largura * _km_por_grau_lng(latitude) >= raio_km):
+            precisao = p
+            break
+
+    altura, largura = _dimensoes_celula(precisao)
+    celulas = set()
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            lat = min(max(latitude + dy * altura, -90.0), 90.0)
+            lng = ((longitude + dx * largura + 180.0) % 360.0) - 180.0
+            celulas.add(geohash(lat, lng, precisao))
+    return sorted(celulas)
+
+
+def bounding_box(latitude, longitude, raio_km):
+    delta_lat = raio_km / KM_POR_GRAU_LAT
+    delta_lng = raio_km / _km_por_grau_lng(latitude)
+    return (latitude - delta_lat, latitude + delta_lat,
+            longitude - delta_lng, longitude + delta_lng)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distância em km entre dois pontos (cálculo em Python)."""
+    lat1, lng1, lat2, lng2 = map(lambda v: math.radians(float(v)), (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * RAIO_TERRA_KM * math.asin(math.sqrt(a))
+
+
+def _expressao_distancia(latitude, longitude, prefixo):
+    lat = Radians(Cast(F(f'{prefixo}latitude'), FloatField()))
+    lng = Radians(Cast(F(f'{prefixo}longitude'), FloatField()))
+    lat0 = math.radians(latitude)
+    lng0 = math.radians(longitude)
+    a = (
+        Power(Sin((lat - Value(lat0)) / 2), 2) +
+        Value(math.cos(lat0)) * Cos(lat) * Power(Sin((lng - Value(lng0)) / 2), 2)
+    )
+    return Value(2 * RAIO_TERRA_KM) * ASin(Sqrt(a))
+
+
+def filtrar_por_raio(queryset, latitude, longitude, raio_km, prefixo=''):
+    """
+    Restringe `queryset` às farmácias dentro de `raio_km` do ponto e anota
+    `distancia` (km). `prefixo` é o caminho até Farmacia ('' ou 'farmacia__').
+    """
+    celulas = Q()
+    for celula in celulas_vizinhas(latitude, longitude, raio_km):
+        celulas |= Q(**{f'{prefixo}geohash__startswith': celula})
+
+    lat_min, lat_max, lng_min, lng_max = bounding_box(latitude, longitude, raio_km)
+    return queryset.filter(celulas).filter(**{
+        f'{prefixo}latitude__gte': lat_min,
+        f'{prefixo}latitude__lte': lat_max,
+        f'{prefixo}longitude__gte': lng_min,
+        f'{prefixo}longitude__lte': lng_max,
+    }).annotate(
+        distancia=_expressao_distancia(latitude, longitude, prefixo)
+    ).filter(distancia__lte=raio_km)
+
+
+def filtrar_area_entrega(queryset, prefixo=''):
+    """Mantém apenas farmácias que entregam até o ponto (requer `distancia` anotada)."""
+    return queryset.filter(**{
+        f'{prefixo}aceita_entregas': True,
+        'distancia__lte': F(f'{prefixo}raio_entrega_km'),
+    })
+
+
+def coordenadas_da_request(request):
+    """
+    Lê `lat`, `lng` e `raio_km` dos query params.
+    Retorna None se não houver coordenadas; (lat, lng, raio_km) caso contrário.
+    """
+    lat = request.query_params.get('lat')
+    lng = request.query_params.get('lng')
+    if lat in (None, '') or lng in (None, ''):
+        return None
+    try:
+        lat = float(lat)
+        lng = float(lng)
+        raio_km = float(request.query_params.get('raio_km') or RAIO_PADRAO_KM)
+    except ValueError:
+        raise ValidationError({'detail': 'lat, lng e raio_km devem ser numéricos.'})
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or raio_km <= 0:
+        raise ValidationError({'detail': 'Coordenadas ou raio inválidos.'})
+    return lat, lng, min(raio_km, RAIO_MAXIMO_KM)
+
+
+def aplicar_filtro_geografico(queryset, request, prefixo=''):
+    """
+    Aplica `?lat=&lng=&raio_km=` (e `?entrega=true`) ao queryset, se presentes.
+    Retorna (queryset, bool indicando se o filtro foi aplicado).
+    """
+    coordenadas = coordenadas_da_request(request)
+    if coordenadas is None:
+        return queryset, False
+    queryset = filtrar_por_raio(queryset, *coordenadas, prefixo=prefixo)
+    if request.query_params.get('entrega') == 'true':
+        queryset = filtrar_area_entrega(queryset, prefixo=prefixo)
+    return queryset, True
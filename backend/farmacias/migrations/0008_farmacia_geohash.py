@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:57
+
+from django.db import migrations, models
+
+
+def preencher_geohash(apps, schema_editor):
+    from farmacias.geo import geohash
+
+    Farmacia = apps.get_model('farmacias', 'Farmacia')
+    farmacias = list(Farmacia.objects.exclude(latitude__isnull=True).exclude(longitude__isnull=True))
+    for farmacia in farmacias:
+        farmacia.geohash = geohash(farmacia.latitude, farmacia.longitude)
+    Farmacia.objects.bulk_update(farmacias, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmacias', '0007_farmacia_meta_bonus_mensal_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmacia',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Calculado a partir da latitude/longitude (ver farmacias.geo)', max_length=12, verbose_name='geohash'),
+        ),
+        migrations.RunPython(preencher_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmacias', '0008_farmacia_geohash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(fields=['farmacia', 'data_criacao', 'id'], name='notificacao_keyset_idx'),
+        ),
+    ]
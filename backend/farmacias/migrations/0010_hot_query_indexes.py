@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmacias', '0009_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(fields=['farmacia', 'lida'], name='notificacao_farmacia_lida_idx'),
+        ),
+    ]
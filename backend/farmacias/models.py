@@ -92,6 +92,14 @@ class Farmacia(models.Model):
         decimal_places=6,
         help_text=_('Longitude para localização no mapa')
     )
+    geohash = models.CharField(
+        _('geohash'),
+        max_length=12,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text=_('Calculado a partir da latitude/longitude (ver farmacias.geo)')
+    )
     
     # Horário de funcionamento
     horario_abertura = models.TimeField(_('horário de abertura'), null=True, blank=True)
@@ -172,6 +180,15 @@ class Farmacia(models.Model):
     def __str__(self):
         return self.nome
     
+    def save(self, *args, **kwargs):
+        from .geo import geohash
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geohash(self.latitude, self.longitude)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+                kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+    
     def atualizar_nota_media(self):
         """Atualiza a nota média e total de avaliações da farmácia."""
         avaliacoes = self.avaliacoes.all()
@@ -249,6 +266,11 @@ class Notificacao(models.Model):
         verbose_name = _('notificação')
         verbose_name_plural = _('notificações')
         ordering = ['-data_criacao']
+        indexes = [
+            # Paginação por cursor (config.pagination)
+            models.Index(fields=['farmacia', 'data_criacao', 'id'], name='notificacao_keyset_idx'),
+            models.Index(fields=['farmacia', 'lida'], name='notificacao_farmacia_lida_idx'),
+        ]
     
     def __str__(self):
         return f"[{self.tipo}] {self.titulo}"
@@ -0,0 +1,172 @@
+"""
+Fotografia (snapshot) do dashboard de cada farmácia, em cache.
+
+Os dois endpoints de estatísticas do dashboard (farmacias.analytics_views e
+pedidos.views) leem `snapshot(farmacia)`. O cálculo faz uma agregação
+condicional por tabela (pedidos, lotes, notificações e o resumo diário de
+vendas), mais as listas curtas (vendas recentes e avisos).
+
+Invalidação por versão, como no cache do PDV: cada farmácia tem um contador
+em cache que entra na chave (com o dia, para os contadores "de hoje" e as
+validades). Vendas e mudanças de pedidos, lotes e notificações incrementam
+o contador depois do commit (`invalidar`).
+
+Proteção contra "stampede": numa falha de cache só quem obtém o bloqueio
+(cache.add) recalcula; os restantes servem a última fotografia da farmácia
+enquanto isso, ou esperam por ela se ainda não houver nenhuma.
+"""
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from produtos.transacao import agendar_pos_commit
+
+TIMEOUT = 60 * 5  # rede de segurança para alterações que não passam pelos eventos
+TIMEOUT_ULTIMO = 60 * 60
+TIMEOUT_BLOQUEIO = 30
+ESPERA_MAXIMA = 3.0
+INTERVALO_ESPERA = 0.05
+VENDAS_RECENTES = 10
+ULTIMOS_PEDIDOS = 5
+AVISOS_POR_TIPO = 5
+
+
+def _chave_versao(farmacia_id):
+    return f'painel:versao:{farmacia_id}'
+
+
+def _chave_ultimo(farmacia_id):
+    return f'painel:ultimo:{farmacia_id}'
+
+
+def _incrementar(chave):
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.set(chave, 2, None)
+
+
+def invalidar(farmacia_ids):
+    """Agenda a invalidação do dashboard das farmácias para depois do commit."""
+    agendar_pos_commit('farmacias.painel', farmacia_ids, _invalidar)
+
+
+def _invalidar(farmacia_ids):
+    for farmacia_id in farmacia_ids:
+        _incrementar(_chave_versao(farmacia_id))
+
+
+def snapshot(farmacia):
+    """Dados do dashboard da farmácia (ver `calcular`), do cache sempre que possível."""
+    hoje = timezone.localdate()
+    versao = cache.get_or_set(_chave_versao(farmacia.id), 1, None)
+    chave = f'painel:{farmacia.id}:{versao}:{hoje.isoformat()}'
+
+    dados = cache.get(chave)
+    if dados is not None:
+        return dados
+
+    if cache.add(f'{chave}:bloqueio', 1, TIMEOUT_BLOQUEIO):
+        try:
+            return _recalcular(farmacia, hoje, chave)
+        finally:
+            cache.delete(f'{chave}:bloqueio')
+
+    # Outro processo está a recalcular: a fotografia anterior serve entretanto
+    ultimo = cache.get(_chave_ultimo(farmacia.id))
+    if ultimo is not None and ultimo['dia'] == hoje:
+        return ultimo
+
+    limite = time.monotonic() + ESPERA_MAXIMA
+    while time.monotonic() < limite:
+        time.sleep(INTERVALO_ESPERA)
+        dados = cache.get(chave)
+        if dados is not None:
+            return dados
+    return _recalcular(farmacia, hoje, chave)
+
+
+def _recalcular(farmacia, hoje, chave):
+    dados = calcular(farmacia, hoje)
+    cache.set(chave, dados, TIMEOUT)
+    cache.set(_chave_ultimo(farmacia.id), dados, TIMEOUT_ULTIMO)
+    return dados
+
+
+def calcular(farmacia, hoje):
+    from django.db.models import Count, F, Q, Sum
+    from pedidos.models import Pedido, VendaDiaria
+    from pedidos.resumos import intervalo
+    from pedidos.serializers import PedidoListSerializer
+    from produtos.models import EstoqueProduto
+    from .models import Notificacao
+
+    inicio_dia, fim_dia = intervalo(hoje, hoje)
+    noventa_dias = hoje + timedelta(days=90)
+
+    vendas = VendaDiaria.objects.filter(farmacia=farmacia, dia=hoje).exclude(
+        status=Pedido.StatusPedido.CANCELADO
+    ).aggregate(
+        receita=Sum('receita'), vendas=Sum('num_vendas')
+    )
+    pedidos = Pedido.objects.filter(farmacia=farmacia).aggregate(
+        em_curso=Count('id', filter=Q(status__in=['PENDENTE', 'CONFIRMADO', 'PREPARANDO'])),
+        pendentes=Count('id', filter=Q(status='PENDENTE')),
+        entregues_hoje=Count('id', filter=Q(status='ENTREGUE', data_entrega__gte=inicio_dia, data_entrega__lt=fim_dia)),
+        entregues_criados_hoje=Count('id', filter=Q(
+            status='ENTREGUE', data_criacao__gte=inicio_dia, data_criacao__lt=fim_dia
+        )),
+    )
+    estoques = EstoqueProduto.objects.filter(farmacia=farmacia)
+    lotes = estoques.aggregate(
+        ruptura=Count('id', filter=Q(quantidade=0)),
+        critico=Count('id', filter=Q(quantidade__gt=0, quantidade__lte=F('quantidade_minima'))),
+        ate_cinco=Count('id', filter=Q(quantidade__lte=5)),
+        vencendo=Count('id', filter=Q(data_validade__gt=hoje, data_validade__lte=noventa_dias)),
+        expirados=Count('id', filter=Q(data_validade__lte=hoje)),
+    )
+    alertas = Notificacao.objects.filter(farmacia=farmacia, lida=False).count()
+
+    recentes = list(
+        Pedido.objects.filter(farmacia=farmacia).select_related('cliente', 'farmacia')
+        .prefetch_related('itens').order_by('-data_criacao')[:VENDAS_RECENTES]
+    )
+
+    avisos = []
+    for e in estoques.filter(quantidade=0).select_related('produto')[:AVISOS_POR_TIPO]:
+        avisos.append({
+            'id': f'rupt-{e.id}',
+            'tipo': 'RUPTURA',
+            'titulo': f'Stock Zerado: {e.produto.nome}',
+            'mensagem': f'O produto da {e.produto.fabricante or "N/D"} está esgotado no local {e.local}.'
+        })
+    for e in estoques.filter(data_validade__lte=hoje).select_related('produto')[:AVISOS_POR_TIPO]:
+        avisos.append({
+            'id': f'exp-{e.id}',
+            'tipo': 'EXPIRADO',
+            'titulo': f'Lote Expirado: {e.produto.nome}',
+            'mensagem': f'Lote {e.lote} expirou em {e.data_validade.strftime("%d/%m/%Y")}. Remova da prateleira.'
+        })
+
+    receita = vendas['receita'] or 0
+    return {
+        'dia': hoje,
+        'vendas_hoje': receita,
+        'ticket_medio_hoje': round(receita / vendas['vendas'], 2) if vendas['vendas'] else 0,
+        'num_vendas_hoje': vendas['vendas'] or 0,
+        **pedidos,
+        **lotes,
+        'alertas_pendentes': alertas,
+        'vendas_recentes': [{
+            'id': v.id,
+            'numero': v.numero_pedido,
+            'total': v.total,
+            'status': v.status,
+            'cliente': v.cliente.get_full_name() if v.cliente else 'Consumidor Final',
+            'data_criacao': v.data_criacao
+        } for v in recentes],
+        'ultimos_pedidos': [dict(p) for p in PedidoListSerializer(recentes[:ULTIMOS_PEDIDOS], many=True).data],
+        'avisos': avisos,
+    }
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from config.cache_http import marcar_alteracao
+from . import painel
+from .models import Farmacia, Notificacao
+
+
+@receiver(post_save, sender=Farmacia)
+@receiver(post_delete, sender=Farmacia)
+def renovar_cache_http(sender, **kwargs):
+    """Invalida os ETags da lista pública de farmácias (config.cache_http)."""
+    marcar_alteracao(sender)
+
+
+@receiver(post_save, sender=Notificacao)
+@receiver(post_delete, sender=Notificacao)
+def invalidar_painel(sender, instance, **kwargs):
+    """Contagem de notificações por ler no dashboard (farmacias.painel)."""
+    painel.invalidar([instance.farmacia_id])
@@ -1,3 +1,74 @@
-from django.test import TestCase
+import datetime
+import json
+import shutil
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from financeiro.models import CategoriaDespesa, Despesa
+from pedidos.models import Pedido
+
+from .models import Farmacia
+
+MEDIA_TESTES = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TESTES)
+class TransacoesPaginacaoTest(TestCase):
+    """Percorrer o extrato página a página dá as mesmas transações, na mesma ordem, que o NDJSON."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_TESTES, ignore_errors=True)
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(email='farmacia@teste.com', password='x', tipo_usuario='FARMACIA')
+        self.farmacia = Farmacia.objects.create(
+            usuario=self.usuario, nome='Farmácia Teste', nuit='123456789', telefone_principal='840000000',
+            email=self.usuario.email, endereco='-', bairro='-', cidade='Maputo', provincia='Maputo',
+            latitude=Decimal('-25.96'), longitude=Decimal('32.58'),
+        )
+        self.usuario = User.objects.get(pk=self.usuario.pk)
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+
+        self.inicio = datetime.date(2026, 3, 1)
+        categoria = CategoriaDespesa.objects.create(nome='Luz', farmacia=self.farmacia)
+        for d in range(3):
+            dia = self.inicio + datetime.timedelta(days=d)
+            meia_noite = timezone.make_aware(datetime.datetime.combine(dia, datetime.time.min))
+            # Vendas à meia-noite local, à meia-noite UTC (mesmo dia local) e repetidas no mesmo instante
+            for momento in (meia_noite, meia_noite + datetime.timedelta(hours=2), meia_noite + datetime.timedelta(hours=2),
+                            meia_noite + datetime.timedelta(hours=15)):
+                pedido = Pedido.objects.create(farmacia=self.farmacia, total=Decimal('10'), status='ENTREGUE')
+                Pedido.objects.filter(pk=pedido.pk).update(data_criacao=momento)
+            for i in range(3):
+                Despesa.objects.create(
+                    farmacia=self.farmacia, categoria=categoria, titulo=f'Despesa {d}.{i}', valor=Decimal('5'),
+                    data_vencimento=dia, data_pagamento=dia, status='PAGO',
+                )
+
+    def test_paginas_iguais_ao_streaming(self):
+        periodo = {'data_inicio': self.inicio.isoformat(), 'data_fim': (self.inicio + datetime.timedelta(days=2)).isoformat()}
+
+        resposta = self.cliente.get('/api/v1/farmacias/dashboard/transacoes/', {**periodo, 'formato': 'ndjson'})
+        corpo = b''.join(resposta.streaming_content).decode()
+        streaming = [json.loads(linha)['id'] for linha in corpo.splitlines()]
+
+        paginado = []
+        url = '/api/v1/farmacias/dashboard/transacoes/'
+        parametros = {**periodo, 'page_size': 2}
+        while url:
+            pagina = self.cliente.get(url, parametros).json()
+            paginado += [t['id'] for t in pagina['results']]
+            url, parametros = pagina['next'], None
+
+        self.assertEqual(len(streaming), 21)
+        self.assertEqual(paginado, streaming)
+        # No mesmo dia, as vendas vêm antes das despesas (meia-noite local)
+        self.assertTrue(streaming[0].startswith('V-') and streaming[4].startswith('D-'))
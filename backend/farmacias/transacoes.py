@@ -0,0 +1,177 @@
+"""
+Extrato de transações da farmácia (vendas e despesas) num período.
+
+As duas origens são juntas no banco com UNION ALL e ordenadas (mais
+recentes primeiro) por (dia, origem, momento, ref): o dia local é uma data
+nos dois ramos, as vendas do dia vêm antes das despesas (que entram à
+meia-noite, sem hora: momento NULL) e, dentro da origem, ordena-se pela
+hora da venda e pelo id. As chaves têm o mesmo tipo nos dois ramos, por
+isso a ordem é igual em qualquer banco. A paginação é por keyset sobre
+essas quatro chaves: a condição "depois do cursor" é aplicada a cada ramo
+antes da união, sem OFFSET nem COUNT(*).
+
+O resumo dos itens de cada venda (nº de itens e dois nomes de produto)
+vem de uma única query agrupada por página (ou por bloco, no modo
+NDJSON), em vez de uma contagem por pedido.
+
+Despesas entram no dia do pagamento (pagas) ou do vencimento (pendentes),
+à meia-noite; vendas canceladas ficam fora, como nos relatórios.
+"""
+import datetime
+
+from django.db.models import Case, CharField, Count, DateTimeField, F, Max, Min, Q, Value, When
+from django.db.models.functions import Cast, TruncDate
+from django.utils import timezone
+
+ORIGEM_VENDA = 'V'
+ORIGEM_DESPESA = 'D'
+COLUNAS = (
+    'dia', 'momento', 'origem', 'ref', 'descricao', 'cliente_nome', 'cliente_apelido',
+    'detalhe', 'categoria_nome', 'montante', 'metodo', 'situacao',
+)
+TAMANHO_BLOCO = 500
+
+
+def _apos(origem, posicao):
+    """Condição "depois de `posicao`" para um ramo de origem fixa, em ordem descendente."""
+    from pedidos.resumos import intervalo
+
+    if posicao is None:
+        return Q()
+    dia, origem_cursor, momento, ref = posicao
+    if origem == ORIGEM_VENDA:
+        inicio_dia, fim_dia = intervalo(dia, dia)
+        antes, mesmo_dia = Q(data_criacao__lt=inicio_dia), Q(data_criacao__gte=inicio_dia, data_criacao__lt=fim_dia)
+    else:
+        antes, mesmo_dia = Q(dia__lt=dia), Q(dia=dia)
+
+    if origem < origem_cursor:
+        return antes | mesmo_dia
+    if origem > origem_cursor:
+        return antes
+    if origem == ORIGEM_VENDA:
+        depois = Q(data_criacao__lt=momento) | Q(data_criacao=momento, id__lt=ref)
+    else:
+        depois = Q(id__lt=ref)
+    return antes | (mesmo_dia & depois)
+
+
+def consulta(farmacia, inicio, fim, posicao=None):
+    """UNION ALL de vendas e despesas dos dias [inicio, fim], ordenado (dia, origem, momento, ref) descendente."""
+    from financeiro.models import Despesa
+    from pedidos.models import Pedido
+    from pedidos.resumos import intervalo
+
+    desde, ate = intervalo(inicio, fim)
+    vendas = Pedido.objects.filter(
+        farmacia=farmacia, data_criacao__gte=desde, data_criacao__lt=ate
+    ).exclude(status=Pedido.StatusPedido.CANCELADO).annotate(
+        dia=TruncDate('data_criacao', tzinfo=timezone.get_current_timezone()),
+        momento=F('data_criacao'),
+        origem=Value(ORIGEM_VENDA, output_field=CharField()),
+        ref=F('id'),
+        descricao=F('numero_pedido'),
+        cliente_nome=F('cliente__first_name'),
+        cliente_apelido=F('cliente__last_name'),
+        detalhe=Value('', output_field=CharField()),
+        categoria_nome=Value('Vendas', output_field=CharField()),
+        montante=F('total'),
+        metodo=F('forma_pagamento'),
+        situacao=F('status'),
+    ).filter(_apos(ORIGEM_VENDA, posicao)).order_by().values_list(*COLUNAS)
+
+    despesas = Despesa.objects.filter(farmacia=farmacia).filter(
+        Q(status='PAGO', data_pagamento__gte=inicio, data_pagamento__lte=fim) |
+        Q(status='PENDENTE', data_vencimento__gte=inicio, data_vencimento__lte=fim)
+    ).annotate(
+        dia=Case(
+            When(status='PAGO', data_pagamento__isnull=False, then=F('data_pagamento')),
+            default=F('data_vencimento'),
+        ),
+        momento=Cast(Value(None), DateTimeField()),
+        origem=Value(ORIGEM_DESPESA, output_field=CharField()),
+        ref=F('id'),
+        descricao=F('titulo'),
+        cliente_nome=Value('', output_field=CharField()),
+        cliente_apelido=Value('', output_field=CharField()),
+        detalhe=F('observacoes'),
+        categoria_nome=F('categoria__nome'),
+        montante=-F('valor'),
+        metodo=Value('Caixa/Banco', output_field=CharField()),
+        situacao=F('status'),
+    ).filter(_apos(ORIGEM_DESPESA, posicao)).order_by().values_list(*COLUNAS)
+
+    return vendas.union(despesas, all=True).order_by('-dia', '-origem', '-momento', '-ref')
+
+
+def _resumo_itens(pedido_ids):
+    """{pedido_id: 'Produto A, Produto B...'} numa query agrupada."""
+    from pedidos.models import ItemPedido
+
+    resumos = {}
+    for pedido_id, num_itens, primeiro, ultimo in ItemPedido.objects.filter(
+        pedido_id__in=pedido_ids
+    ).order_by().values('pedido_id').annotate(
+        num_itens=Count('id'), primeiro=Min('produto__nome'), ultimo=Max('produto__nome')
+    ).values_list('pedido_id', 'num_itens', 'primeiro', 'ultimo'):
+        nomes = primeiro if primeiro == ultimo else f"{primeiro}, {ultimo}"
+        resumos[pedido_id] = nomes + ('...' if num_itens > 2 else '')
+    return resumos
+
+
+def formatar(linhas):
+    """Converte tuplas de `consulta` nas transações do relatório (mesmo formato de antes)."""
+    linhas = list(linhas)
+    itens = _resumo_itens([linha[3] for linha in linhas if linha[2] == ORIGEM_VENDA])
+    transacoes = []
+    for (dia, momento, origem, ref, descricao, nome, apelido, detalhe, categoria, montante, metodo, situacao) in linhas:
+        if origem == ORIGEM_VENDA:
+            cliente = f"{nome or ''} {apelido or ''}".strip() or 'Consumidor Final'
+            transacoes.append({
+                'id': f"V-{ref}",
+                'data': momento,
+                'tipo': 'ENTRADA',
+                'descricao': f"Venda #{descricao} - {cliente}",
+                'detalhe': itens.get(ref, ''),
+                'categoria': categoria,
+                'valor': float(montante),
+                'forma_pagamento': metodo,
+                'status': situacao,
+            })
+        else:
+            transacoes.append({
+                'id': f"D-{ref}",
+                # Data sem hora: meia-noite local do dia
+                'data': timezone.make_aware(datetime.datetime.combine(dia, datetime.time.min)),
+                'tipo': 'PENDENTE' if situacao == 'PENDENTE' else 'SAÍDA',
+                'descricao': descricao,
+                'detalhe': detalhe or categoria,
+                'categoria': categoria,
+                'valor': float(montante),
+                'forma_pagamento': metodo,
+                'status': situacao,
+            })
+    return transacoes
+
+
+def pagina(farmacia, inicio, fim, tamanho, posicao=None):
+    """Uma página do extrato. Retorna (transações, posição da próxima página ou None)."""
+    linhas = list(consulta(farmacia, inicio, fim, posicao)[:tamanho + 1])
+    proxima = None
+    if len(linhas) > tamanho:
+        linhas = linhas[:tamanho]
+        dia, momento, origem, ref = linhas[-1][:4]
+        proxima = [dia.isoformat(), origem, momento.isoformat() if momento else None, ref]
+    return formatar(linhas), proxima
+
+
+def blocos(farmacia, inicio, fim):
+    """Todas as transações do período, em blocos de TAMANHO_BLOCO (para o modo NDJSON)."""
+    bloco = []
+    for linha in consulta(farmacia, inicio, fim).iterator(chunk_size=TAMANHO_BLOCO):
+        bloco.append(linha)
+        if len(bloco) >= TAMANHO_BLOCO:
+            yield formatar(bloco)
+            bloco = []
+    if bloco:
+        yield formatar(bloco)
@@ -4,7 +4,7 @@ from .views import (
     FarmaciaListView, FarmaciaDetailView, FarmaciaAvaliacaoCreateView,
     NotificacaoListView, NotificacaoMarcarLidaView, MinhaFarmaciaView
 )
-from .analytics_views import DashboardStatsView, AnalyticsReportView
+from .analytics_views import DashboardStatsView, AnalyticsReportView, TransacoesView
 from .client_views import ClientFarmaciaListView, ClientFarmaciaProdutosView
 from .admin_views import AdminFarmaciaViewSet, AdminGibagioViewSet, AdminLicencaViewSet
 
@@ -20,6 +20,7 @@ urlpatterns = [
     path('me/', MinhaFarmaciaView.as_view(), name='minha_farmacia'),
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard_stats'),
     path('dashboard/report/', AnalyticsReportView.as_view(), name='dashboard_report'),
+    path('dashboard/transacoes/', TransacoesView.as_view(), name='dashboard_transacoes'),
     path('notificacoes/', NotificacaoListView.as_view(), name='notificacao_list'),
     path('notificacoes/ler/', NotificacaoMarcarLidaView.as_view(), name='notificacao_ler_todas'),
     path('notificacoes/ler/<int:pk>/', NotificacaoMarcarLidaView.as_view(), name='notificacao_ler'),
@@ -9,12 +9,16 @@ from .serializers import (
 )
 from django.db.models import F, FloatField
 from django.db.models.functions import Cast
+from config.pagination import PaginacaoCursorOpcional
+from .geo import aplicar_filtro_geografico
+from . import painel
 
 class FarmaciaListView(generics.ListAPIView):
     """
     Lista todas as farmácias ativas.
     Suporta filtragem por cidade, bairro, funcionamento 24h, entrega, etc.
     Suporta busca por nome.
+    Com ?lat=&lng=&raio_km= (e ?entrega=true) filtra e ordena por distância.
     """
     queryset = Farmacia.objects.filter(is_ativa=True)
     serializer_class = FarmaciaListSerializer
@@ -25,6 +29,13 @@ class FarmaciaListView(generics.ListAPIView):
     ordering_fields = ('nota_media', 'nome')
     ordering = ('-nota_media',)
 
+    def get_queryset(self):
+        queryset, com_distancia = aplicar_filtro_geografico(super().get_queryset(), self.request)
+        if com_distancia:
+            # Ordenação padrão passa a ser a mais próxima primeiro
+            self.ordering = ('distancia',)
+        return queryset
+
 
 class FarmaciaDetailView(generics.RetrieveAPIView):
     """Detalhes de uma farmácia específica."""
@@ -46,9 +57,14 @@ class FarmaciaAvaliacaoCreateView(generics.CreateAPIView):
 
 
 class NotificacaoListView(generics.ListAPIView):
-    """Lista notificações para a farmácia do usuário logado."""
+    """
+    Lista notificações para a farmácia do usuário logado.
+    `?cursor=` ativa a paginação por keyset (data_criacao, id), sem agrupar por `lida`.
+    """
     serializer_class = NotificacaoSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = PaginacaoCursorOpcional
+    ordenacao_cursor = ('-data_criacao', '-id')
 
     def get_queryset(self):
         # Apenas se o usuário for do tipo FARMACIA ou ADMIN
@@ -77,6 +93,7 @@ class NotificacaoMarcarLidaView(APIView):
         else:
             # Marcar todas
             Notificacao.objects.filter(farmacia=request.user.farmacia, lida=False).update(lida=True)
+            painel.invalidar([request.user.farmacia.id])
             return Response({'status': 'todas marcadas como lidas'})
 
 
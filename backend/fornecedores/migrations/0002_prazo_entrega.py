@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fornecedores', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fornecedor',
+            name='prazo_entrega_dias',
+            field=models.PositiveIntegerField(default=7, help_text='Dias entre a encomenda e a chegada da mercadoria (usado na sugestão de compras)', verbose_name='prazo de entrega (dias)'),
+        ),
+    ]
@@ -35,6 +35,11 @@ class Fornecedor(models.Model):
         default=30,
         help_text=_('Dias para pagamento após a fatura')
     )
+    prazo_entrega_dias = models.PositiveIntegerField(
+        _('prazo de entrega (dias)'),
+        default=7,
+        help_text=_('Dias entre a encomenda e a chegada da mercadoria (usado na sugestão de compras)')
+    )
     limite_kredito = models.DecimalField(
         _('limite de crédito'), 
         max_digits=12, 
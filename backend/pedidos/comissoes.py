@@ -0,0 +1,160 @@
+"""
+Comissões por vendedor e fecho mensal.
+
+Contam os pedidos ENTREGUES e pagos. Os totais de todos os vendedores
+saem de uma única query agrupada sobre ItemPedido (subtotal,
+valor_comissao e nº de pedidos distintos por `pedido__vendedor`), mais a
+lista da equipa (dono e funcionários da farmácia), para que quem não
+vendeu também apareça.
+
+Bónus da equipa: o relatório indica se o total vendido no período chegou à
+meta da farmácia (`meta_bonus_mensal`) e o `percentual_bonus_extra`
+configurado. Não calcula valores de bónus por vendedor: a regra de
+pagamento é da farmácia.
+
+`fechar_mes(farmacia, mes)` grava estes totais em FechoComissao /
+FechoComissaoVendedor, com a meta e o percentual em vigor nesse momento;
+os relatórios de meses fechados leem o fecho (uma linha por vendedor) em
+vez de recalcular o histórico.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+
+def periodo_mes(mes):
+    """Primeiro e último dia do mês de `mes`."""
+    inicio = mes.replace(day=1)
+    proximo = (inicio + datetime.timedelta(days=32)).replace(day=1)
+    return inicio, proximo - datetime.timedelta(days=1)
+
+
+def _equipa(farmacia):
+    from accounts.models import User
+
+    return User.objects.filter(
+        Q(farmacia_perfil=farmacia) | Q(funcionario_perfil__farmacia=farmacia)
+    ).distinct().order_by('id')
+
+
+def _totais_por_vendedor(farmacia, desde=None, ate=None):
+    """{vendedor_id: (total_vendas, total_comissoes, quantidade_vendas)} numa query agrupada."""
+    from .models import ItemPedido
+    from .resumos import intervalo
+
+    itens = ItemPedido.objects.filter(pedido__farmacia=farmacia, pedido__status='ENTREGUE', pedido__pago=True)
+    if desde:
+        itens = itens.filter(pedido__data_criacao__gte=intervalo(desde, desde)[0])
+    if ate:
+        itens = itens.filter(pedido__data_criacao__lt=intervalo(ate, ate)[1])
+
+    return {
+        vendedor_id: (vendas or Decimal('0'), comissoes or Decimal('0'), quantidade)
+        for vendedor_id, vendas, comissoes, quantidade in itens.order_by().values('pedido__vendedor_id').annotate(
+            vendas=Sum('subtotal'), comissoes=Sum('valor_comissao'), quantidade=Count('pedido_id', distinct=True)
+        ).values_list('pedido__vendedor_id', 'vendas', 'comissoes', 'quantidade')
+    }
+
+
+def _linhas(farmacia, desde, ate):
+    """Linhas por vendedor da equipa e elegibilidade ao bónus da farmácia, calculadas dos pedidos."""
+    totais = _totais_por_vendedor(farmacia, desde, ate)
+    linhas = []
+    for vendedor in _equipa(farmacia):
+        vendas, comissao, quantidade = totais.get(vendedor.id, (Decimal('0'), Decimal('0'), 0))
+        linhas.append({
+            'vendedor_id': vendedor.id, 'nome': vendedor.get_full_name(),
+            'total_vendas': vendas, 'quantidade_vendas': quantidade, 'comissao': comissao,
+        })
+
+    total_vendas = sum((linha['total_vendas'] for linha in linhas), Decimal('0'))
+    meta = farmacia.meta_bonus_mensal or Decimal('0')
+    percentual = farmacia.percentual_bonus_extra or Decimal('0')
+    meta_atingida = meta > 0 and total_vendas >= meta
+    return linhas, {
+        'meta_bonus': meta, 'total_vendas': total_vendas,
+        'meta_atingida': meta_atingida, 'percentual_bonus_extra': percentual,
+    }
+
+
+def _relatorio(linhas, equipa, inicio, fim, vendedor_id=None, fecho=None):
+    if vendedor_id is not None:
+        linhas = [linha for linha in linhas if linha['vendedor_id'] == vendedor_id]
+    vendedores = [{
+        'vendedor_id': linha['vendedor_id'],
+        'nome': linha['nome'],
+        'total_vendas': float(linha['total_vendas']),
+        'quantidade_vendas': linha['quantidade_vendas'],
+        'comissao': float(linha['comissao']),
+        'percentual_medio': round(float(linha['comissao'] / linha['total_vendas'] * 100), 2) if linha['total_vendas'] > 0 else 0,
+    } for linha in linhas]
+    vendedores.sort(key=lambda x: x['total_vendas'], reverse=True)
+
+    return {
+        'periodo': {'inicio': inicio, 'fim': fim},
+        'fechado': fecho is not None,
+        'data_fecho': fecho.data_fecho if fecho else None,
+        'farmacia': {
+            'meta_bonus': float(equipa['meta_bonus']),
+            'total_vendas': float(equipa['total_vendas']),
+            'meta_atingida': equipa['meta_atingida'],
+            'percentual_bonus_extra': float(equipa['percentual_bonus_extra']),
+        },
+        'vendedores': vendedores,
+        'total_geral_comissoes': sum(v['comissao'] for v in vendedores),
+    }
+
+
+def relatorio(farmacia, desde=None, ate=None, vendedor_id=None):
+    """Relatório de comissões do período [desde, ate] (datas locais; None = sem limite)."""
+    linhas, equipa = _linhas(farmacia, desde, ate)
+    return _relatorio(linhas, equipa, desde, ate, vendedor_id)
+
+
+def relatorio_mes(farmacia, mes, vendedor_id=None):
+    """Relatório de um mês: do fecho, se existir; senão calculado dos pedidos."""
+    from .models import FechoComissao
+
+    inicio, fim = periodo_mes(mes)
+    fecho = FechoComissao.objects.filter(farmacia=farmacia, mes=inicio).first()
+    if fecho is None:
+        return relatorio(farmacia, inicio, fim, vendedor_id)
+
+    linhas = list(fecho.vendedores.values(
+        'vendedor_id', 'nome', 'total_vendas', 'quantidade_vendas', 'comissao'
+    ))
+    equipa = {
+        'meta_bonus': fecho.meta_bonus, 'total_vendas': fecho.total_vendas,
+        'meta_atingida': fecho.meta_atingida, 'percentual_bonus_extra': fecho.percentual_bonus_extra,
+    }
+    return _relatorio(linhas, equipa, inicio, fim, vendedor_id, fecho)
+
+
+def fechar_mes(farmacia, mes, usuario=None, refazer=False):
+    """
+    Grava o fecho de comissões do mês de `mes`. Retorna o FechoComissao.
+    Um mês já fechado só é regravado com `refazer` (senão ValueError).
+    """
+    from .models import FechoComissao, FechoComissaoVendedor
+
+    inicio, fim = periodo_mes(mes)
+    linhas, equipa = _linhas(farmacia, inicio, fim)
+
+    with transaction.atomic():
+        existente = FechoComissao.objects.select_for_update().filter(farmacia=farmacia, mes=inicio)
+        if existente.exists():
+            if not refazer:
+                raise ValueError(f"As comissões de {inicio:%m/%Y} já estão fechadas.")
+            existente.delete()
+
+        fecho = FechoComissao.objects.create(
+            farmacia=farmacia, mes=inicio, fechado_por=usuario,
+            total_comissoes=sum((linha['comissao'] for linha in linhas), Decimal('0')),
+            **equipa
+        )
+        FechoComissaoVendedor.objects.bulk_create([
+            FechoComissaoVendedor(fecho=fecho, **linha) for linha in linhas
+        ])
+    return fecho
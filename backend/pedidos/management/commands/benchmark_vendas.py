@@ -0,0 +1,97 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import User
+from caixa.models import Caixa, SessaoCaixa
+from farmacias.models import Farmacia
+from pedidos.models import Pedido
+from pedidos.serializers import VendaBalcaoSerializer
+from produtos.models import Produto, EstoqueProduto
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede vendas/segundo do POS (VendaBalcaoSerializer) para talões de N linhas. '
+        'Os dados são criados numa transação e descartados no fim; as tarefas pós-commit '
+        '(alertas, ofertas) não entram na medição.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendas', type=int, default=50)
+        parser.add_argument('--linhas', type=int, default=10, help='Linhas por talão.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                request, estoques = self._popular(options['linhas'])
+                self._medir(request, estoques, options['vendas'])
+                raise _Rollback()
+        except _Rollback:
+            self.stdout.write("Dados sintéticos descartados.")
+
+    def _popular(self, linhas):
+        user = User.objects.create(email="bench-pos@bench.local", tipo_usuario='FARMACIA', first_name='Bench')
+        farmacia = Farmacia.objects.create(
+            usuario=user, nome="Farmácia Bench POS", nuit="BENCHPOS", telefone_principal='840000000',
+            email=user.email, endereco='-', bairro='-', cidade='Maputo', provincia='Maputo',
+            latitude=Decimal('-25.96'), longitude=Decimal('32.58'),
+            percentual_comissao_padrao=Decimal('5.00'),
+        )
+        caixa = Caixa.objects.create(farmacia=farmacia, nome='Bench', codigo='BENCH-POS')
+        SessaoCaixa.objects.create(caixa=caixa, operador=user, status=SessaoCaixa.StatusSessao.ABERTO)
+
+        estoques = [
+            EstoqueProduto.objects.create(
+                farmacia=farmacia,
+                produto=Produto.objects.create(
+                    nome=f"Produto Bench POS {i}", codigo_barras=f"BENCHPOS{i}", percentual_comissao=Decimal('0')
+                ),
+                lote=f"BP{i}", quantidade=1_000_000,
+                preco_custo=Decimal('10.00'), preco_venda=Decimal('15.00'),
+            ) for i in range(linhas)
+        ]
+        request = APIRequestFactory().post('/api/v1/pedidos/venda-balcao/')
+        request.user = user
+        return request, estoques
+
+    def _medir(self, request, estoques, vendas):
+        payload = {
+            'tipo_pagamento': Pedido.FormaPagamento.DINHEIRO,
+            'itens': [
+                {'estoque_id': e.id, 'quantidade': 1, 'preco_unitario': '15.00', 'is_avulso': True}
+                for e in estoques
+            ],
+        }
+        tempos = []
+        queries = []
+        pedidos = []
+        for _ in range(vendas):
+            inicio = time.perf_counter()
+            with CaptureQueriesContext(connection) as capturadas:
+                serializer = VendaBalcaoSerializer(data=payload, context={'request': request})
+                serializer.is_valid(raise_exception=True)
+                pedido = serializer.save()
+                serializer.to_representation(pedido)
+            tempos.append(time.perf_counter() - inicio)
+            queries.append(len(capturadas))
+            pedidos.append(pedido)
+
+        # A fatura (QR) é gravada em disco pelo signal: não deixar ficheiros órfãos
+        for pedido in pedidos:
+            if pedido.qrcode_fatura:
+                pedido.qrcode_fatura.delete(save=False)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{vendas} vendas de {len(estoques)} linhas | {vendas / sum(tempos):.1f} vendas/s | "
+            f"p50={statistics.median(tempos) * 1000:.1f}ms | {statistics.median(queries):.0f} queries/venda"
+        ))
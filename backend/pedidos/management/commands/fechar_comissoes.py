@@ -0,0 +1,48 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from farmacias.models import Farmacia
+from pedidos import comissoes
+
+
+class Command(BaseCommand):
+    help = (
+        'Fecha as comissões do mês (totais por vendedor e bónus) de cada farmácia ativa. '
+        'Agendar no dia 1 de cada mês; por omissão fecha o mês anterior.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help='Mês a fechar (AAAA-MM). Padrão: o mês anterior.')
+        parser.add_argument('--farmacia', type=int, action='append', help='Apenas estas farmácias (id).')
+        parser.add_argument('--refazer', action='store_true', help='Regrava meses já fechados.')
+
+    def handle(self, *args, **options):
+        if options['mes']:
+            try:
+                mes = datetime.date.fromisoformat(f"{options['mes']}-01")
+            except ValueError:
+                raise CommandError('Mês inválido. Use AAAA-MM.')
+        else:
+            mes = (timezone.localdate().replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+        if comissoes.periodo_mes(mes)[1] >= timezone.localdate():
+            raise CommandError(f'O mês {mes:%m/%Y} ainda não terminou.')
+
+        farmacias = Farmacia.objects.filter(is_ativa=True).order_by('id')
+        if options['farmacia']:
+            farmacias = farmacias.filter(pk__in=options['farmacia'])
+
+        inicio = time.perf_counter()
+        fechadas = ignoradas = 0
+        for farmacia in farmacias.iterator():
+            try:
+                comissoes.fechar_mes(farmacia, mes, refazer=options['refazer'])
+                fechadas += 1
+            except ValueError:
+                ignoradas += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Comissões de {mes:%m/%Y}: {fechadas} farmácias fechadas, {ignoradas} já fechadas "
+            f"({time.perf_counter() - inicio:.1f}s)."
+        ))
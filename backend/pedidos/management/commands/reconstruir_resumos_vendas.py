@@ -0,0 +1,54 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from pedidos import resumos
+from pedidos.models import Pedido
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstrói os resumos diários de vendas (VendaDiaria e VendaProdutoDiaria) a partir dos pedidos. '
+        'Correr uma vez na instalação (sem datas: todo o histórico) e depois de correções manuais de pedidos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Primeiro dia (AAAA-MM-DD). Padrão: o pedido mais antigo.')
+        parser.add_argument('--ate', help='Último dia (AAAA-MM-DD). Padrão: hoje.')
+        parser.add_argument('--farmacia', type=int, action='append', help='Apenas estas farmácias (id).')
+        parser.add_argument('--dias-por-bloco', type=int, default=31,
+                            help='Dias reconstruídos por transação (limita a memória em históricos longos).')
+
+    def handle(self, *args, **options):
+        try:
+            desde = datetime.date.fromisoformat(options['desde']) if options['desde'] else None
+            ate = datetime.date.fromisoformat(options['ate']) if options['ate'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('Data inválida. Use AAAA-MM-DD.')
+
+        if desde is None:
+            primeiro = Pedido.objects.aggregate(primeiro=Min('data_criacao'))['primeiro']
+            if primeiro is None:
+                self.stdout.write("Sem pedidos: nada a reconstruir.")
+                return
+            desde = resumos.dia_local(primeiro)
+
+        inicio = time.perf_counter()
+        total_vendas = total_produtos = 0
+        bloco = datetime.timedelta(days=max(options['dias_por_bloco'], 1))
+        dia = desde
+        while dia <= ate:
+            fim = min(dia + bloco - datetime.timedelta(days=1), ate)
+            vendas, produtos = resumos.reconstruir(dia, fim, options['farmacia'])
+            total_vendas += vendas
+            total_produtos += produtos
+            self.stdout.write(f"{dia} a {fim}: {vendas} resumos de venda, {produtos} de produto")
+            dia = fim + datetime.timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Resumos de {desde} a {ate} reconstruídos: {total_vendas} de venda, {total_produtos} de produto "
+            f"({time.perf_counter() - inicio:.1f}s)."
+        ))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0008_pedido_cliente_perfil_alter_pedido_cliente'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['farmacia', 'data_criacao', 'id'], name='pedido_farmacia_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['cliente', 'data_criacao', 'id'], name='pedido_cliente_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0009_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['farmacia', 'status'], name='pedido_farmacia_status_idx'),
+        ),
+    ]
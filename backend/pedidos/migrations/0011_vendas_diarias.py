@@ -0,0 +1,57 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('farmacias', '0010_hot_query_indexes'),
+        ('produtos', '0013_saldo_estoque'),
+        ('pedidos', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaProdutoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(verbose_name='dia')),
+                ('num_vendas', models.IntegerField(default=0, verbose_name='número de vendas')),
+                ('quantidade', models.IntegerField(default=0, verbose_name='quantidade vendida')),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='receita')),
+                ('custo', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='custo')),
+                ('iva', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='IVA')),
+                ('farmacia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendas_produto_diarias', to='farmacias.farmacia')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='produtos.produto')),
+            ],
+            options={
+                'verbose_name': 'resumo diário de vendas por produto',
+                'verbose_name_plural': 'resumos diários de vendas por produto',
+                'indexes': [models.Index(fields=['farmacia', 'dia', 'produto'], name='venda_prod_farm_dia_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VendaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(verbose_name='dia')),
+                ('forma_pagamento', models.CharField(choices=[('DINHEIRO', 'Dinheiro (Cash)'), ('POS', 'POS / Cartão na Entrega'), ('MPESA', 'M-Pesa'), ('EMOLA', 'e-Mola'), ('VISA_ONLINE', 'Visa/Mastercard Online'), ('TRANSFERENCIA', 'Transferência Bancária'), ('CREDITO', 'Crédito / Conta Corrente')], max_length=20, verbose_name='forma de pagamento')),
+                ('num_vendas', models.IntegerField(default=0, verbose_name='número de vendas')),
+                ('quantidade', models.IntegerField(default=0, verbose_name='quantidade vendida')),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='receita')),
+                ('custo', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='custo')),
+                ('iva', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='IVA')),
+                ('farmacia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendas_diarias', to='farmacias.farmacia')),
+                ('vendedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'resumo diário de vendas',
+                'verbose_name_plural': 'resumos diários de vendas',
+                'indexes': [models.Index(fields=['farmacia', 'dia'], name='venda_diaria_farmacia_dia_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmacias', '0010_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pedidos', '0011_vendas_diarias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FechoComissao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês fechado', verbose_name='mês')),
+                ('total_vendas', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='total de vendas')),
+                ('total_comissoes', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='total de comissões')),
+                ('meta_bonus', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='meta de bónus')),
+                ('percentual_bonus_extra', models.DecimalField(decimal_places=2, default=0, max_digits=5, verbose_name='bónus extra (%)')),
+                ('meta_atingida', models.BooleanField(default=False, verbose_name='meta atingida')),
+                ('data_fecho', models.DateTimeField(auto_now_add=True, verbose_name='data do fecho')),
+                ('farmacia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fechos_comissao', to='farmacias.farmacia')),
+                ('fechado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'fecho de comissões',
+                'verbose_name_plural': 'fechos de comissões',
+                'ordering': ['-mes'],
+                'unique_together': {('farmacia', 'mes')},
+            },
+        ),
+        migrations.CreateModel(
+            name='FechoComissaoVendedor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=255, verbose_name='nome')),
+                ('total_vendas', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='total de vendas')),
+                ('quantidade_vendas', models.IntegerField(default=0, verbose_name='quantidade de vendas')),
+                ('comissao', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='comissão')),
+                ('bonus', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='bónus')),
+                ('fecho', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendedores', to='pedidos.fechocomissao')),
+                ('vendedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fechos_comissao', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'comissão do vendedor no fecho',
+                'verbose_name_plural': 'comissões dos vendedores no fecho',
+                'ordering': ['-total_vendas'],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmacias', '0010_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('pedidos', '0012_fechos_comissao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatorioGerado',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('FINANCEIRO_PDF', 'Relatório financeiro (PDF)')], default='FINANCEIRO_PDF', max_length=30, verbose_name='tipo')),
+                ('data_inicio', models.DateField(verbose_name='data inicial')),
+                ('data_fim', models.DateField(verbose_name='data final')),
+                ('versao_dados', models.CharField(max_length=64, verbose_name='versão dos dados')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('PROCESSANDO', 'Processando'), ('CONCLUIDO', 'Concluído'), ('ERRO', 'Erro')], default='PENDENTE', max_length=20, verbose_name='status')),
+                ('arquivo', models.FileField(blank=True, null=True, upload_to='relatorios/%Y/%m/', verbose_name='arquivo')),
+                ('erro', models.TextField(blank=True, verbose_name='erro')),
+                ('data_criacao', models.DateTimeField(auto_now_add=True, verbose_name='data de criação')),
+                ('data_inicio_processamento', models.DateTimeField(blank=True, null=True, verbose_name='início do processamento')),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True, verbose_name='data de conclusão')),
+                ('farmacia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relatorios_gerados', to='farmacias.farmacia')),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'relatório gerado',
+                'verbose_name_plural': 'relatórios gerados',
+                'ordering': ['-data_criacao'],
+                'indexes': [models.Index(fields=['farmacia', 'tipo', 'data_inicio', 'data_fim', 'versao_dados'], name='relatorio_chave_idx')],
+            },
+        ),
+    ]
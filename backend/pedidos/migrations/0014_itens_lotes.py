@@ -0,0 +1,34 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0013_saldo_estoque'),
+        ('pedidos', '0013_relatorios_gerados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='itempedido',
+            name='custo',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='custo'),
+        ),
+        migrations.CreateModel(
+            name='ItemPedidoLote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.PositiveIntegerField(verbose_name='quantidade (unidades)')),
+                ('custo_unitario', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='custo unitário')),
+                ('estoque', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='baixas_venda', to='produtos.estoqueproduto', verbose_name='estoque')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lotes', to='pedidos.itempedido', verbose_name='item')),
+            ],
+            options={
+                'verbose_name': 'lote do item do pedido',
+                'verbose_name_plural': 'lotes dos itens do pedido',
+            },
+        ),
+    ]
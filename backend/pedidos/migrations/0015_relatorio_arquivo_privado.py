@@ -0,0 +1,31 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:59
+
+from django.db import migrations, models
+import pedidos.models
+
+
+def apagar_relatorios_publicos(apps, schema_editor):
+    """Os PDFs antigos estavam no MEDIA_ROOT público: apagam-se (são gerados de novo no próximo pedido)."""
+    from django.core.files.storage import default_storage
+
+    RelatorioGerado = apps.get_model('pedidos', 'RelatorioGerado')
+    for relatorio in RelatorioGerado.objects.exclude(arquivo='').exclude(arquivo__isnull=True):
+        if default_storage.exists(relatorio.arquivo.name):
+            default_storage.delete(relatorio.arquivo.name)
+        relatorio.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0014_itens_lotes'),
+    ]
+
+    operations = [
+        migrations.RunPython(apagar_relatorios_publicos, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='relatoriogerado',
+            name='arquivo',
+            field=models.FileField(blank=True, null=True, storage=pedidos.models._storage_relatorios, upload_to=pedidos.models._caminho_relatorio, verbose_name='arquivo'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0015_relatorio_arquivo_privado'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='fechocomissaovendedor',
+            name='bonus',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:40
+#
+# Os resumos passam a ter uma linha por status do pedido. As linhas antigas
+# (sem status) são apagadas: depois de migrar, refazer o histórico com
+# `python manage.py reconstruir_resumos_vendas`.
+
+from django.db import migrations, models
+
+
+def apagar_resumos(apps, schema_editor):
+    apps.get_model('pedidos', 'VendaDiaria').objects.all().delete()
+    apps.get_model('pedidos', 'VendaProdutoDiaria').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0016_remover_bonus_vendedor'),
+    ]
+
+    operations = [
+        migrations.RunPython(apagar_resumos, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='vendadiaria',
+            name='status',
+            field=models.CharField(choices=[('PENDENTE', 'Pendente'), ('CONFIRMADO', 'Confirmado'), ('PREPARANDO', 'Preparando'), ('PRONTO', 'Pronto para Entrega'), ('EM_TRANSITO', 'Em Trânsito'), ('ENTREGUE', 'Entregue'), ('CANCELADO', 'Cancelado')], default='', max_length=20, verbose_name='status do pedido'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='vendaprodutodiaria',
+            name='status',
+            field=models.CharField(choices=[('PENDENTE', 'Pendente'), ('CONFIRMADO', 'Confirmado'), ('PREPARANDO', 'Preparando'), ('PRONTO', 'Pronto para Entrega'), ('EM_TRANSITO', 'Em Trânsito'), ('ENTREGUE', 'Entregue'), ('CANCELADO', 'Cancelado')], default='', max_length=20, verbose_name='status do pedido'),
+            preserve_default=False,
+        ),
+    ]
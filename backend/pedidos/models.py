@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from farmacias.models import Farmacia
 from produtos.models import Produto, EstoqueProduto
@@ -149,17 +150,50 @@ class Pedido(models.Model):
         verbose_name = _('pedido')
         verbose_name_plural = _('pedidos')
         ordering = ['-data_criacao']
+        indexes = [
+            # Paginação por cursor (config.pagination)
+            models.Index(fields=['farmacia', 'data_criacao', 'id'], name='pedido_farmacia_keyset_idx'),
+            models.Index(fields=['cliente', 'data_criacao', 'id'], name='pedido_cliente_keyset_idx'),
+            models.Index(fields=['farmacia', 'status'], name='pedido_farmacia_status_idx'),
+        ]
     
     def __str__(self):
         return f"Pedido {self.numero_pedido} - {self.cliente.get_full_name()}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Status lido do banco: save() deteta a entrada/saída de CANCELADO (resumos de vendas)
+        if 'status' in field_names:
+            instance._status_carregado = instance.status
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.numero_pedido:
             # Gerar número do pedido
-            from django.utils import timezone
+            import random
+            import string
             now = timezone.now()
-            self.numero_pedido = f"PED{now.strftime('%Y%m%d%H%M%S')}{self.id or ''}"
-        super().save(*args, **kwargs)
+            # Sufixo aleatório: vários pedidos no mesmo segundo (caixas em paralelo)
+            sufixo = ''.join(random.choices(string.ascii_uppercase + string.digits, k=3))
+            self.numero_pedido = f"PED{now.strftime('%Y%m%d%H%M%S')}{sufixo}"
+
+        anterior = getattr(self, '_status_carregado', None)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' not in update_fields:
+            super().save(*args, **kwargs)
+            return
+        if anterior is None or anterior == self.status:
+            super().save(*args, **kwargs)
+        else:
+            # O pedido passa para a linha do novo status nos resumos diários, na mesma transação
+            from django.db import transaction
+            from . import resumos
+
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                resumos.mudar_status(self, anterior)
+        self._status_carregado = self.status
     
     def calcular_total(self):
         """Calcula o total do pedido."""
@@ -172,26 +206,39 @@ class Pedido(models.Model):
         if self.status == self.StatusPedido.CANCELADO:
             return
             
+        from collections import defaultdict
         from django.db import transaction
         from produtos.models import MovimentacaoEstoque
         
         with transaction.atomic():
-            for item in self.itens.all():
-                if item.estoque:
-                    item.estoque.quantidade += item.quantidade
-                    item.estoque.save()
-                    
-                    # Registrar Kardex
-                    MovimentacaoEstoque.objects.create(
-                        estoque=item.estoque,
-                        tipo='ENTRADA',
-                        quantidade=item.quantidade,
-                        quantidade_anterior=item.estoque.quantidade - item.quantidade,
-                        quantidade_nova=item.estoque.quantidade,
-                        usuario=usuario, 
-                        motivo=f"Anulação de Venda #{self.numero_pedido}",
-                        referencia_externa=self.numero_pedido
-                    )
+            # Devolução por lote: as baixas gravadas na venda (ItemPedidoLote) ou,
+            # em itens sem elas, a quantidade do item ao lote de referência
+            devolucoes = defaultdict(int)
+            for item in self.itens.prefetch_related('lotes'):
+                baixas = list(item.lotes.all())
+                if baixas:
+                    for baixa in baixas:
+                        if baixa.estoque_id:
+                            devolucoes[baixa.estoque_id] += baixa.quantidade
+                elif item.estoque_id:
+                    devolucoes[item.estoque_id] += item.quantidade
+
+            for estoque in EstoqueProduto.objects.select_for_update().filter(pk__in=devolucoes).order_by('id'):
+                quantidade = devolucoes[estoque.id]
+                estoque.quantidade += quantidade
+                estoque.save()
+
+                # Registrar Kardex
+                MovimentacaoEstoque.objects.create(
+                    estoque=estoque,
+                    tipo='ENTRADA',
+                    quantidade=quantidade,
+                    quantidade_anterior=estoque.quantidade - quantidade,
+                    quantidade_nova=estoque.quantidade,
+                    usuario=usuario, 
+                    motivo=f"Anulação de Venda #{self.numero_pedido}",
+                    referencia_externa=self.numero_pedido
+                )
             
             self.status = self.StatusPedido.CANCELADO
             self.pago = False
@@ -234,6 +281,9 @@ class ItemPedido(models.Model):
     
     # Comissões
     valor_comissao = models.DecimalField(_('valor comissão'), max_digits=10, decimal_places=2, default=0)
+
+    # Custo da linha na venda (soma dos lotes baixados, ver ItemPedidoLote); vazio em pedidos sem baixa
+    custo = models.DecimalField(_('custo'), max_digits=12, decimal_places=2, null=True, blank=True)
     
     # Informações adicionais
     observacoes = models.TextField(_('observações'), blank=True)
@@ -249,10 +299,36 @@ class ItemPedido(models.Model):
         # Calcular subtotal
         self.subtotal = self.quantidade * self.preco_unitario
         super().save(*args, **kwargs)
-        # Atualizar total do pedido
+        # Atualizar total do pedido (edições avulsas, ex.: admin). A criação de
+        # pedidos e vendas usa bulk_create e calcula o total uma única vez.
         self.pedido.calcular_total()
 
 
+class ItemPedidoLote(models.Model):
+    """
+    Baixa de um item da venda num lote (a alocação FEFO pode repartir uma
+    linha por vários lotes). A anulação devolve cada quantidade ao seu lote.
+    """
+
+    item = models.ForeignKey(ItemPedido, on_delete=models.CASCADE, related_name='lotes', verbose_name=_('item'))
+    estoque = models.ForeignKey(
+        EstoqueProduto,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='baixas_venda',
+        verbose_name=_('estoque')
+    )
+    quantidade = models.PositiveIntegerField(_('quantidade (unidades)'))
+    custo_unitario = models.DecimalField(_('custo unitário'), max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = _('lote do item do pedido')
+        verbose_name_plural = _('lotes dos itens do pedido')
+
+    def __str__(self):
+        return f"{self.item_id} <- lote {self.estoque_id}: {self.quantidade}"
+
+
 class HistoricoPedido(models.Model):
     """Order status history model."""
     
@@ -281,3 +357,199 @@ class HistoricoPedido(models.Model):
     
     def __str__(self):
         return f"{self.pedido.numero_pedido}: {self.status_anterior} → {self.status_novo}"
+
+
+class VendaDiaria(models.Model):
+    """
+    Resumo diário dos pedidos por status, forma de pagamento e vendedor.
+    Mantido em pedidos.resumos na transação da venda e de cada mudança de status
+    (o pedido passa de uma linha de status para a outra); reconstruível pelo
+    comando `reconstruir_resumos_vendas`. Cada leitura filtra os status que
+    conta como venda.
+
+    A chave não é única de propósito: duas vendas concorrentes podem criar a mesma
+    linha ao mesmo tempo e as leituras somam sempre (Sum), pelo que o total fica certo.
+    """
+
+    farmacia = models.ForeignKey(Farmacia, on_delete=models.CASCADE, related_name='vendas_diarias')
+    dia = models.DateField(_('dia'))
+    forma_pagamento = models.CharField(_('forma de pagamento'), max_length=20, choices=Pedido.FormaPagamento.choices)
+    status = models.CharField(_('status do pedido'), max_length=20, choices=Pedido.StatusPedido.choices)
+    vendedor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+
+    num_vendas = models.IntegerField(_('número de vendas'), default=0)
+    quantidade = models.IntegerField(_('quantidade vendida'), default=0)
+    receita = models.DecimalField(_('receita'), max_digits=14, decimal_places=2, default=0)
+    custo = models.DecimalField(_('custo'), max_digits=14, decimal_places=2, default=0)
+    iva = models.DecimalField(_('IVA'), max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _('resumo diário de vendas')
+        verbose_name_plural = _('resumos diários de vendas')
+        indexes = [
+            models.Index(fields=['farmacia', 'dia'], name='venda_diaria_farmacia_dia_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.farmacia_id} {self.dia} {self.forma_pagamento}: {self.receita}"
+
+
+class VendaProdutoDiaria(models.Model):
+    """Resumo diário das vendas por produto (companheiro de VendaDiaria, mesmas regras)."""
+
+    farmacia = models.ForeignKey(Farmacia, on_delete=models.CASCADE, related_name='vendas_produto_diarias')
+    dia = models.DateField(_('dia'))
+    status = models.CharField(_('status do pedido'), max_length=20, choices=Pedido.StatusPedido.choices)
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='+')
+
+    num_vendas = models.IntegerField(_('número de vendas'), default=0)
+    quantidade = models.IntegerField(_('quantidade vendida'), default=0)
+    receita = models.DecimalField(_('receita'), max_digits=14, decimal_places=2, default=0)
+    custo = models.DecimalField(_('custo'), max_digits=14, decimal_places=2, default=0)
+    iva = models.DecimalField(_('IVA'), max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _('resumo diário de vendas por produto')
+        verbose_name_plural = _('resumos diários de vendas por produto')
+        indexes = [
+            models.Index(fields=['farmacia', 'dia', 'produto'], name='venda_prod_farm_dia_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.farmacia_id} {self.dia} {self.produto_id}: {self.quantidade}"
+
+
+class FechoComissao(models.Model):
+    """
+    Fecho mensal de comissões de uma farmácia: totais da equipa e condições
+    do bónus (meta e percentual) congelados no momento do fecho.
+    Gerado por pedidos.comissoes; as linhas por vendedor ficam em
+    FechoComissaoVendedor.
+    """
+
+    farmacia = models.ForeignKey(Farmacia, on_delete=models.CASCADE, related_name='fechos_comissao')
+    mes = models.DateField(_('mês'), help_text=_('Primeiro dia do mês fechado'))
+
+    total_vendas = models.DecimalField(_('total de vendas'), max_digits=14, decimal_places=2, default=0)
+    total_comissoes = models.DecimalField(_('total de comissões'), max_digits=14, decimal_places=2, default=0)
+    meta_bonus = models.DecimalField(_('meta de bónus'), max_digits=12, decimal_places=2, default=0)
+    percentual_bonus_extra = models.DecimalField(_('bónus extra (%)'), max_digits=5, decimal_places=2, default=0)
+    meta_atingida = models.BooleanField(_('meta atingida'), default=False)
+
+    fechado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    data_fecho = models.DateTimeField(_('data do fecho'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('fecho de comissões')
+        verbose_name_plural = _('fechos de comissões')
+        unique_together = ['farmacia', 'mes']
+        ordering = ['-mes']
+
+    def __str__(self):
+        return f"{self.farmacia_id} {self.mes:%Y-%m}: {self.total_comissoes}"
+
+
+class FechoComissaoVendedor(models.Model):
+    """Totais de um vendedor num fecho mensal de comissões."""
+
+    fecho = models.ForeignKey(FechoComissao, on_delete=models.CASCADE, related_name='vendedores')
+    vendedor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='fechos_comissao'
+    )
+    # Nome no fecho: o relatório do mês não muda se o utilizador for alterado ou removido
+    nome = models.CharField(_('nome'), max_length=255)
+
+    total_vendas = models.DecimalField(_('total de vendas'), max_digits=14, decimal_places=2, default=0)
+    quantidade_vendas = models.IntegerField(_('quantidade de vendas'), default=0)
+    comissao = models.DecimalField(_('comissão'), max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _('comissão do vendedor no fecho')
+        verbose_name_plural = _('comissões dos vendedores no fecho')
+        ordering = ['-total_vendas']
+
+    def __str__(self):
+        return f"{self.fecho} - {self.nome}: {self.comissao}"
+
+
+def _storage_relatorios():
+    """Storage dos relatórios em settings.RELATORIOS_ROOT, fora do MEDIA_ROOT servido em /media/."""
+    from django.core.files.storage import FileSystemStorage
+    return FileSystemStorage(location=settings.RELATORIOS_ROOT)
+
+
+def _caminho_relatorio(instance, filename):
+    return f'{instance.farmacia_id}/{instance.id}/{filename}'
+
+
+class RelatorioGerado(models.Model):
+    """
+    Pedido de geração de um relatório (PDF) e o ficheiro resultante.
+    Gerado em segundo plano por pedidos.relatorios; o par (período,
+    versao_dados) identifica o conteúdo, pelo que um relatório já gerado é
+    reaproveitado enquanto os dados do período não mudarem.
+    """
+
+    class Tipo(models.TextChoices):
+        FINANCEIRO_PDF = 'FINANCEIRO_PDF', _('Relatório financeiro (PDF)')
+
+    class Status(models.TextChoices):
+        PENDENTE = 'PENDENTE', _('Pendente')
+        PROCESSANDO = 'PROCESSANDO', _('Processando')
+        CONCLUIDO = 'CONCLUIDO', _('Concluído')
+        ERRO = 'ERRO', _('Erro')
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    farmacia = models.ForeignKey(Farmacia, on_delete=models.CASCADE, related_name='relatorios_gerados')
+    tipo = models.CharField(_('tipo'), max_length=30, choices=Tipo.choices, default=Tipo.FINANCEIRO_PDF)
+    data_inicio = models.DateField(_('data inicial'))
+    data_fim = models.DateField(_('data final'))
+    versao_dados = models.CharField(_('versão dos dados'), max_length=64)
+
+    status = models.CharField(_('status'), max_length=20, choices=Status.choices, default=Status.PENDENTE)
+    # Servido só por RelatorioDownloadView (farmácia do utilizador)
+    arquivo = models.FileField(
+        _('arquivo'), upload_to=_caminho_relatorio, storage=_storage_relatorios, blank=True, null=True
+    )
+    erro = models.TextField(_('erro'), blank=True)
+
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    data_criacao = models.DateTimeField(_('data de criação'), auto_now_add=True)
+    data_inicio_processamento = models.DateTimeField(_('início do processamento'), null=True, blank=True)
+    data_conclusao = models.DateTimeField(_('data de conclusão'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('relatório gerado')
+        verbose_name_plural = _('relatórios gerados')
+        ordering = ['-data_criacao']
+        indexes = [
+            models.Index(
+                fields=['farmacia', 'tipo', 'data_inicio', 'data_fim', 'versao_dados'],
+                name='relatorio_chave_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.data_inicio} a {self.data_fim} ({self.status})"
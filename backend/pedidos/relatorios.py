@@ -0,0 +1,401 @@
+"""
+Relatórios gerados em segundo plano (RelatorioGerado).
+
+`solicitar(farmacia, inicio, fim)` devolve o relatório do período: um já
+gerado (ou em geração) com a mesma versão dos dados, ou um novo, posto na
+fila depois do commit. `executar(id)` gera o PDF e guarda-o no storage.
+
+A versão dos dados é uma impressão digital do que o relatório mostra
+(resumos diários e pedidos do período, despesas, dados da farmácia e
+VERSAO_LAYOUT), calculada com três agregações: enquanto nada disso mudar,
+pedidos repetidos do mesmo período servem o ficheiro já gerado.
+
+A execução depende de settings.RELATORIOS_EXECUTOR:
+- 'celery': tarefa `pedidos.tasks.gerar_relatorio` (worker Celery);
+- 'thread' (padrão sem Redis): ThreadPoolExecutor no próprio processo;
+- 'sincrono': na própria chamada (testes e scripts).
+"""
+import datetime
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+VERSAO_LAYOUT = 1  # incrementar ao mudar o desenho do PDF
+TIMEOUT_PROCESSAMENTO = datetime.timedelta(minutes=15)  # depois disto um job em curso é dado como perdido
+MAX_THREADS = 2
+
+_executor = None
+
+
+def _despesas(farmacia, data_inicio, data_fim):
+    from financeiro.models import Despesa
+
+    return Despesa.objects.filter(
+        farmacia=farmacia,
+    ).filter(
+        Q(status='PAGO', data_pagamento__gte=data_inicio, data_pagamento__lte=data_fim) |
+        Q(status='PENDENTE', data_vencimento__gte=data_inicio, data_vencimento__lte=data_fim)
+    )
+
+
+def versao_dados(farmacia, data_inicio, data_fim):
+    """Impressão digital dos dados do relatório do período."""
+    from .models import Pedido, VendaDiaria
+    from .resumos import intervalo
+
+    inicio, fim = intervalo(data_inicio, data_fim)
+    vendas = VendaDiaria.objects.filter(
+        farmacia=farmacia, dia__gte=data_inicio, dia__lte=data_fim
+    ).exclude(status=Pedido.StatusPedido.CANCELADO).aggregate(
+        n=Sum('num_vendas'), receita=Sum('receita'), iva=Sum('iva')
+    )
+    pedidos = Pedido.objects.filter(
+        farmacia=farmacia, data_criacao__gte=inicio, data_criacao__lt=fim
+    ).aggregate(n=Count('id'), ultimo=Max('id'))
+    despesas = _despesas(farmacia, data_inicio, data_fim).aggregate(
+        n=Count('id'), valor=Sum('valor'), alterada=Max('data_atualizacao')
+    )
+    impressao = repr((
+        VERSAO_LAYOUT, sorted(vendas.items()), sorted(pedidos.items()), sorted(despesas.items()),
+        farmacia.data_atualizacao,
+    ))
+    return hashlib.sha256(impressao.encode()).hexdigest()
+
+
+def solicitar(farmacia, data_inicio, data_fim, usuario=None, despachar=True):
+    """
+    RelatorioGerado do período para a versão atual dos dados: reaproveitado
+    ou novo (posto na fila, salvo `despachar=False` para quem o executa já).
+    """
+    from .models import RelatorioGerado
+
+    versao = versao_dados(farmacia, data_inicio, data_fim)
+    Status = RelatorioGerado.Status
+    existente = RelatorioGerado.objects.filter(
+        farmacia=farmacia, tipo=RelatorioGerado.Tipo.FINANCEIRO_PDF,
+        data_inicio=data_inicio, data_fim=data_fim, versao_dados=versao,
+    ).filter(
+        Q(status=Status.CONCLUIDO) |
+        Q(status__in=[Status.PENDENTE, Status.PROCESSANDO], data_criacao__gte=timezone.now() - TIMEOUT_PROCESSAMENTO)
+    ).order_by('-data_criacao').first()
+    if existente is not None:
+        return existente
+
+    relatorio = RelatorioGerado.objects.create(
+        farmacia=farmacia, data_inicio=data_inicio, data_fim=data_fim,
+        versao_dados=versao, solicitado_por=usuario,
+    )
+    if despachar:
+        transaction.on_commit(lambda: _despachar(relatorio.id))
+    return relatorio
+
+
+def _despachar(relatorio_id):
+    global _executor
+
+    modo = getattr(settings, 'RELATORIOS_EXECUTOR', 'thread')
+    if modo == 'celery':
+        from .tasks import gerar_relatorio
+        gerar_relatorio.delay(str(relatorio_id))
+    elif modo == 'sincrono':
+        executar(relatorio_id)
+    else:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_THREADS, thread_name_prefix='relatorios')
+        _executor.submit(_executar_em_thread, relatorio_id)
+
+
+def _executar_em_thread(relatorio_id):
+    close_old_connections()
+    try:
+        executar(relatorio_id)
+    finally:
+        close_old_connections()
+
+
+def executar(relatorio_id):
+    """Gera o ficheiro de um RelatorioGerado pendente. Seguro contra execuções repetidas."""
+    from .models import RelatorioGerado
+
+    Status = RelatorioGerado.Status
+    # Reserva atómica: só um worker passa de PENDENTE a PROCESSANDO
+    if not RelatorioGerado.objects.filter(pk=relatorio_id, status=Status.PENDENTE).update(
+        status=Status.PROCESSANDO, data_inicio_processamento=timezone.now()
+    ):
+        return
+    relatorio = RelatorioGerado.objects.select_related('farmacia').get(pk=relatorio_id)
+
+    try:
+        conteudo = renderizar_financeiro_pdf(relatorio.farmacia, relatorio.data_inicio, relatorio.data_fim)
+    except Exception as e:
+        logger.exception("Erro ao gerar relatório %s", relatorio_id)
+        RelatorioGerado.objects.filter(pk=relatorio_id).update(
+            status=Status.ERRO, erro=str(e), data_conclusao=timezone.now()
+        )
+        return
+
+    relatorio.arquivo.save(nome_arquivo(relatorio), ContentFile(conteudo), save=False)
+    relatorio.status = Status.CONCLUIDO
+    relatorio.data_conclusao = timezone.now()
+    relatorio.save(update_fields=['arquivo', 'status', 'data_conclusao'])
+    _limpar_versoes_antigas(relatorio)
+
+
+def _limpar_versoes_antigas(relatorio):
+    """Apaga (com os ficheiros) os relatórios concluídos do mesmo período com dados de versões anteriores."""
+    from .models import RelatorioGerado
+
+    antigos = RelatorioGerado.objects.filter(
+        farmacia_id=relatorio.farmacia_id, tipo=relatorio.tipo,
+        data_inicio=relatorio.data_inicio, data_fim=relatorio.data_fim,
+        data_criacao__lt=relatorio.data_criacao,
+    ).exclude(versao_dados=relatorio.versao_dados).exclude(
+        status__in=[RelatorioGerado.Status.PENDENTE, RelatorioGerado.Status.PROCESSANDO]
+    )
+    for antigo in antigos:
+        if antigo.arquivo:
+            antigo.arquivo.delete(save=False)
+        antigo.delete()
+
+
+def nome_arquivo(relatorio):
+    return f"relatorio_financeiro_{relatorio.data_inicio:%Y%m%d}_{relatorio.data_fim:%Y%m%d}.pdf"
+
+
+def _logo(farmacia):
+    """Logotipo da farmácia como ImageReader (lido do storage uma vez por relatório), ou None."""
+    from reportlab.lib.utils import ImageReader
+
+    if not farmacia.logo:
+        return None
+    try:
+        with farmacia.logo.open('rb') as ficheiro:
+            return ImageReader(BytesIO(ficheiro.read()))
+    except Exception as e:
+        logger.warning("Erro ao carregar logo no PDF: %s", e)
+        return None
+
+
+def renderizar_financeiro_pdf(farmacia, data_inicio, data_fim):
+    """PDF do relatório financeiro completo (Vendas + Despesas) do período, em bytes."""
+    from datetime import datetime
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.pdfgen import canvas
+    from .models import Pedido, VendaDiaria
+    from .resumos import intervalo
+
+    # 1. Vendas (Receitas): totais dos resumos diários; os pedidos só para a listagem
+    totais = VendaDiaria.objects.filter(
+        farmacia=farmacia, dia__gte=data_inicio, dia__lte=data_fim
+    ).exclude(status=Pedido.StatusPedido.CANCELADO).aggregate(receita=Sum('receita'), iva=Sum('iva'))
+    total_receita = totais['receita'] or 0
+
+    inicio, fim = intervalo(data_inicio, data_fim)
+    pedidos = Pedido.objects.filter(
+        farmacia=farmacia,
+        data_criacao__gte=inicio,
+        data_criacao__lt=fim
+    ).exclude(status=Pedido.StatusPedido.CANCELADO).select_related('cliente').order_by('data_criacao')
+
+    # 2. Buscar Despesas (Saídas) - Pagas e Pendentes
+    despesas = _despesas(farmacia, data_inicio, data_fim)
+
+    total_despesas_pagas = despesas.filter(status='PAGO').aggregate(Sum('valor'))['valor__sum'] or 0
+    total_despesas_pendentes = despesas.filter(status='PENDENTE').aggregate(Sum('valor'))['valor__sum'] or 0
+    total_despesas_geral = total_despesas_pagas + total_despesas_pendentes
+
+    # 3. Lucro Líquido
+    lucro_liquido = total_receita - total_despesas_geral
+
+    # 4. Unificar Transações para Listagem
+    transacoes = []
+    for p in pedidos:
+        transacoes.append({
+            'data': p.data_criacao,
+            'descricao': f"Venda #{p.numero_pedido} - {p.cliente.get_full_name() if p.cliente else 'Balcão'}",
+            'tipo': 'ENTRADA',
+            'metodo': p.forma_pagamento,
+            'valor': p.total
+        })
+
+    for d in despesas:
+        data_ref = d.data_pagamento if d.status == 'PAGO' and d.data_pagamento else d.data_vencimento
+        if not data_ref: continue
+        # Converter date para datetime para sort compativel
+        dt = datetime.combine(data_ref, datetime.min.time())
+        try:
+            dt = timezone.make_aware(dt)
+        except:
+            pass # Se der erro (ex: settings TZ=False), mantem naive
+
+        transacoes.append({
+            'data': dt,
+            'descricao': f"Despesa: {d.titulo} ({d.status})",
+            'tipo': 'SAIDA',
+            'metodo': 'Caixa' if d.status == 'PAGO' else 'Pendente',
+            'valor': d.valor * -1 # Negativo
+        })
+
+    # Ordenar e Preparar PDF
+    transacoes.sort(key=lambda x: x['data'])
+
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    logo = _logo(farmacia)
+    width, height = A4
+    y = height - 1.5 * cm
+
+    def draw_header():
+        nonlocal y
+        # Logotipo lido uma vez (ver _logo) e desenhado em cada página
+        if logo is not None:
+            p.drawImage(logo, 1.5 * cm, height - 2.5 * cm, width=2.5 * cm, preserveAspectRatio=True, mask='auto')
+
+        p.setFont("Helvetica-Bold", 16)
+        p.drawCentredString(width / 2, height - 1.5 * cm, farmacia.nome.upper())
+        p.setFont("Helvetica", 9)
+        p.drawCentredString(width / 2, height - 2.0 * cm, "RELATÓRIO FINANCEIRO COMPLETO (FISCAL)")
+        p.drawCentredString(width / 2, height - 2.4 * cm, f"Período: {data_inicio} a {data_fim} | Emitido: {timezone.localtime().strftime('%d/%m/%Y %H:%M')}")
+        p.line(1 * cm, height - 2.8 * cm, width - 1 * cm, height - 2.8 * cm)
+        y = height - 3.5 * cm
+
+    draw_header()
+
+    # ============ RESUMO FINANCEIRO ============
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(2 * cm, y, "RESUMO DO PERÍODO & IMPOSTOS")
+    y -= 0.8 * cm
+
+    # Cálculos de Imposto (IVA Incluso): somado item a item na venda, pela taxa de cada produto
+    valor_iva = float(totais['iva'] or 0)
+    base_tributavel = float(total_receita) - valor_iva
+
+    # Bloco de Receita com Impostos
+    p.setFillColorRGB(0.95, 0.95, 0.95)
+    p.rect(1.5 * cm, y - 2.5 * cm, width - 3 * cm, 2.5 * cm, fill=1, stroke=0)
+    p.setFillColorRGB(0, 0, 0)
+
+    y -= 0.5 * cm
+    p.setFont("Helvetica-Bold", 10)
+    p.drawString(2 * cm, y, "FATURAMENTO BRUTO (Total de Vendas):")
+    p.drawRightString(width - 2 * cm, y, f"+ {total_receita:,.2f} MT")
+    y -= 0.5 * cm
+
+    p.setFont("Helvetica", 9)
+    p.drawString(2 * cm, y, "(-) IVA Incluído:")
+    p.drawRightString(width - 2 * cm, y, f"{valor_iva:,.2f} MT")
+    y -= 0.5 * cm
+
+    p.drawString(2 * cm, y, "(=) Base de Incidência Líquida:")
+    p.drawRightString(width - 2 * cm, y, f"{base_tributavel:,.2f} MT")
+    y -= 1 * cm # Margem extra após o bloco
+
+    p.setFont("Helvetica", 10)
+    # Despesas
+    p.drawString(2 * cm, y, "Total de Saídas (Despesas):")
+    p.drawRightString(width - 2 * cm, y, f"- {total_despesas_geral:,.2f} MT")
+    y -= 0.5 * cm
+
+    # Linha Saldo
+    y -= 0.2 * cm
+    p.line(10 * cm, y, width - 2 * cm, y)
+    y -= 0.6 * cm
+
+    # Lucro
+    # Lucro REAL deveria ser sobre a Base Limpa? Geralmente Fluxo de Caixa é sobre o dinheiro bruto que entrou vs saiu.
+    # Mas contabelmente, imposto não é receita.
+    # Vamos manter o Lucro de Caixa (Bruto - Despesas) mas indicar o peso do imposto acima.
+
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(2 * cm, y, "RESULTADO LÍQUIDO (CAIXA):")
+    if lucro_liquido >= 0:
+        p.setFillColorRGB(0, 0.5, 0) # Verde escuro
+    else:
+        p.setFillColorRGB(0.8, 0, 0) # Vermelho
+
+    p.drawRightString(width - 2 * cm, y, f"{lucro_liquido:,.2f} MT")
+    p.setFillColorRGB(0, 0, 0) # Reset cor
+    y -= 1.5 * cm
+
+    # ============ LISTA DE TRANSAÇÕES ============
+    p.setFont("Helvetica-Bold", 11)
+    p.drawString(1 * cm, y, "DETALHAMENTO DE MOVIMENTAÇÕES")
+    y -= 0.8 * cm
+
+    # Cabeçalho Tabela
+    p.setFillColorRGB(0.9, 0.9, 0.9)
+    p.rect(1 * cm, y - 0.2 * cm, width - 2 * cm, 0.6 * cm, fill=1, stroke=0)
+    p.setFillColorRGB(0, 0, 0)
+    p.setFont("Helvetica-Bold", 8)
+    p.drawString(1.2 * cm, y, "DATA")
+    p.drawString(4 * cm, y, "DESCRIÇÃO")
+    p.drawString(12 * cm, y, "MÉTODO")
+    p.drawRightString(width - 1.2 * cm, y, "VALOR (MT)")
+    y -= 0.6 * cm
+
+    p.setFont("Helvetica", 8)
+
+    for item in transacoes:
+        # Verificar Quebra de Página
+        if y < 2 * cm:
+            p.showPage()
+            draw_header()
+            # Repetir cabeçalho tabela
+            p.setFont("Helvetica-Bold", 11)
+            p.drawString(1 * cm, y, "DETALHAMENTO (CONT.)")
+            y -= 0.8 * cm
+            p.setFillColorRGB(0.9, 0.9, 0.9)
+            p.rect(1 * cm, y - 0.2 * cm, width - 2 * cm, 0.6 * cm, fill=1, stroke=0)
+            p.setFillColorRGB(0, 0, 0)
+            p.setFont("Helvetica-Bold", 8)
+            p.drawString(1.2 * cm, y, "DATA")
+            p.drawString(4 * cm, y, "DESCRIÇÃO")
+            p.drawString(12 * cm, y, "MÉTODO")
+            p.drawRightString(width - 1.2 * cm, y, "VALOR (MT)")
+            y -= 0.6 * cm
+            p.setFont("Helvetica", 8)
+
+        # Desenhar Linha
+        data_str = item['data'].strftime('%d/%m/%Y %H:%M')
+        if item['tipo'] == 'ENTRADA':
+            p.setFillColorRGB(0, 0.4, 0)
+        else:
+            p.setFillColorRGB(0.6, 0, 0)
+
+        p.drawString(1.2 * cm, y, data_str)
+
+        p.setFillColorRGB(0, 0, 0) # Descrição preta
+        desc = item['descricao'][:50] # Truncar
+        p.drawString(4 * cm, y, desc)
+        p.drawString(12 * cm, y, item['metodo'])
+
+        if item['tipo'] == 'ENTRADA':
+            p.setFillColorRGB(0, 0, 0) # Valor normal
+        else:
+            p.setFillColorRGB(0.8, 0, 0) # Vermelho se saída
+
+        p.drawRightString(width - 1.2 * cm, y, f"{item['valor']:,.2f}")
+
+        p.setFillColorRGB(0, 0, 0) # Reset
+
+        # Linha fina separadora
+        p.setLineWidth(0.5)
+        p.setStrokeColorRGB(0.9, 0.9, 0.9)
+        p.line(1 * cm, y - 0.1 * cm, width - 1 * cm, y - 0.1 * cm)
+
+        y -= 0.5 * cm
+
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
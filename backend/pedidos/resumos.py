@@ -0,0 +1,207 @@
+"""
+Resumos diários de vendas (VendaDiaria e VendaProdutoDiaria).
+
+Cada pedido é contado no dia local da sua criação, na linha do seu status
+atual. `registrar(pedido, itens)` soma-o aos resumos na transação que o cria;
+`mudar_status(pedido, anterior)` passa-o da linha do status anterior para a
+do novo (chamado pelo Pedido.save). Os leitores escolhem os status que
+contam como venda: os relatórios e o dashboard excluem CANCELADO, a análise
+financeira conta só os pedidos confirmados e entregues.
+
+Cada resumo é atualizado com uma leitura com bloqueio (ordem por id, como
+nos lotes) e um único UPDATE com F() + Case para todas as linhas tocadas;
+as linhas que ainda não existem são criadas num bulk_create.
+
+Medidas: num_vendas, quantidade (itens), receita (total do pedido; subtotal
+do item no resumo por produto), custo (o do item, soma dos lotes baixados;
+em pedidos sem baixa, quantidade x custo do lote) e IVA
+(incluído no preço, por item, conforme o produto).
+
+Alterações de itens depois da venda (ex.: admin) não passam por aqui:
+`reconstruir()` (comando `reconstruir_resumos_vendas`) refaz um período a
+partir dos pedidos.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+MEDIDAS_INTEIRAS = ('num_vendas', 'quantidade')
+MEDIDAS_DECIMAIS = ('receita', 'custo', 'iva')
+TAMANHO_LOTE = 2000
+CENTAVO = Decimal('0.01')
+
+
+def dia_local(momento):
+    return timezone.localtime(momento).date()
+
+
+def intervalo(inicio, fim):
+    """Datas locais [inicio, fim] -> (datetime inicial, datetime final exclusivo), para filtros que usam índice."""
+    return (
+        timezone.make_aware(datetime.datetime.combine(inicio, datetime.time.min)),
+        timezone.make_aware(datetime.datetime.combine(fim + datetime.timedelta(days=1), datetime.time.min)),
+    )
+
+
+def iva_incluido(valor, isento, taxa):
+    """IVA incluído em `valor` (preço com IVA), arredondado ao centavo."""
+    if isento or not taxa:
+        return Decimal('0')
+    return (valor - valor * 100 / (100 + taxa)).quantize(CENTAVO)
+
+
+def custo_item(custo, quantidade, custo_lote):
+    """Custo da linha: o gravado na venda (soma dos lotes) ou, sem ele, quantidade x custo do lote."""
+    if custo is not None:
+        return custo
+    return quantidade * custo_lote if custo_lote is not None else Decimal('0')
+
+
+def _vazio():
+    return {'num_vendas': 0, 'quantidade': 0, 'receita': Decimal('0'), 'custo': Decimal('0'), 'iva': Decimal('0')}
+
+
+def _deltas(pedido, itens, sinal):
+    venda = _vazio()
+    venda['num_vendas'] = sinal
+    venda['receita'] = sinal * pedido.total
+    por_produto = defaultdict(_vazio)
+    for item in itens:
+        custo = custo_item(item.custo, item.quantidade, item.estoque.preco_custo if item.estoque_id else None)
+        iva = iva_incluido(item.subtotal, item.produto.is_isento_iva, item.produto.taxa_iva)
+        linha = por_produto[item.produto_id]
+        linha['num_vendas'] = sinal
+        linha['quantidade'] += sinal * item.quantidade
+        linha['receita'] += sinal * item.subtotal
+        linha['custo'] += sinal * custo
+        linha['iva'] += sinal * iva
+        venda['quantidade'] += sinal * item.quantidade
+        venda['custo'] += sinal * custo
+        venda['iva'] += sinal * iva
+    return venda, por_produto
+
+
+def _filtro_chave(campo, valores):
+    filtro = Q(**{f'{campo}__in': [v for v in valores if v is not None]})
+    if None in valores:
+        filtro |= Q(**{f'{campo}__isnull': True})
+    return filtro
+
+
+def _acumular(modelo, comuns, campo, deltas):
+    """Soma `deltas` ({valor de `campo`: {medida: delta}}) às linhas de `modelo` com os filtros `comuns`."""
+    existentes = {}
+    for pk, chave in modelo.objects.select_for_update().filter(**comuns).filter(
+        _filtro_chave(campo, list(deltas))
+    ).order_by('id').values_list('id', campo):
+        existentes.setdefault(chave, pk)
+
+    if existentes:
+        atualizacoes = {}
+        for medida in MEDIDAS_INTEIRAS + MEDIDAS_DECIMAIS:
+            saida = IntegerField() if medida in MEDIDAS_INTEIRAS else DecimalField(max_digits=14, decimal_places=2)
+            atualizacoes[medida] = F(medida) + Case(
+                *[When(pk=pk, then=Value(deltas[chave][medida], output_field=saida)) for chave, pk in existentes.items()],
+                default=Value(0, output_field=saida),
+                output_field=saida,
+            )
+        modelo.objects.filter(pk__in=list(existentes.values())).update(**atualizacoes)
+
+    modelo.objects.bulk_create([
+        modelo(**comuns, **{campo: chave}, **medidas)
+        for chave, medidas in deltas.items() if chave not in existentes
+    ])
+
+
+def registrar(pedido, itens, sinal=1, status=None):
+    """
+    Soma (sinal=1) ou subtrai (sinal=-1) o pedido aos resumos, na linha de `status`
+    (por omissão o atual). `itens` com produto (e lote) carregados.
+    """
+    from .models import VendaDiaria, VendaProdutoDiaria
+
+    status = status or pedido.status
+    venda, por_produto = _deltas(pedido, itens, sinal)
+    dia = dia_local(pedido.data_criacao)
+    # Sem savepoint: corre dentro da transação da venda (ou abre uma, se chamado fora)
+    with transaction.atomic(savepoint=False):
+        _acumular(
+            VendaDiaria,
+            {'farmacia_id': pedido.farmacia_id, 'dia': dia, 'status': status, 'forma_pagamento': pedido.forma_pagamento},
+            'vendedor_id', {pedido.vendedor_id: venda}
+        )
+        if por_produto:
+            _acumular(
+                VendaProdutoDiaria, {'farmacia_id': pedido.farmacia_id, 'dia': dia, 'status': status},
+                'produto_id', por_produto
+            )
+
+
+def mudar_status(pedido, anterior):
+    """Passa o pedido da linha do status `anterior` para a do status atual."""
+    itens = list(pedido.itens.select_related('produto', 'estoque'))
+    registrar(pedido, itens, sinal=-1, status=anterior)
+    registrar(pedido, itens)
+
+
+def reconstruir(inicio, fim, farmacia_ids=None):
+    """Refaz os resumos dos dias [inicio, fim] a partir dos pedidos. Retorna (linhas de venda, linhas de produto)."""
+    from .models import ItemPedido, Pedido, VendaDiaria, VendaProdutoDiaria
+
+    desde, ate = intervalo(inicio, fim)
+    pedidos = Pedido.objects.filter(data_criacao__gte=desde, data_criacao__lt=ate)
+    resumos = {'dia__gte': inicio, 'dia__lte': fim}
+    if farmacia_ids is not None:
+        pedidos = pedidos.filter(farmacia_id__in=farmacia_ids)
+        resumos['farmacia_id__in'] = farmacia_ids
+
+    vendas = defaultdict(_vazio)
+    for farmacia_id, criacao, status, forma, vendedor_id, total in pedidos.order_by().values_list(
+        'farmacia_id', 'data_criacao', 'status', 'forma_pagamento', 'vendedor_id', 'total'
+    ).iterator(chunk_size=TAMANHO_LOTE):
+        venda = vendas[(farmacia_id, dia_local(criacao), status, forma, vendedor_id)]
+        venda['num_vendas'] += 1
+        venda['receita'] += total
+
+    # Itens em Python, com o mesmo cálculo (e arredondamento do IVA por item) de registrar()
+    por_produto = defaultdict(_vazio)
+    pedidos_produto = defaultdict(set)
+    for (farmacia_id, criacao, status, forma, vendedor_id, pedido_id, produto_id, quantidade, subtotal, custo_linha,
+         custo_lote, isento, taxa) in ItemPedido.objects.filter(pedido__in=pedidos).order_by().values_list(
+        'pedido__farmacia_id', 'pedido__data_criacao', 'pedido__status', 'pedido__forma_pagamento', 'pedido__vendedor_id',
+        'pedido_id', 'produto_id', 'quantidade', 'subtotal', 'custo', 'estoque__preco_custo',
+        'produto__is_isento_iva', 'produto__taxa_iva',
+    ).iterator(chunk_size=TAMANHO_LOTE):
+        dia = dia_local(criacao)
+        custo = custo_item(custo_linha, quantidade, custo_lote)
+        iva = iva_incluido(subtotal, isento, taxa)
+        chave_produto = (farmacia_id, dia, status, produto_id)
+        for linha in (vendas[(farmacia_id, dia, status, forma, vendedor_id)], por_produto[chave_produto]):
+            linha['quantidade'] += quantidade
+            linha['custo'] += custo
+            linha['iva'] += iva
+        por_produto[chave_produto]['receita'] += subtotal
+        pedidos_produto[chave_produto].add(pedido_id)
+
+    with transaction.atomic():
+        VendaDiaria.objects.filter(**resumos).delete()
+        VendaProdutoDiaria.objects.filter(**resumos).delete()
+        VendaDiaria.objects.bulk_create([
+            VendaDiaria(
+                farmacia_id=farmacia_id, dia=dia, status=status, forma_pagamento=forma, vendedor_id=vendedor_id,
+                **medidas
+            )
+            for (farmacia_id, dia, status, forma, vendedor_id), medidas in vendas.items()
+        ], batch_size=TAMANHO_LOTE)
+        VendaProdutoDiaria.objects.bulk_create([
+            VendaProdutoDiaria(
+                farmacia_id=farmacia_id, dia=dia, status=status, produto_id=produto_id,
+                **dict(medidas, num_vendas=len(pedidos_produto[(farmacia_id, dia, status, produto_id)]))
+            )
+            for (farmacia_id, dia, status, produto_id), medidas in por_produto.items()
+        ], batch_size=TAMANHO_LOTE)
+    return len(vendas), len(por_produto)
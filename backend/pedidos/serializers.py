@@ -1,8 +1,11 @@
 from rest_framework import serializers
-from .models import Pedido, ItemPedido, HistoricoPedido
+from .models import Pedido, ItemPedido, ItemPedidoLote, HistoricoPedido, RelatorioGerado
+from . import resumos
 from produtos.serializers import ProdutoSerializer
 from produtos.models import EstoqueProduto
 from django.db import transaction
+from django.db.models import F, Prefetch, prefetch_related_objects
+from django.utils import timezone
 from decimal import Decimal
 
 class ItemPedidoSerializer(serializers.ModelSerializer):
@@ -47,15 +50,55 @@ class PedidoCreateSerializer(serializers.ModelSerializer):
         return data
     
     def create(self, validated_data):
-        print(f"DEBUG - Criando pedido com: {validated_data}")
+        """
+        Monta o pedido de uma vez: os preços vêm do estoque da farmácia (uma query,
+        mesmo lote de referência das ofertas do marketplace), os itens entram num
+        bulk_create e os totais são calculados em memória antes do único INSERT.
+        """
+        from produtos.ofertas import preco_final_expr
+
         itens_data = validated_data.pop('itens')
-        pedido = Pedido.objects.create(**validated_data)
-        
+        farmacia = validated_data['farmacia']
+
+        # Lote de referência por produto: o mais barato, FEFO no empate
+        precos = {}
+        lotes = EstoqueProduto.objects.filter(
+            farmacia=farmacia,
+            produto__in=[item['produto'] for item in itens_data],
+            quantidade__gt=0,
+            is_disponivel=True
+        ).annotate(preco_final_db=preco_final_expr()).order_by(
+            'produto_id', 'preco_final_db', F('data_validade').asc(nulls_last=True), 'id'
+        ).values_list('produto_id', 'preco_final_db')
+        for produto_id, preco in lotes:
+            precos.setdefault(produto_id, preco)
+
+        itens = []
         for item_data in itens_data:
-            ItemPedido.objects.create(pedido=pedido, **item_data)
-        
-        # Recalcular totais
-        pedido.calcular_total()
+            produto = item_data['produto']
+            if produto.id not in precos:
+                raise serializers.ValidationError({'itens': f'{produto.nome} não está disponível nesta farmácia.'})
+            item_data['preco_unitario'] = precos[produto.id]
+            itens.append(ItemPedido(subtotal=item_data['quantidade'] * precos[produto.id], **item_data))
+
+        subtotal = sum((item.subtotal for item in itens), Decimal('0'))
+        taxa_entrega = farmacia.taxa_entrega if farmacia.aceita_entregas else Decimal('0')
+
+        with transaction.atomic():
+            pedido = Pedido.objects.create(
+                subtotal=subtotal,
+                taxa_entrega=taxa_entrega,
+                total=subtotal + taxa_entrega,
+                **validated_data
+            )
+            for item in itens:
+                item.pedido = pedido
+            # bulk_create não passa pelo ItemPedido.save (que recalcula o pedido a cada item)
+            ItemPedido.objects.bulk_create(itens)
+            resumos.registrar(pedido, itens)
+
+        # A resposta lista os itens com o nome do produto: carrega-os de uma vez
+        prefetch_related_objects([pedido], Prefetch('itens', queryset=ItemPedido.objects.select_related('produto')))
         return pedido
 
 
@@ -136,17 +179,68 @@ class VendaBalcaoSerializer(serializers.Serializer):
             if cliente_obj.is_bloqueado:
                 raise serializers.ValidationError(f"O Cliente {cliente_obj.nome_completo} está BLOQUEADO para compras a crédito.")
 
-        # Validação de Estoque antes de criar
+        # Normalizar itens (converter tipos para garantir). Cada linha indica o lote
+        # (`estoque_id`) ou só o produto (`produto_id`), alocado por FEFO entre os lotes.
+        linhas = []
         for item in itens_data:
             try:
-                estoque = EstoqueProduto.objects.get(id=item['estoque_id'], farmacia=user.farmacia)
-                if estoque.quantidade < item['quantidade']:
-                    raise serializers.ValidationError(f"Estoque insuficiente para {estoque.produto.nome}")
-            except EstoqueProduto.DoesNotExist:
-                raise serializers.ValidationError(f"Produto não encontrado no estoque.")
+                linhas.append({
+                    'estoque_id': int(item['estoque_id']) if item.get('estoque_id') else None,
+                    'produto_id': int(item['produto_id']) if item.get('produto_id') else None,
+                    'quantidade': int(item['quantidade']),
+                    'preco': Decimal(str(item['preco_unitario'])),
+                    'is_avulso': bool(item.get('is_avulso', False)),
+                })
+            except (KeyError, TypeError, ValueError, ArithmeticError):
+                raise serializers.ValidationError("Item de venda inválido.")
+            if not (linhas[-1]['estoque_id'] or linhas[-1]['produto_id']):
+                raise serializers.ValidationError("Item de venda inválido.")
+
+        from produtos.alocacao import AlocadorFEFO, EstoqueInsuficiente
+        from produtos.models import MovimentacaoEstoque
 
         with transaction.atomic():
-            # 1. Criar o Pedido
+            # 1. Bloquear todos os lotes da venda numa única query (ordem por id evita deadlocks entre caixas)
+            alocador = AlocadorFEFO(
+                user.farmacia,
+                produto_ids=[linha['produto_id'] for linha in linhas if not linha['estoque_id']],
+                estoque_ids=[linha['estoque_id'] for linha in linhas if linha['estoque_id']]
+            )
+
+            # 2. Reservar baixas por lote, calcular subtotais e comissões
+            for linha in linhas:
+                if linha['estoque_id']:
+                    estoque = alocador.lote(linha['estoque_id'])
+                    produto = estoque.produto if estoque else None
+                else:
+                    produto = alocador.produto(linha['produto_id'])
+                if produto is None:
+                    raise serializers.ValidationError("Produto não encontrado no estoque.")
+
+                # Se for integral (Caixa), subtrai (quantidade * unidades_por_caixa)
+                # Se for avulso (Carteira), subtrai apenas a quantidade
+                baixa = linha['quantidade']
+                if not linha['is_avulso']:
+                    baixa = linha['quantidade'] * produto.unidades_por_caixa
+                try:
+                    if linha['estoque_id']:
+                        linha['lotes'] = alocador.reservar(linha['estoque_id'], baixa)
+                    else:
+                        linha['lotes'] = alocador.alocar(produto.id, baixa)
+                except EstoqueInsuficiente as e:
+                    raise serializers.ValidationError(str(e))
+                linha['produto'] = produto
+
+                linha['subtotal'] = linha['quantidade'] * linha['preco']
+                # Usa a comissão do produto ou a padrão da farmácia
+                percentual = produto.percentual_comissao
+                if percentual <= 0:
+                    percentual = user.farmacia.percentual_comissao_padrao
+                linha['comissao'] = (linha['subtotal'] * percentual) / 100
+
+            total = sum((linha['subtotal'] for linha in linhas), Decimal('0'))
+
+            # 3. Criar o Pedido já com o total (a fatura/QR gerada no signal leva o valor certo)
             pedido = Pedido.objects.create(
                 vendedor=user, 
                 farmacia=user.farmacia,
@@ -157,74 +251,56 @@ class VendaBalcaoSerializer(serializers.Serializer):
                 pago=(pagamento != Pedido.FormaPagamento.CREDITO),
                 valor_pago=validated_data.get('valor_pago', 0) if pagamento != Pedido.FormaPagamento.CREDITO else 0,
                 troco=validated_data.get('troco', 0) if pagamento != Pedido.FormaPagamento.CREDITO else 0,
+                subtotal=total,
+                total=total,
                 endereco_entrega="BALCÃO",
                 bairro="-", cidade="-",
                 telefone_contato="-",
                 observacoes=f"Venda Balcão - Cliente: {cliente_obj.nome_completo if cliente_obj else cliente_nome}",
                 receita_medica=validated_data.get('receita_medica')
             )
-            
-                # 2. Criar Itens e Baixar Estoque
-            for item in itens_data:
-                # Converter tipos para garantir
-                item_qtd = int(item['quantidade'])
-                item_preco = Decimal(str(item['preco_unitario']))
-                item_estoque_id = int(item['estoque_id'])
-                item_is_avulso = item.get('is_avulso', False)
-
-                estoque = EstoqueProduto.objects.select_for_update().get(id=item_estoque_id)
-                
-                # Calcular baixa de estoque real
-                # Se for integral (Caixa), subtrai (quantidade * unidades_por_caixa)
-                # Se for avulso (Carteira), subtrai apenas a quantidade
-                baixa_real = item_qtd
-                if not item_is_avulso:
-                    baixa_real = item_qtd * estoque.produto.unidades_por_caixa
-
-                if estoque.quantidade < baixa_real:
-                    raise serializers.ValidationError(f"Estoque insuficiente para {estoque.produto.nome} (Solicitado: {baixa_real} unidades)")
-
-                # Calcular Comissão
-                subtotal_item = item_qtd * item_preco
-                # Usa a comissão do produto ou a padrão da farmácia
-                percentual = estoque.produto.percentual_comissao
-                if percentual <= 0:
-                    percentual = user.farmacia.percentual_comissao_padrao
-                    
-                valor_comis = (subtotal_item * percentual) / 100
 
-                # Criar ItemPedido
-                ItemPedido.objects.create(
+            # 4. Itens num bulk_create (sem o recálculo do total por item do ItemPedido.save).
+            # `estoque` é o primeiro lote (FEFO); a baixa em cada lote fica em ItemPedidoLote,
+            # que a anulação reverte lote a lote, e o custo é a soma dos lotes.
+            itens = ItemPedido.objects.bulk_create([
+                ItemPedido(
                     pedido=pedido,
-                    produto=estoque.produto,
-                    estoque=estoque,
-                    quantidade=item_qtd,
-                    preco_unitario=item_preco,
-                    subtotal=subtotal_item,
-                    is_avulso=item_is_avulso,
-                    valor_comissao=valor_comis
-                )
-                
-                # Baixar Estoque e Registrar Movimentação
-                quantidade_anterior = estoque.quantidade
-                estoque.quantidade -= baixa_real
-                estoque.save()
+                    produto=linha['produto'],
+                    estoque=linha['lotes'][0][0],
+                    quantidade=linha['quantidade'],
+                    preco_unitario=linha['preco'],
+                    subtotal=linha['subtotal'],
+                    is_avulso=linha['is_avulso'],
+                    valor_comissao=linha['comissao'],
+                    custo=sum((quantidade * estoque.preco_custo for estoque, quantidade, _, _ in linha['lotes']), Decimal('0'))
+                ) for linha in linhas
+            ])
+            ItemPedidoLote.objects.bulk_create([
+                ItemPedidoLote(item=item, estoque=estoque, quantidade=quantidade, custo_unitario=estoque.preco_custo)
+                for item, linha in zip(itens, linhas) for estoque, quantidade, _, _ in linha['lotes']
+            ])
+            resumos.registrar(pedido, itens)
 
-                from produtos.models import MovimentacaoEstoque
-                MovimentacaoEstoque.objects.create(
+            # 5. Baixar Estoque: um UPDATE com F() para todos os lotes
+            alocador.aplicar()
+
+            # 6. Registrar Movimentações (kardex): uma por lote de cada linha
+            MovimentacaoEstoque.objects.bulk_create([
+                MovimentacaoEstoque(
                     estoque=estoque,
                     tipo='SAIDA',
-                    quantidade=baixa_real,
-                    quantidade_anterior=quantidade_anterior,
-                    quantidade_nova=estoque.quantidade,
+                    quantidade=quantidade,
+                    quantidade_anterior=anterior,
+                    quantidade_nova=nova,
                     custo_unitario=estoque.preco_custo,
-                    preco_venda_unitario=item_preco,
+                    preco_venda_unitario=linha['preco'],
                     usuario=user,
                     referencia_externa=f"Venda {pedido.numero_pedido}",
-                    motivo=f"Venda de Balcão (POS) - {'Avulso' if item_is_avulso else 'Integral'}"
-                )
+                    motivo=f"Venda de Balcão (POS) - {'Avulso' if linha['is_avulso'] else 'Integral'}"
+                ) for linha in linhas for estoque, quantidade, anterior, nova in linha['lotes']
+            ])
             
-            pedido.calcular_total()
             
             # DERRUBANDO PRIMAVERA: Lógica de Conta Corrente e Limite
             if pagamento == Pedido.FormaPagamento.CREDITO and cliente_obj:
@@ -234,7 +310,6 @@ class VendaBalcaoSerializer(serializers.Serializer):
                 
                 from clientes.models import MovimentoContaCorrente
                 import datetime
-                from django.utils import timezone
                 
                 # Registar Movimento de Débito
                 MovimentoContaCorrente.objects.create(
@@ -276,6 +351,28 @@ class VendaBalcaoSerializer(serializers.Serializer):
                     'total': float(i.subtotal),
                     'is_isento': i.produto.is_isento_iva,
                     'taxa_iva': float(i.produto.taxa_iva)
-                } for i in instance.itens.all()
+                } for i in instance.itens.select_related('produto')
             ]
         }
+
+
+class RelatorioGeradoSerializer(serializers.ModelSerializer):
+    """Estado de um relatório em segundo plano e link de download (quando concluído)."""
+
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RelatorioGerado
+        fields = (
+            'id', 'tipo', 'data_inicio', 'data_fim', 'status', 'erro',
+            'data_criacao', 'data_conclusao', 'download_url'
+        )
+
+    def get_download_url(self, obj):
+        from django.urls import reverse
+
+        if obj.status != RelatorioGerado.Status.CONCLUIDO:
+            return None
+        url = reverse('relatorio-download', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
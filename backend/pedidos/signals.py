@@ -1,5 +1,6 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from farmacias import painel
 from .models import Pedido
 import qrcode
 from io import BytesIO
@@ -58,3 +59,10 @@ def gerar_seguranca_pedido(sender, instance, created, **kwargs):
             instance.qrcode_entrega.save(f"qr_entrega_{instance.numero_pedido}.png", gerar_imagem_qr(dados_entrega), save=False)
             
             instance.save()
+
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_delete, sender=Pedido)
+def invalidar_painel(sender, instance, **kwargs):
+    """Vendas e mudanças de status mudam o dashboard da farmácia (farmacias.painel)."""
+    painel.invalidar([instance.farmacia_id])
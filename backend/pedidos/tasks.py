@@ -0,0 +1,8 @@
+from celery import shared_task
+
+
+@shared_task(ignore_result=True)
+def gerar_relatorio(relatorio_id):
+    """Gera um RelatorioGerado pendente (o estado fica no próprio modelo)."""
+    from .relatorios import executar
+    executar(relatorio_id)
@@ -1,3 +1,167 @@
-from django.test import TestCase
+import datetime
+import shutil
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory
+
+from accounts.models import User
+from caixa.models import Caixa, SessaoCaixa
+from farmacias.models import Farmacia
+from produtos.models import EstoqueProduto, Produto
+
+from . import resumos
+from .models import ItemPedido, Pedido, VendaDiaria, VendaProdutoDiaria
+from .serializers import VendaBalcaoSerializer
+
+MEDIA_TESTES = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TESTES)
+class VendaBalcaoLotesTest(TestCase):
+    """Uma linha vendida por FEFO de vários lotes grava a baixa de cada lote."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_TESTES, ignore_errors=True)
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(email='farmacia@teste.com', password='x', tipo_usuario='FARMACIA')
+        self.farmacia = Farmacia.objects.create(
+            usuario=self.usuario, nome='Farmácia Teste', nuit='123456789', telefone_principal='840000000',
+            email=self.usuario.email, endereco='-', bairro='-', cidade='Maputo', provincia='Maputo',
+            latitude=Decimal('-25.96'), longitude=Decimal('32.58'),
+        )
+        self.usuario = User.objects.get(pk=self.usuario.pk)
+        caixa = Caixa.objects.create(farmacia=self.farmacia, nome='Caixa 01', codigo='CX01')
+        SessaoCaixa.objects.create(caixa=caixa, operador=self.usuario, status='ABERTO')
+
+        self.produto = Produto.objects.create(nome='Paracetamol 500mg', codigo_barras='560000000001')
+        hoje = datetime.date.today()
+        self.lote_a = EstoqueProduto.objects.create(
+            farmacia=self.farmacia, produto=self.produto, lote='A', quantidade=3,
+            preco_custo=Decimal('10'), preco_venda=Decimal('30'), data_validade=hoje + datetime.timedelta(days=60),
+        )
+        self.lote_b = EstoqueProduto.objects.create(
+            farmacia=self.farmacia, produto=self.produto, lote='B', quantidade=10,
+            preco_custo=Decimal('20'), preco_venda=Decimal('30'), data_validade=hoje + datetime.timedelta(days=300),
+        )
+
+    def _vender(self, quantidade):
+        request = APIRequestFactory().post('/')
+        request.user = self.usuario
+        serializer = VendaBalcaoSerializer(data={
+            'tipo_pagamento': 'DINHEIRO',
+            'itens': [{'produto_id': self.produto.id, 'quantidade': quantidade, 'preco_unitario': '30', 'is_avulso': True}],
+        }, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_custo_soma_os_lotes_baixados(self):
+        pedido = self._vender(5)
+
+        item = pedido.itens.get()
+        self.assertEqual(item.custo, Decimal('70'))  # 3 x 10 + 2 x 20
+        self.assertEqual(
+            sorted(item.lotes.values_list('estoque_id', 'quantidade')),
+            [(self.lote_a.id, 3), (self.lote_b.id, 2)],
+        )
+        self.assertEqual(sum(VendaDiaria.objects.values_list('custo', flat=True)), Decimal('70'))
+
+    def test_anulacao_devolve_cada_lote(self):
+        pedido = self._vender(5)
+        self.lote_a.refresh_from_db()
+        self.lote_b.refresh_from_db()
+        self.assertEqual((self.lote_a.quantidade, self.lote_b.quantidade), (0, 8))
+
+        pedido.anular_venda(motivo='Teste', usuario=self.usuario)
+
+        self.lote_a.refresh_from_db()
+        self.lote_b.refresh_from_db()
+        self.assertEqual((self.lote_a.quantidade, self.lote_b.quantidade), (3, 10))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_TESTES)
+class ResumoPorStatusTest(TestCase):
+    """A análise só conta a receita dos pedidos confirmados ou entregues; o pedido muda de linha com o status."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_TESTES, ignore_errors=True)
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(email='farmacia@teste.com', password='x', tipo_usuario='FARMACIA')
+        self.farmacia = Farmacia.objects.create(
+            usuario=self.usuario, nome='Farmácia Teste', nuit='123456789', telefone_principal='840000000',
+            email=self.usuario.email, endereco='-', bairro='-', cidade='Maputo', provincia='Maputo',
+            latitude=Decimal('-25.96'), longitude=Decimal('32.58'),
+        )
+        self.usuario = User.objects.get(pk=self.usuario.pk)
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+
+        produto = Produto.objects.create(nome='Paracetamol 500mg', codigo_barras='560000000001')
+        produto = Produto.objects.get(pk=produto.pk)  # taxa_iva em Decimal, como vem do banco
+        # Pedido online, como o PedidoCreateSerializer: criado PENDENTE e registado nos resumos
+        self.pedido = Pedido.objects.create(
+            farmacia=self.farmacia, subtotal=Decimal('60'), total=Decimal('60')
+        )
+        itens = ItemPedido.objects.bulk_create([ItemPedido(
+            pedido=self.pedido, produto=produto, quantidade=2, preco_unitario=Decimal('30'), subtotal=Decimal('60'),
+        )])
+        resumos.registrar(self.pedido, itens)
+
+    def _receita(self):
+        fluxo = self.cliente.get('/api/v1/farmacias/dashboard/report/', {'periodo': 1}).json()['fluxo_caixa']
+        return fluxo['total_receita']
+
+    def _linhas(self):
+        return sorted(VendaDiaria.objects.filter(num_vendas__gt=0).values_list('status', 'num_vendas', 'receita'))
+
+    def test_receita_so_depois_de_confirmado(self):
+        self.assertEqual(self._receita(), 0)
+        self.assertEqual(self._linhas(), [('PENDENTE', 1, Decimal('60'))])
+
+        self.pedido.status = Pedido.StatusPedido.ENTREGUE
+        self.pedido.save()
+
+        self.assertEqual(self._receita(), 60)
+        self.assertEqual(self._linhas(), [('ENTREGUE', 1, Decimal('60'))])
+        self.assertEqual(
+            list(VendaProdutoDiaria.objects.filter(quantidade__gt=0).values_list('status', 'quantidade')),
+            [('ENTREGUE', 2)],
+        )
+
+        self.pedido.status = Pedido.StatusPedido.CANCELADO
+        self.pedido.save()
+
+        self.assertEqual(self._receita(), 0)
+        self.assertEqual(self._linhas(), [('CANCELADO', 1, Decimal('60'))])
+
+    def test_reconstruir_igual_aos_incrementais(self):
+        self.pedido.status = Pedido.StatusPedido.CONFIRMADO
+        self.pedido.save()
+        incrementais = self._linhas()
+
+        hoje = datetime.date.today()
+        resumos.reconstruir(hoje - datetime.timedelta(days=1), hoje + datetime.timedelta(days=1))
+
+        self.assertEqual(self._linhas(), incrementais)
+
+
+class RelatorioArquivoTest(TestCase):
+    """Os PDFs gerados ficam fora do MEDIA_ROOT, num caminho com a farmácia e o id do relatório."""
+
+    def test_caminho_privado(self):
+        import os
+        from django.conf import settings
+        from .models import RelatorioGerado
+
+        relatorio = RelatorioGerado(farmacia_id=7, data_inicio=datetime.date.today(), data_fim=datetime.date.today())
+        campo = RelatorioGerado._meta.get_field('arquivo')
+
+        self.assertEqual(campo.generate_filename(relatorio, 'r.pdf'), f'7/{relatorio.id}/r.pdf')
+        self.assertFalse(os.path.abspath(campo.storage.location).startswith(os.path.abspath(settings.MEDIA_ROOT)))
@@ -3,7 +3,8 @@ from .views import (
     PedidoCreateView, PedidoListView, 
     PedidoDetailView, AtualizarStatusPedidoView,
     VendaBalcaoView, DashboardStatsView, MeusPedidosView,
-    RelatorioVendasPDFView, AnularPedidoView, ExtratoVendasView, ComissaoView
+    RelatorioVendasPDFView, AnularPedidoView, ExtratoVendasView, ComissaoView,
+    FechoComissaoView, RelatorioGeradoView, RelatorioDownloadView
 )
 
 urlpatterns = [
@@ -11,6 +12,7 @@ urlpatterns = [
     path('novo/', PedidoCreateView.as_view(), name='pedido_create'),
     path('extrato/', ExtratoVendasView.as_view(), name='extrato-vendas'),
     path('comissoes/', ComissaoView.as_view(), name='comissoes'),
+    path('comissoes/fecho/', FechoComissaoView.as_view(), name='comissoes-fecho'),
     path('venda-balcao/', VendaBalcaoView.as_view(), name='venda-balcao'),
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
     path('meus-pedidos/', MeusPedidosView.as_view(), name='meus-pedidos'),
@@ -18,4 +20,6 @@ urlpatterns = [
     path('<int:pk>/status/', AtualizarStatusPedidoView.as_view(), name='pedido_status_update'),
     path('<int:pk>/anular/', AnularPedidoView.as_view(), name='pedido-anular'),
     path('relatorios/vendas-pdf/', RelatorioVendasPDFView.as_view(), name='vendas-pdf'),
+    path('relatorios/<uuid:pk>/', RelatorioGeradoView.as_view(), name='relatorio-status'),
+    path('relatorios/<uuid:pk>/download/', RelatorioDownloadView.as_view(), name='relatorio-download'),
 ]
@@ -2,17 +2,12 @@ from rest_framework import generics, permissions, filters, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import HttpResponse
+from django.db.models import Q, Sum
+from django.utils import timezone
+from config.pagination import PaginacaoCursorOpcional
 from .models import Pedido
 from .serializers import PedidoCreateSerializer, PedidoListSerializer, PedidoDetailSerializer, VendaBalcaoSerializer
 
-# Imports para PDF
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from io import BytesIO
-
 class VendaBalcaoView(APIView):
     """Processa uma venda de balcão completa (POS)."""
     permission_classes = (permissions.IsAuthenticated,)
@@ -51,9 +46,14 @@ class PedidoCreateView(generics.CreateAPIView):
 
 
 class PedidoListView(generics.ListAPIView):
-    """Lista os pedidos do usuário logado com suporte a filtragem avançada."""
+    """
+    Lista os pedidos do usuário logado com suporte a filtragem avançada.
+    `?cursor=` ativa a paginação por keyset (data_criacao, id).
+    """
     serializer_class = PedidoListSerializer
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = PaginacaoCursorOpcional
+    ordenacao_cursor = ('-data_criacao', '-id')
     filter_backends = (DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter)
     filterset_fields = {
         'status': ['exact', 'in'],
@@ -132,11 +132,32 @@ class AnularPedidoView(APIView):
         except Exception as e:
             return Response({"erro": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+def _nome_usuario(nome, apelido, email):
+    """Mesmo resultado de User.get_full_name(), a partir de colunas de values_list."""
+    return f"{nome or ''} {apelido or ''}".strip() or email
+
+
 class ExtratoVendasView(APIView):
-    """Extrato de vendas detalhado com lucro (Estilo Primavera/ERP)."""
+    """
+    Extrato de vendas detalhado com lucro (Estilo Primavera/ERP).
+
+    Lucro, base tributável e IVA de cada pedido são somados no banco (uma
+    query agrupada por pedido, itens e lotes no JOIN) e os totais num só
+    aggregate sobre ela. O CSV (`export=true`) é gerado em streaming, em
+    blocos, com memória constante qualquer que seja o período.
+    """
     permission_classes = (permissions.IsAuthenticated,)
+    TAMANHO_BLOCO = 2000
+    COLUNAS = (
+        'id', 'numero_pedido', 'data_criacao', 'forma_pagamento', 'total', 'lucro', 'base_iva', 'iva',
+        'cliente__first_name', 'cliente__last_name', 'cliente__email',
+        'vendedor__first_name', 'vendedor__last_name', 'vendedor__email',
+    )
 
     def get(self, request):
+        from datetime import date
+        from pedidos.resumos import intervalo
+
         farmacia = request.user.farmacia
         data_inicio = request.query_params.get('data_inicio')
         data_fim = request.query_params.get('data_fim')
@@ -149,179 +170,203 @@ class ExtratoVendasView(APIView):
         else:
             pedidos = Pedido.objects.filter(farmacia=farmacia)
             
-        pedidos = pedidos.exclude(status='CANCELADO').select_related('vendedor', 'cliente').order_by('-data_criacao')
-        
-        if data_inicio:
-            pedidos = pedidos.filter(data_criacao__date__gte=data_inicio)
-        if data_fim:
-            pedidos = pedidos.filter(data_criacao__date__lte=data_fim)
+        pedidos = pedidos.exclude(status='CANCELADO')
+
+        try:
+            if data_inicio:
+                inicio = date.fromisoformat(data_inicio)
+                pedidos = pedidos.filter(data_criacao__gte=intervalo(inicio, inicio)[0])
+            if data_fim:
+                fim = date.fromisoformat(data_fim)
+                pedidos = pedidos.filter(data_criacao__lt=intervalo(fim, fim)[1])
+        except ValueError:
+            return Response({'error': 'Datas inválidas. Use AAAA-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
         if vendedor_id:
             pedidos = pedidos.filter(vendedor_id=vendedor_id)
-            
+
+        pedidos = self._com_lucro_e_iva(pedidos)
+
         if export_csv:
-            import csv
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="extrato_vendas_{timezone.now().strftime("%Y%m%d")}.csv"'
-            writer = csv.writer(response)
-            writer.writerow(['Pedido', 'Data', 'Cliente', 'Vendedor', 'Pagamento', 'Total', 'Lucro'])
-            for p in pedidos:
-                # Calcular lucro rapidamente para o CSV
-                lucro = sum(float(i.preco_unitario - (i.estoque.preco_custo if i.estoque else 0)) * i.quantidade for i in p.itens.all())
-                writer.writerow([p.numero_pedido, p.data_criacao, p.cliente.get_full_name() if p.cliente else 'Balcão', p.vendedor.get_full_name() if p.vendedor else '-', p.forma_pagamento, p.total, round(lucro, 2)])
-            return response
-            
+            return self._csv(pedidos)
+
+        totais = pedidos.aggregate(
+            total_faturado=Sum('total'), total_lucro=Sum('lucro'), total_iva=Sum('iva'),
+        )
+        total_geral_faturado = float(totais['total_faturado'] or 0)
+        total_geral_lucro = float(totais['total_lucro'] or 0)
+
         dados = []
-        total_geral_faturado = 0
-        total_geral_lucro = 0
-        total_geral_iva = 0
-        
-        for p in pedidos:
-            lucro_pedido = 0
-            iva_pedido = 0
-            for item in p.itens.all():
-                # Proteção contra Estoque removido ou preços nulos
-                custo = float(item.estoque.preco_custo if item.estoque else 0)
-                venda = float(item.preco_unitario or 0)
-                lucro_item = (venda - custo) * (item.quantidade or 0)
-                lucro_pedido += lucro_item
-
-                # Cálculo Item a Item de IVA
-                if not item.produto.is_isento_iva:
-                    taxa = float(item.produto.taxa_iva or 16) / 100
-                    valor_com_iva = float(item.subtotal)
-                    base = valor_com_iva / (1 + taxa)
-                    iva_item = valor_com_iva - base
-                    iva_pedido += iva_item
-            
-            total_geral_faturado += float(p.total or 0)
-            total_geral_lucro += lucro_pedido
-            total_geral_iva += iva_pedido
-            
+        for (pedido_id, numero, data, forma, total, lucro, base_iva, iva,
+             cliente_nome, cliente_apelido, cliente_email,
+             vendedor_nome, vendedor_apelido, vendedor_email) in pedidos.values_list(*self.COLUNAS):
+            total, lucro = float(total or 0), float(lucro)
             dados.append({
-                'id': p.id,
-                'numero': p.numero_pedido,
-                'data': p.data_criacao,
-                'cliente': p.cliente.get_full_name() if p.cliente else 'Consumidor Final',
-                'vendedor': p.vendedor.get_full_name() if p.vendedor else 'Sistema',
-                'forma_pagamento': p.forma_pagamento,
-                'total': float(p.total or 0),
-                'iva': round(iva_pedido, 2),
-                'lucro': round(lucro_pedido, 2),
-                'margem': round((lucro_pedido / float(p.total) * 100), 2) if p.total and float(p.total) > 0 else 0
+                'id': pedido_id,
+                'numero': numero,
+                'data': data,
+                'cliente': _nome_usuario(cliente_nome, cliente_apelido, cliente_email) if cliente_email else 'Consumidor Final',
+                'vendedor': _nome_usuario(vendedor_nome, vendedor_apelido, vendedor_email) if vendedor_email else 'Sistema',
+                'forma_pagamento': forma,
+                'total': total,
+                'base_iva': round(base_iva, 2),
+                'iva': round(iva, 2),
+                'lucro': round(lucro, 2),
+                'margem': round((lucro / total * 100), 2) if total > 0 else 0
             })
             
         return Response({
             'periodo': {'inicio': data_inicio, 'fim': data_fim},
             'resumo': {
                 'total_faturado': round(total_geral_faturado, 2),
-                'total_iva': round(total_geral_iva, 2),
+                'total_iva': round(totais['total_iva'] or 0, 2),
                 'total_lucro': round(total_geral_lucro, 2),
                 'margem_media': round((total_geral_lucro / total_geral_faturado * 100), 2) if total_geral_faturado > 0 else 0
             },
             'vendas': dados
         })
 
+    @staticmethod
+    def _com_lucro_e_iva(pedidos):
+        """
+        Anota cada pedido com lucro (subtotal - custo gravado na venda; sem ele,
+        (preço - custo do lote) x quantidade),
+        base_iva e iva (IVA incluído no subtotal dos itens não isentos).
+        O IVA é calculado em vírgula flutuante: no SQLite a divisão de
+        decimais guardados como inteiros seria inteira.
+        """
+        from django.db.models import Case, DecimalField, ExpressionWrapper, F, FloatField, Value, When
+        from django.db.models.functions import Cast, Coalesce
+
+        dinheiro = DecimalField(max_digits=14, decimal_places=2)
+        tributado = Q(itens__produto__is_isento_iva=False, itens__produto__taxa_iva__gt=0)
+        subtotal = Cast('itens__subtotal', FloatField())
+        taxa = F('itens__produto__taxa_iva')
+
+        return pedidos.annotate(
+            lucro=Coalesce(Sum(Case(
+                # Custo gravado na venda (soma dos lotes baixados)
+                When(itens__custo__isnull=False, then=ExpressionWrapper(
+                    F('itens__subtotal') - F('itens__custo'), output_field=dinheiro
+                )),
+                default=ExpressionWrapper(
+                    (F('itens__preco_unitario') - Coalesce('itens__estoque__preco_custo', Value(0), output_field=dinheiro))
+                    * F('itens__quantidade'),
+                    output_field=dinheiro,
+                ),
+                output_field=dinheiro,
+            )), Value(0), output_field=dinheiro),
+            base_iva=Coalesce(Sum(Case(
+                When(tributado, then=subtotal * 100 / (taxa + 100)),
+                output_field=FloatField(),
+            )), Value(0.0)),
+            iva=Coalesce(Sum(Case(
+                When(tributado, then=subtotal * taxa / (taxa + 100)),
+                output_field=FloatField(),
+            )), Value(0.0)),
+        ).order_by('-data_criacao', '-id')
+
+    def _csv(self, pedidos):
+        import csv
+        from django.http import StreamingHttpResponse
+
+        class Eco:
+            """Buffer de uma linha: o csv.writer devolve o texto escrito."""
+            def write(self, valor):
+                return valor
+
+        writer = csv.writer(Eco())
+
+        def linhas():
+            yield writer.writerow(['Pedido', 'Data', 'Cliente', 'Vendedor', 'Pagamento', 'Total', 'Lucro'])
+            for (_, numero, data, forma, total, lucro, _, _,
+                 cliente_nome, cliente_apelido, cliente_email,
+                 vendedor_nome, vendedor_apelido, vendedor_email) in pedidos.values_list(
+                *self.COLUNAS
+            ).iterator(chunk_size=self.TAMANHO_BLOCO):
+                yield writer.writerow([
+                    numero, data,
+                    _nome_usuario(cliente_nome, cliente_apelido, cliente_email) if cliente_email else 'Balcão',
+                    _nome_usuario(vendedor_nome, vendedor_apelido, vendedor_email) if vendedor_email else '-',
+                    forma, total, round(lucro, 2),
+                ])
+
+        response = StreamingHttpResponse(linhas(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="extrato_vendas_{timezone.localdate():%Y%m%d}.csv"'
+        return response
+
+def _mes(valor):
+    """'AAAA-MM' -> date do primeiro dia (ValueError se inválido)."""
+    from datetime import date
+    return date.fromisoformat(f"{valor}-01")
+
+
 class ComissaoView(APIView):
-    """Cálculo de comissões por vendedor."""
+    """
+    Cálculo de comissões por vendedor (pedidos.comissoes).
+
+    ?data_inicio / ?data_fim calculam o período a partir dos pedidos;
+    ?mes=AAAA-MM lê o fecho do mês, se já foi fechado.
+    """
     permission_classes = (permissions.IsAuthenticated,)
 
     def get(self, request):
-        from accounts.models import User
-        from django.db.models import Sum, Q
-        
+        from datetime import date
+        from . import comissoes
+
+        farmacia = request.user.farmacia
+        if not farmacia:
+            return Response(
+                {'error': 'Usuário não está associado a nenhuma farmácia'},
+                status=400
+            )
+
         try:
-            farmacia = request.user.farmacia
-            
-            if not farmacia:
-                return Response(
-                    {'error': 'Usuário não está associado a nenhuma farmácia'},
-                    status=400
-                )
-            
+            vendedor = request.query_params.get('vendedor')
+            vendedor = int(vendedor) if vendedor else None
+            if request.query_params.get('mes'):
+                return Response(comissoes.relatorio_mes(farmacia, _mes(request.query_params['mes']), vendedor))
             data_inicio = request.query_params.get('data_inicio')
             data_fim = request.query_params.get('data_fim')
-            vendedor_especifico = request.query_params.get('vendedor')
-            
-            # Filtro de pedidos concluídos e pagos
-            pedidos = Pedido.objects.filter(farmacia=farmacia, status='ENTREGUE', pago=True)
-            
-            if data_inicio:
-                pedidos = pedidos.filter(data_criacao__date__gte=data_inicio)
-            if data_fim:
-                pedidos = pedidos.filter(data_criacao__date__lte=data_fim)
-                
-            # Buscar usuários da farmácia
-            vendedores_qs = User.objects.filter(
-                Q(farmacia_perfil=farmacia) | 
-                Q(funcionario_perfil__farmacia=farmacia)
-            ).distinct()
-
-            if vendedor_especifico:
-                vendedores_qs = vendedores_qs.filter(id=vendedor_especifico)
-            
-            relatorio = []
-            total_geral_comissoes = 0
-            
-            for v in vendedores_qs:
-                itens_vendedor = ItemPedido.objects.filter(
-                    pedido__in=pedidos,
-                    pedido__vendedor=v
-                )
-                
-                stats = itens_vendedor.aggregate(
-                    total_vendas=Sum('subtotal'),
-                    total_comissoes=Sum('valor_comissao')
-                )
-                
-                faturado = float(stats['total_vendas'] or 0)
-                comissao_acumulada = float(stats['total_comissoes'] or 0)
-                qtd_vendas = pedidos.filter(vendedor=v).count()
-                
-                # Sempre incluir no relatório para o gestor ver a lista completa da equipa
-                relatorio.append({
-                    'vendedor_id': v.id,
-                    'nome': v.get_full_name(),
-                    'total_vendas': faturado,
-                    'quantidade_vendas': qtd_vendas,
-                    'comissao': comissao_acumulada,
-                    'percentual_medio': round((comissao_acumulada / faturado * 100), 2) if faturado > 0 else 0
-                })
-                total_geral_comissoes += comissao_acumulada
-            
-            # Resumo de Meta e Bónus
-            total_vendas_periodo = sum(v['total_vendas'] for v in relatorio)
-            meta_mensal = float(farmacia.meta_bonus_mensal or 0)
-            meta_atingida = total_vendas_periodo >= meta_mensal if meta_mensal > 0 else False
-            
-            return Response({
-                'periodo': {'inicio': data_inicio, 'fim': data_fim},
-                'farmacia': {
-                    'meta_bonus': meta_mensal,
-                    'total_vendas': total_vendas_periodo,
-                    'meta_atingida': meta_atingida,
-                    'percentual_bonus_extra': float(farmacia.percentual_bonus_extra or 0)
-                },
-                'vendedores': sorted(relatorio, key=lambda x: x['total_vendas'], reverse=True),
-                'total_geral_comissoes': total_geral_comissoes
-            })
-        
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return Response(
-                {'error': f'Erro ao processar relatório de comissões: {str(e)}'},
-                status=500
-            )
+            data_inicio = date.fromisoformat(data_inicio) if data_inicio else None
+            data_fim = date.fromisoformat(data_fim) if data_fim else None
+        except ValueError:
+            return Response({'error': 'Parâmetros inválidos. Use datas AAAA-MM-DD ou mes=AAAA-MM.'}, status=400)
+
+        return Response(comissoes.relatorio(farmacia, data_inicio, data_fim, vendedor))
+
+
+class FechoComissaoView(APIView):
+    """
+    Fecha as comissões de um mês terminado: POST {"mes": "AAAA-MM", "refazer": false}.
+    Só o dono da farmácia (ou admin). Responde com o relatório do fecho.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request):
+        from . import comissoes
+
+        farmacia = request.user.farmacia
+        if not farmacia or request.user.tipo_usuario not in ['ADMIN', 'FARMACIA']:
+            return Response({'error': 'Apenas o gestor da farmácia pode fechar comissões.'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            mes = _mes(request.data.get('mes', ''))
+        except ValueError:
+            return Response({'error': 'Mês inválido. Use AAAA-MM.'}, status=status.HTTP_400_BAD_REQUEST)
+        if comissoes.periodo_mes(mes)[1] >= timezone.localdate():
+            return Response({'error': 'Só é possível fechar meses já terminados.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            comissoes.fechar_mes(farmacia, mes, request.user, refazer=bool(request.data.get('refazer')))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(comissoes.relatorio_mes(farmacia, mes), status=status.HTTP_201_CREATED)
 
 class DashboardStatsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        from django.db.models import Sum
-        from django.utils import timezone
-        from produtos.models import EstoqueProduto
-        from .models import Pedido
-        from .serializers import PedidoListSerializer
+        from farmacias import painel
 
         try:
             # Busca a farmácia associada ao usuário
@@ -338,32 +383,15 @@ class DashboardStatsView(APIView):
                      })
                 return Response({"erro": "Farmácia não encontrada para este usuário."}, status=400)
 
-            hoje = timezone.now().date()
-            
-            # Base de pedidos da farmácia
-            qs_base = Pedido.objects.filter(farmacia=farmacia)
-
-            # Estatísticas Financeiras
-            stats_vendas = qs_base.filter(data_criacao__date=hoje).aggregate(total_dia=Sum('total'))
-            vendas_hoje = stats_vendas['total_dia'] or 0
-
-            # Contadores de Status
-            pedidos_pendentes = qs_base.filter(status='PENDENTE').count()
-            entregas_concluidas = qs_base.filter(status='ENTREGUE', data_criacao__date=hoje).count()
-
-            # Estoque
-            estoque_critico = EstoqueProduto.objects.filter(farmacia=farmacia, quantidade__lte=5).count()
-
-            # Últimos Pedidos (Formatados de forma segura)
-            ultimos_pedidos = qs_base.order_by('-data_criacao')[:5]
-            ultimos_data = PedidoListSerializer(ultimos_pedidos, many=True).data
+            # Fotografia consolidada em cache (farmacias.painel)
+            dados = painel.snapshot(farmacia)
 
             return Response({
-                "vendas_hoje": f"{float(vendas_hoje):.2f}",
-                "pedidos_pendentes": pedidos_pendentes,
-                "estoque_critico": estoque_critico,
-                "entregas_concluidas": entregas_concluidas,
-                "ultimos_pedidos": ultimos_data
+                "vendas_hoje": f"{float(dados['vendas_hoje']):.2f}",
+                "pedidos_pendentes": dados['pendentes'],
+                "estoque_critico": dados['ate_cinco'],
+                "entregas_concluidas": dados['entregues_criados_hoje'],
+                "ultimos_pedidos": dados['ultimos_pedidos']
             })
         except Exception as e:
             import traceback
@@ -383,244 +411,101 @@ class MeusPedidosView(generics.ListAPIView):
         return Pedido.objects.filter(cliente=self.request.user).prefetch_related('itens', 'itens__produto')
 
 
+def _periodo_relatorio(request, params):
+    """(farmacia, data_inicio, data_fim) do pedido, ou uma Response de erro."""
+    from datetime import date
+
+    farmacia = getattr(request.user, 'farmacia', None)
+    if not farmacia:
+        return Response({"erro": "Farmácia não identificada"}, status=400)
+
+    hoje = timezone.localdate()
+    try:
+        data_inicio = date.fromisoformat(params.get('data_inicio') or hoje.isoformat())
+        data_fim = date.fromisoformat(params.get('data_fim') or hoje.isoformat())
+    except (TypeError, ValueError):
+        return Response({"erro": "Datas inválidas. Use AAAA-MM-DD."}, status=400)
+    if data_fim < data_inicio:
+        return Response({"erro": "A data final é anterior à inicial."}, status=400)
+    return farmacia, data_inicio, data_fim
+
+
+def _download_relatorio(relatorio):
+    from django.http import FileResponse
+    from .relatorios import nome_arquivo
+
+    return FileResponse(relatorio.arquivo.open('rb'), as_attachment=True,
+                        filename=nome_arquivo(relatorio), content_type='application/pdf')
+
+
 class RelatorioVendasPDFView(APIView):
-    """Gera um PDF PROFISSIONAL com relatório fiscal completo (Vendas + Despesas)."""
+    """
+    Relatório financeiro completo (Vendas + Despesas) em PDF, gerado por pedidos.relatorios.
+
+    POST {data_inicio, data_fim}: põe a geração na fila e responde já com o
+    estado (202; 200 se o PDF destes dados já existir).
+    GET ?data_inicio&data_fim: devolve o PDF; se ainda não existir para os
+    dados atuais, gera-o nesta chamada (compatibilidade).
+    """
     permission_classes = [permissions.IsAuthenticated]
 
+    def post(self, request):
+        from . import relatorios
+        from .models import RelatorioGerado
+        from .serializers import RelatorioGeradoSerializer
+
+        periodo = _periodo_relatorio(request, request.data)
+        if isinstance(periodo, Response):
+            return periodo
+        relatorio = relatorios.solicitar(*periodo, usuario=request.user)
+        pronto = relatorio.status == RelatorioGerado.Status.CONCLUIDO
+        return Response(
+            RelatorioGeradoSerializer(relatorio, context={'request': request}).data,
+            status=status.HTTP_200_OK if pronto else status.HTTP_202_ACCEPTED
+        )
+
     def get(self, request):
-        from django.utils import timezone
-        from django.db.models import Sum, Count, Q
-        from datetime import datetime
-        from financeiro.models import Despesa
+        from . import relatorios
+        from .models import RelatorioGerado
+        from .serializers import RelatorioGeradoSerializer
+
+        periodo = _periodo_relatorio(request, request.GET)
+        if isinstance(periodo, Response):
+            return periodo
+        relatorio = relatorios.solicitar(*periodo, usuario=request.user, despachar=False)
+        if relatorio.status == RelatorioGerado.Status.PENDENTE:
+            relatorios.executar(relatorio.id)
+            relatorio.refresh_from_db()
+
+        if relatorio.status == RelatorioGerado.Status.CONCLUIDO:
+            return _download_relatorio(relatorio)
+        if relatorio.status == RelatorioGerado.Status.ERRO:
+            return Response({"erro": f"Erro ao gerar relatório: {relatorio.erro}"}, status=500)
+        # Em geração noutro worker
+        return Response(RelatorioGeradoSerializer(relatorio, context={'request': request}).data,
+                        status=status.HTTP_202_ACCEPTED)
+
+
+class RelatorioGeradoView(generics.RetrieveAPIView):
+    """Estado de um relatório em segundo plano da farmácia logada."""
+    permission_classes = [permissions.IsAuthenticated]
 
-        user = request.user
-        farmacia = getattr(user, 'farmacia', None)
-        if not farmacia:
-            return Response({"erro": "Farmácia não identificada"}, status=400)
+    def get_serializer_class(self):
+        from .serializers import RelatorioGeradoSerializer
+        return RelatorioGeradoSerializer
 
-        # Parâmetros de data
-        hoje = timezone.now().date()
-        try:
-            data_inicio = request.GET.get('data_inicio', hoje.strftime('%Y-%m-%d'))
-            data_fim = request.GET.get('data_fim', hoje.strftime('%Y-%m-%d'))
-        except:
-            data_inicio = hoje
-            data_fim = hoje
-
-        # 1. Buscar Vendas (Receitas)
-        pedidos = Pedido.objects.filter(
-            farmacia=farmacia,
-            data_criacao__date__gte=data_inicio,
-            data_criacao__date__lte=data_fim
-        ).select_related('cliente').order_by('data_criacao')
-
-        total_receita = pedidos.aggregate(Sum('total'))['total__sum'] or 0
-        qtd_vendas = pedidos.count()
-
-        # 2. Buscar Despesas (Saídas) - Pagas e Pendentes
-        despesas = Despesa.objects.filter(
-            farmacia=farmacia,
-        ).filter(
-            Q(status='PAGO', data_pagamento__gte=data_inicio, data_pagamento__lte=data_fim) |
-            Q(status='PENDENTE', data_vencimento__gte=data_inicio, data_vencimento__lte=data_fim)
-        )
-        
-        total_despesas_pagas = despesas.filter(status='PAGO').aggregate(Sum('valor'))['valor__sum'] or 0
-        total_despesas_pendentes = despesas.filter(status='PENDENTE').aggregate(Sum('valor'))['valor__sum'] or 0
-        total_despesas_geral = total_despesas_pagas + total_despesas_pendentes
-
-        # 3. Lucro Líquido
-        lucro_liquido = total_receita - total_despesas_geral
-
-        # 4. Unificar Transações para Listagem
-        transacoes = []
-        for p in pedidos:
-            transacoes.append({
-                'data': p.data_criacao,
-                'descricao': f"Venda #{p.numero_pedido} - {p.cliente.get_full_name() if p.cliente else 'Balcão'}",
-                'tipo': 'ENTRADA',
-                'metodo': p.forma_pagamento,
-                'valor': p.total
-            })
-            
-        for d in despesas:
-            data_ref = d.data_pagamento if d.status == 'PAGO' and d.data_pagamento else d.data_vencimento
-            if not data_ref: continue
-            # Converter date para datetime para sort compativel
-            dt = datetime.combine(data_ref, datetime.min.time())
-            try:
-                dt = timezone.make_aware(dt)
-            except:
-                pass # Se der erro (ex: settings TZ=False), mantem naive
-            
-            transacoes.append({
-                'data': dt,
-                'descricao': f"Despesa: {d.titulo} ({d.status})",
-                'tipo': 'SAIDA',
-                'metodo': 'Caixa' if d.status == 'PAGO' else 'Pendente',
-                'valor': d.valor * -1 # Negativo
-            })
-            
-        # Ordenar e Preparar PDF
-        transacoes.sort(key=lambda x: x['data'])
-
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=A4)
-        width, height = A4
-        y = height - 1.5 * cm
-
-        def draw_header():
-            nonlocal y
-            # Tentar desenhar o logotipo se existir
-            if farmacia.logo:
-                try:
-                    p.drawImage(farmacia.logo.path, 1.5 * cm, height - 2.5 * cm, width=2.5 * cm, preserveAspectRatio=True, mask='auto')
-                except Exception as e:
-                    print(f"Erro ao carregar logo no PDF: {e}")
-
-            p.setFont("Helvetica-Bold", 16)
-            p.drawCentredString(width / 2, height - 1.5 * cm, farmacia.nome.upper())
-            p.setFont("Helvetica", 9)
-            p.drawCentredString(width / 2, height - 2.0 * cm, "RELATÓRIO FINANCEIRO COMPLETO (FISCAL)")
-            p.drawCentredString(width / 2, height - 2.4 * cm, f"Período: {data_inicio} a {data_fim} | Emitido: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-            p.line(1 * cm, height - 2.8 * cm, width - 1 * cm, height - 2.8 * cm)
-            y = height - 3.5 * cm
-
-        draw_header()
-
-        # ============ RESUMO FINANCEIRO ============
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(2 * cm, y, "RESUMO DO PERÍODO & IMPOSTOS")
-        y -= 0.8 * cm
-        
-        # Cálculos de Imposto (IVA Incluso)
-        # Se 16%: Base = Total / 1.16 | IVA = Total - Base
-        taxa_iva = float(farmacia.percentual_iva or 16)
-        fator = 1 + (taxa_iva / 100)
-        
-        base_tributavel = float(total_receita) / fator
-        valor_iva = float(total_receita) - base_tributavel
-        
-        # Bloco de Receita com Impostos
-        p.setFillColorRGB(0.95, 0.95, 0.95)
-        p.rect(1.5 * cm, y - 2.5 * cm, width - 3 * cm, 2.5 * cm, fill=1, stroke=0)
-        p.setFillColorRGB(0, 0, 0)
-        
-        y -= 0.5 * cm
-        p.setFont("Helvetica-Bold", 10)
-        p.drawString(2 * cm, y, "FATURAMENTO BRUTO (Total de Vendas):")
-        p.drawRightString(width - 2 * cm, y, f"+ {total_receita:,.2f} MT")
-        y -= 0.5 * cm
-        
-        p.setFont("Helvetica", 9)
-        p.drawString(2 * cm, y, f"(-) IVA Incluído ({taxa_iva}%):")
-        p.drawRightString(width - 2 * cm, y, f"{valor_iva:,.2f} MT")
-        y -= 0.5 * cm
-        
-        p.drawString(2 * cm, y, "(=) Base de Incidência Líquida:")
-        p.drawRightString(width - 2 * cm, y, f"{base_tributavel:,.2f} MT")
-        y -= 1 * cm # Margem extra após o bloco
-        
-        p.setFont("Helvetica", 10)
-        # Despesas
-        p.drawString(2 * cm, y, "Total de Saídas (Despesas):")
-        p.drawRightString(width - 2 * cm, y, f"- {total_despesas_geral:,.2f} MT")
-        y -= 0.5 * cm
-        
-        # Linha Saldo
-        y -= 0.2 * cm
-        p.line(10 * cm, y, width - 2 * cm, y)
-        y -= 0.6 * cm
-        
-        # Lucro
-        # Lucro REAL deveria ser sobre a Base Limpa? Geralmente Fluxo de Caixa é sobre o dinheiro bruto que entrou vs saiu.
-        # Mas contabelmente, imposto não é receita.
-        # Vamos manter o Lucro de Caixa (Bruto - Despesas) mas indicar o peso do imposto acima.
-        
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(2 * cm, y, "RESULTADO LÍQUIDO (CAIXA):")
-        if lucro_liquido >= 0:
-            p.setFillColorRGB(0, 0.5, 0) # Verde escuro
-        else:
-            p.setFillColorRGB(0.8, 0, 0) # Vermelho
-            
-        p.drawRightString(width - 2 * cm, y, f"{lucro_liquido:,.2f} MT")
-        p.setFillColorRGB(0, 0, 0) # Reset cor
-        y -= 1.5 * cm
-
-        # ============ LISTA DE TRANSAÇÕES ============
-        p.setFont("Helvetica-Bold", 11)
-        p.drawString(1 * cm, y, "DETALHAMENTO DE MOVIMENTAÇÕES")
-        y -= 0.8 * cm
-        
-        # Cabeçalho Tabela
-        p.setFillColorRGB(0.9, 0.9, 0.9)
-        p.rect(1 * cm, y - 0.2 * cm, width - 2 * cm, 0.6 * cm, fill=1, stroke=0)
-        p.setFillColorRGB(0, 0, 0)
-        p.setFont("Helvetica-Bold", 8)
-        p.drawString(1.2 * cm, y, "DATA")
-        p.drawString(4 * cm, y, "DESCRIÇÃO")
-        p.drawString(12 * cm, y, "MÉTODO")
-        p.drawRightString(width - 1.2 * cm, y, "VALOR (MT)")
-        y -= 0.6 * cm
-        
-        p.setFont("Helvetica", 8)
-        
-        for item in transacoes:
-            # Verificar Quebra de Página
-            if y < 2 * cm:
-                p.showPage()
-                draw_header()
-                # Repetir cabeçalho tabela
-                p.setFont("Helvetica-Bold", 11)
-                p.drawString(1 * cm, y, "DETALHAMENTO (CONT.)")
-                y -= 0.8 * cm
-                p.setFillColorRGB(0.9, 0.9, 0.9)
-                p.rect(1 * cm, y - 0.2 * cm, width - 2 * cm, 0.6 * cm, fill=1, stroke=0)
-                p.setFillColorRGB(0, 0, 0)
-                p.setFont("Helvetica-Bold", 8)
-                p.drawString(1.2 * cm, y, "DATA")
-                p.drawString(4 * cm, y, "DESCRIÇÃO")
-                p.drawString(12 * cm, y, "MÉTODO")
-                p.drawRightString(width - 1.2 * cm, y, "VALOR (MT)")
-                y -= 0.6 * cm
-                p.setFont("Helvetica", 8)
-
-            # Desenhar Linha
-            data_str = item['data'].strftime('%d/%m/%Y %H:%M')
-            if item['tipo'] == 'ENTRADA':
-                p.setFillColorRGB(0, 0.4, 0)
-            else:
-                p.setFillColorRGB(0.6, 0, 0)
-                
-            p.drawString(1.2 * cm, y, data_str)
-            
-            p.setFillColorRGB(0, 0, 0) # Descrição preta
-            desc = item['descricao'][:50] # Truncar
-            p.drawString(4 * cm, y, desc)
-            p.drawString(12 * cm, y, item['metodo'])
-            
-            if item['tipo'] == 'ENTRADA':
-                p.setFillColorRGB(0, 0, 0) # Valor normal
-            else:
-                p.setFillColorRGB(0.8, 0, 0) # Vermelho se saída
-                
-            p.drawRightString(width - 1.2 * cm, y, f"{item['valor']:,.2f}")
-            
-            p.setFillColorRGB(0, 0, 0) # Reset
-            
-            # Linha fina separadora
-            p.setLineWidth(0.5)
-            p.setStrokeColorRGB(0.9, 0.9, 0.9)
-            p.line(1 * cm, y - 0.1 * cm, width - 1 * cm, y - 0.1 * cm)
-            
-            y -= 0.5 * cm
+    def get_queryset(self):
+        from .models import RelatorioGerado
+        return RelatorioGerado.objects.filter(farmacia=self.request.user.farmacia)
 
-        p.showPage()
-        p.save()
-        buffer.seek(0)
-        
-        response = HttpResponse(buffer, content_type='application/pdf')
-        filename = f"relatorio_financeiro_{hoje.strftime('%Y%m%d')}.pdf"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+
+class RelatorioDownloadView(RelatorioGeradoView):
+    """Download do PDF de um relatório concluído."""
+
+    def get(self, request, *args, **kwargs):
+        from .models import RelatorioGerado
+
+        relatorio = self.get_object()
+        if relatorio.status != RelatorioGerado.Status.CONCLUIDO or not relatorio.arquivo:
+            return Response({'error': 'O relatório ainda não está pronto.'}, status=status.HTTP_409_CONFLICT)
+        return _download_relatorio(relatorio)
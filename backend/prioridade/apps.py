@@ -7,4 +7,6 @@ class PrioridadeConfig(AppConfig):
     name = 'prioridade'
     path = str(Path(__file__).resolve().parent)
     verbose_name = 'Sistema de Prioridade'
-    path = str(Path(__file__).resolve().parent)
+
+    def ready(self):
+        import prioridade.signals
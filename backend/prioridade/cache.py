@@ -0,0 +1,50 @@
+"""
+Conjunto em cache das farmácias com prioridade ativa.
+
+Usado pela busca global (ordenação) e pelo BuscaGlobalSerializer
+(`farmacia_recomendada`), para que uma página de resultados não faça
+nenhuma consulta extra a AssinaturaPrioridade.
+
+O cache é invalidado por signal quando uma assinatura muda e expira
+sozinho no próximo `data_fim`, quando a primeira assinatura ativa vence.
+"""
+from django.core.cache import cache
+from django.db.models import Min
+from django.utils import timezone
+
+CACHE_KEY = 'prioridade:farmacias_ativas'
+CACHE_TIMEOUT_MAX = 60 * 15  # Teto de segurança (15 min)
+
+
+def farmacias_prioritarias():
+    """Retorna um frozenset com os ids das farmácias com prioridade ativa."""
+    ids = cache.get(CACHE_KEY)
+    if ids is None:
+        ids = _calcular()
+    return ids
+
+
+def invalidar():
+    cache.delete(CACHE_KEY)
+
+
+def _calcular():
+    from .models import AssinaturaPrioridade
+
+    agora = timezone.now()
+    ativas = AssinaturaPrioridade.objects.filter(
+        status='ATIVA',
+        farmacia__isnull=False,
+        data_fim__gte=agora
+    )
+    ids = frozenset(ativas.values_list('farmacia_id', flat=True))
+
+    # Expirar o cache quando a próxima assinatura vencer
+    timeout = CACHE_TIMEOUT_MAX
+    proximo_fim = ativas.aggregate(proximo=Min('data_fim'))['proximo']
+    if proximo_fim:
+        segundos = int((proximo_fim - agora).total_seconds()) + 1
+        timeout = max(1, min(timeout, segundos))
+
+    cache.set(CACHE_KEY, ids, timeout)
+    return ids
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import AssinaturaPrioridade
+from . import cache
+
+
+@receiver(post_save, sender=AssinaturaPrioridade)
+@receiver(post_delete, sender=AssinaturaPrioridade)
+def invalidar_farmacias_prioritarias(sender, instance, **kwargs):
+    """Qualquer mudança em assinaturas de farmácia invalida o conjunto em cache."""
+    if instance.farmacia_id:
+        cache.invalidar()
@@ -0,0 +1,145 @@
+"""
+Alertas de estoque (ruptura, estoque baixo, validade) gerados fora do save().
+
+`EstoqueProduto.save()` só regista (estoque_id, quantidade_anterior) com
+`agendar()`; depois do commit `avaliar()` lê os lotes tocados numa query,
+decide os alertas e cria as notificações novas com um único bulk_create.
+Como o `get_or_create` original, não se repete uma notificação com o mesmo
+(farmácia, tipo, título).
+"""
+from django.db.models import CharField, Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from .transacao import agendar_pos_commit
+
+DIAS_AVISO_VALIDADE = 30
+TAMANHO_LOTE = 500
+
+
+def agendar(estoque_id, quantidade_anterior):
+    """`quantidade_anterior` é None para lotes recém-criados."""
+    agendar_lotes([(estoque_id, quantidade_anterior)])
+
+
+def agendar_lotes(registos):
+    """Como `agendar`, para vários pares (estoque_id, quantidade_anterior)."""
+    agendar_pos_commit('produtos.alertas', registos, avaliar)
+
+
+def avaliar(registos):
+    from .models import EstoqueProduto
+
+    # Várias gravações do mesmo lote na transação: vale a maior quantidade
+    # anterior (houve cruzamento do mínimo se alguma estava acima dele)
+    anteriores = {}
+    for estoque_id, anterior in registos:
+        if estoque_id not in anteriores:
+            anteriores[estoque_id] = anterior
+        elif anterior is None or anteriores[estoque_id] is None:
+            anteriores[estoque_id] = None
+        else:
+            anteriores[estoque_id] = max(anterior, anteriores[estoque_id])
+
+    lotes = EstoqueProduto.objects.filter(pk__in=list(anteriores)).values(
+        'id', 'farmacia_id', 'quantidade', 'quantidade_minima', 'lote', 'data_validade', 'produto__nome'
+    )
+    hoje = timezone.now().date()
+    notificacoes = []
+    for lote in lotes:
+        notificacoes += alertas_do_lote(lote, anteriores[lote['id']], hoje)
+    criar_notificacoes(notificacoes)
+
+
+def alertas_do_lote(lote, quantidade_anterior, hoje):
+    """Notificações (não gravadas) que a gravação de um lote dispara."""
+    from farmacias.models import Notificacao
+
+    nome = lote['produto__nome']
+    quantidade = lote['quantidade']
+    novo = quantidade_anterior is None
+    resultado = []
+
+    # 1. Ruptura ou Estoque Baixo
+    if quantidade == 0:
+        resultado.append(Notificacao(
+            farmacia_id=lote['farmacia_id'],
+            tipo='ESTOQUE',
+            titulo=f"RUPTURA: {nome}",
+            mensagem=f"O produto {nome} (Lote: {lote['lote']}) esgotou completamente no estoque.",
+        ))
+    elif quantidade <= lote['quantidade_minima'] and (novo or quantidade_anterior > lote['quantidade_minima']):
+        resultado.append(Notificacao(
+            farmacia_id=lote['farmacia_id'],
+            tipo='ESTOQUE',
+            titulo=f"Estoque Baixo: {nome}",
+            mensagem=f"O produto {nome} (Lote: {lote['lote']}) atingiu o nível crítico ({quantidade} unidades).",
+        ))
+
+    # 2. Validade
+    validade = lote['data_validade']
+    if validade:
+        dias_para_vencer = (validade - hoje).days
+        if dias_para_vencer < 0:
+            resultado.append(Notificacao(
+                farmacia_id=lote['farmacia_id'],
+                tipo='EXPIRADO',
+                titulo=f"PRODUTO EXPIRADO: {nome}",
+                mensagem=f"O lote {lote['lote']} de {nome} expirou em {validade}.",
+            ))
+        elif dias_para_vencer <= DIAS_AVISO_VALIDADE:
+            resultado.append(Notificacao(
+                farmacia_id=lote['farmacia_id'],
+                tipo='VALIDADE',
+                titulo=f"Validade Próxima: {nome}",
+                mensagem=f"O lote {lote['lote']} de {nome} vence em {dias_para_vencer} dias ({validade}).",
+            ))
+    return resultado
+
+
+def criar_notificacoes(notificacoes, verificar_existentes=True):
+    """
+    Grava as notificações que ainda não existem (mesma farmácia, tipo e título)
+    com uma query de verificação e um bulk_create. Retorna as criadas.
+    `verificar_existentes=False` quando os candidatos já vêm de `sem_notificacao`.
+    """
+    from farmacias import painel
+    from farmacias.models import Notificacao
+
+    unicas = {}
+    for n in notificacoes:
+        unicas.setdefault((n.farmacia_id, n.tipo, n.titulo), n)
+    if not unicas:
+        return []
+
+    chaves = list(unicas) if verificar_existentes else []
+    existentes = set()
+    for i in range(0, len(chaves), TAMANHO_LOTE):
+        filtro = Q()
+        for farmacia_id, tipo, titulo in chaves[i:i + TAMANHO_LOTE]:
+            filtro |= Q(farmacia_id=farmacia_id, tipo=tipo, titulo=titulo)
+        existentes.update(Notificacao.objects.filter(filtro).values_list('farmacia_id', 'tipo', 'titulo'))
+
+    novas = [n for chave, n in unicas.items() if chave not in existentes]
+    if novas:
+        painel.invalidar(n.farmacia_id for n in novas)
+    return Notificacao.objects.bulk_create(novas, batch_size=TAMANHO_LOTE)
+
+
+def sem_notificacao(queryset, tipo, prefixo_titulo, **filtros):
+    """
+    Para os jobs em lote: anota em cada lote o `titulo_alerta` (prefixo + nome do
+    produto) e mantém só os que ainda não têm notificação igual na farmácia
+    (anti-join NOT EXISTS). `filtros` restringe as notificações consideradas.
+    """
+    from farmacias.models import Notificacao
+
+    existentes = Notificacao.objects.filter(
+        farmacia_id=OuterRef('farmacia_id'),
+        tipo=tipo,
+        titulo=OuterRef('titulo_alerta'),
+        **filtros
+    )
+    return queryset.annotate(
+        titulo_alerta=Concat(Value(prefixo_titulo), F('produto__nome'), output_field=CharField())
+    ).filter(~Exists(existentes))
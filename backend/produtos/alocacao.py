@@ -0,0 +1,128 @@
+"""
+Alocação de saídas de estoque pelos lotes de uma farmácia (FEFO).
+
+O estoque de um produto está repartido por lote e local (`unique_together`).
+`AlocadorFEFO` bloqueia numa única query todos os lotes candidatos da
+operação e distribui cada pedido de saída pelos lotes em memória:
+primeiro a LOJA, depois o ARMAZÉM e outros locais; dentro de cada local,
+a validade mais próxima primeiro (lotes sem validade no fim).
+
+O bloqueio é feito por ordem de id, a mesma das vendas com lote explícito,
+para que operações concorrentes nunca se bloqueiem em ordens cruzadas;
+a ordenação FEFO é aplicada depois, em memória.
+"""
+from collections import defaultdict
+
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+ORDEM_LOCAL = {'LOJA': 0, 'ARMAZEM': 1}
+
+
+class EstoqueInsuficiente(Exception):
+    def __init__(self, produto, solicitado, disponivel):
+        self.produto = produto
+        self.solicitado = solicitado
+        self.disponivel = disponivel
+        super().__init__(
+            f"Estoque insuficiente para {produto.nome if produto else 'o produto'} "
+            f"(Solicitado: {solicitado} unidades, Disponível: {disponivel})"
+        )
+
+
+def ordem_fefo(estoque):
+    return (
+        ORDEM_LOCAL.get(estoque.local, len(ORDEM_LOCAL)),
+        estoque.data_validade is None,
+        estoque.data_validade,
+        estoque.id,
+    )
+
+
+class AlocadorFEFO:
+    """
+    Uso (dentro de transaction.atomic):
+        alocador = AlocadorFEFO(farmacia, produto_ids=[...], estoque_ids=[...])
+        alocador.alocar(produto_id, 30)      -> [(estoque, quantidade, anterior, nova), ...]
+        alocador.reservar(estoque_id, 5)     -> idem, para um lote escolhido
+        alocador.aplicar()                   -> grava as baixas (um UPDATE)
+    """
+
+    def __init__(self, farmacia, produto_ids=(), estoque_ids=()):
+        from .models import EstoqueProduto
+
+        hoje = timezone.now().date()
+        candidatos = Q(
+            produto_id__in=set(produto_ids), quantidade__gt=0, is_disponivel=True
+        ) & (Q(data_validade__isnull=True) | Q(data_validade__gte=hoje))
+
+        self.lotes = {
+            e.id: e for e in EstoqueProduto.objects.select_for_update(of=('self',)).filter(
+                candidatos | Q(id__in=set(estoque_ids)),
+                farmacia=farmacia
+            ).select_related('produto').order_by('id')
+        }
+        self.saldos = {estoque_id: e.quantidade for estoque_id, e in self.lotes.items()}
+        self.baixas = defaultdict(int)
+
+        # Lotes explícitos (estoque_ids) também entram aqui se forem vendáveis
+        self.por_produto = defaultdict(list)
+        produto_ids = set(produto_ids)
+        for estoque in sorted(self.lotes.values(), key=ordem_fefo):
+            if (estoque.produto_id in produto_ids and estoque.quantidade > 0 and estoque.is_disponivel
+                    and (estoque.data_validade is None or estoque.data_validade >= hoje)):
+                self.por_produto[estoque.produto_id].append(estoque)
+
+    def lote(self, estoque_id):
+        return self.lotes.get(estoque_id)
+
+    def produto(self, produto_id):
+        lotes = self.por_produto.get(produto_id)
+        return lotes[0].produto if lotes else None
+
+    def reservar(self, estoque_id, quantidade):
+        estoque = self.lotes[estoque_id]
+        if self.saldos[estoque_id] < quantidade:
+            raise EstoqueInsuficiente(estoque.produto, self.baixas[estoque_id] + quantidade, estoque.quantidade)
+        return [self._baixar(estoque, quantidade)]
+
+    def alocar(self, produto_id, quantidade):
+        lotes = self.por_produto.get(produto_id, [])
+        disponivel = sum(self.saldos[e.id] for e in lotes)
+        if disponivel < quantidade:
+            raise EstoqueInsuficiente(lotes[0].produto if lotes else None, quantidade, disponivel)
+
+        resultado = []
+        restante = quantidade
+        for estoque in lotes:
+            if restante == 0:
+                break
+            parte = min(restante, self.saldos[estoque.id])
+            if parte:
+                resultado.append(self._baixar(estoque, parte))
+                restante -= parte
+        return resultado
+
+    def _baixar(self, estoque, quantidade):
+        anterior = self.saldos[estoque.id]
+        self.saldos[estoque.id] = anterior - quantidade
+        self.baixas[estoque.id] += quantidade
+        return estoque, quantidade, anterior, self.saldos[estoque.id]
+
+    def aplicar(self):
+        """Baixa todos os lotes reservados num único UPDATE com F() e devolve os lotes tocados."""
+        from .models import EstoqueProduto
+
+        if not self.baixas:
+            return []
+        EstoqueProduto.objects.filter(pk__in=list(self.baixas)).update(
+            quantidade=F('quantidade') - Case(
+                *[When(pk=estoque_id, then=Value(baixa)) for estoque_id, baixa in self.baixas.items()],
+                output_field=IntegerField()
+            ),
+            data_atualizacao=timezone.now()
+        )
+        # update() não dispara save()/signals: alertas, ofertas e cache do PDV
+        tocados = [self.lotes[estoque_id] for estoque_id in self.baixas]
+        EstoqueProduto.registrar_alteracoes_em_massa([(e, e.quantidade) for e in tocados])
+        return tocados
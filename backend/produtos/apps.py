@@ -5,3 +5,6 @@ from pathlib import Path
 class ProdutosConfig(AppConfig):
     name = 'produtos'
     path = str(Path(__file__).resolve().parent)
+
+    def ready(self):
+        import produtos.signals
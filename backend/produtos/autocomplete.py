@@ -0,0 +1,176 @@
+"""
+Índice de prefixos em memória para o autocomplete do catálogo.
+
+Cada processo mantém uma lista ordenada de chaves normalizadas (sem acentos,
+minúsculas) com o nome, o nome genérico e o início de cada palavra do nome
+dos produtos ativos. A consulta é uma busca binária pelo prefixo.
+
+Versionamento: cada alteração de Produto incrementa `autocomplete:versao`
+no cache partilhado e guarda o id alterado em `autocomplete:mudanca:<v>`.
+Antes de responder, o processo compara a sua versão com a partilhada e
+recarrega só os produtos alterados; se o histórico já expirou, reconstrói.
+
+O estado é publicado como um único tuplo imutável (entradas, produtos,
+versao), trocado por inteiro a cada sincronização: uma consulta lê-o uma
+vez e nunca mistura entradas de uma versão com produtos de outra.
+"""
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.db import transaction
+
+MAX_SUGESTOES = 10
+MIN_CARACTERES = 2
+LIMITE_VARREDURA = 500  # Entradas examinadas por consulta (prefixos muito curtos)
+TTL_MUDANCAS = 60 * 60 * 24
+MAX_MUDANCAS_INCREMENTAIS = 1000  # Acima disso compensa reconstruir
+
+_CHAVE_VERSAO = 'autocomplete:versao'
+
+# Pesos (menor = melhor)
+PESO_NOME = 0
+PESO_GENERICO = 1
+PESO_PALAVRA = 2
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower().strip()
+
+
+class IndicePrefixos:
+    def __init__(self):
+        # (entradas, produtos, versao): entradas = [(chave, peso, produto_id)] ordenadas,
+        # produtos = {produto_id: (dados, [entradas])}. Nunca alterado no lugar.
+        self._indice = ((), {}, None)
+        self.lock = threading.Lock()
+
+    @property
+    def versao(self):
+        return self._indice[2]
+
+    # --- Manutenção ---
+
+    def reconstruir(self, versao):
+        from .models import Produto
+
+        entradas = []
+        produtos = {}
+        for produto in Produto.objects.filter(is_ativo=True).values(*_CAMPOS).iterator(chunk_size=5000):
+            dados, chaves = _preparar(produto)
+            produtos[produto['id']] = (dados, chaves)
+            entradas.extend(chaves)
+        entradas.sort()
+        self._indice = (tuple(entradas), produtos, versao)
+
+    def atualizar(self, ids, versao):
+        from .models import Produto
+
+        # Trabalha sobre cópias: consultas em curso continuam a ver o índice anterior
+        entradas, produtos, _ = self._indice
+        entradas = list(entradas)
+        produtos = dict(produtos)
+        ids = set(ids)
+        for produto_id in ids:
+            _, chaves = produtos.pop(produto_id, (None, []))
+            for chave in chaves:
+                posicao = bisect_left(entradas, chave)
+                if posicao < len(entradas) and entradas[posicao] == chave:
+                    del entradas[posicao]
+
+        for produto in Produto.objects.filter(pk__in=ids, is_ativo=True).values(*_CAMPOS):
+            dados, chaves = _preparar(produto)
+            produtos[produto['id']] = (dados, chaves)
+            for chave in chaves:
+                insort(entradas, chave)
+        self._indice = (tuple(entradas), produtos, versao)
+
+    def sincronizar(self):
+        """Alinha o índice local com a versão partilhada."""
+        versao = cache.get_or_set(_CHAVE_VERSAO, 0, None)
+        if versao == self.versao:
+            return
+        with self.lock:
+            if versao == self.versao:
+                return  # Outra thread já sincronizou
+            if self.versao is None or not 0 < versao - self.versao <= MAX_MUDANCAS_INCREMENTAIS:
+                self.reconstruir(versao)
+                return
+            mudancas = cache.get_many([_chave_mudanca(v) for v in range(self.versao + 1, versao + 1)])
+            if len(mudancas) < versao - self.versao:
+                self.reconstruir(versao)  # Histórico expirado
+            else:
+                self.atualizar(mudancas.values(), versao)
+
+    # --- Consulta ---
+
+    def sugerir(self, termo, limite=MAX_SUGESTOES):
+        prefixo = normalizar(termo)
+        if len(prefixo) < MIN_CARACTERES:
+            return []
+
+        entradas, produtos, _ = self._indice
+        melhores = {}
+        posicao = bisect_left(entradas, (prefixo,))
+        fim = min(len(entradas), posicao + LIMITE_VARREDURA)
+        while posicao < fim and entradas[posicao][0].startswith(prefixo):
+            chave, peso, produto_id = entradas[posicao]
+            # Menor peso; depois o nome mais curto (mais próximo do que foi digitado)
+            ordem = (peso, len(chave), chave)
+            if produto_id not in melhores or ordem < melhores[produto_id]:
+                melhores[produto_id] = ordem
+            posicao += 1
+
+        ranking = sorted(melhores.items(), key=lambda item: item[1])[:limite]
+        return [produtos[produto_id][0] for produto_id, _ in ranking]
+
+
+_CAMPOS = ('id', 'nome', 'nome_generico', 'concentracao')
+
+
+def _preparar(produto):
+    produto_id = produto['id']
+    nome = normalizar(produto['nome'])
+    generico = normalizar(produto['nome_generico'])
+
+    chaves = {(nome, PESO_NOME, produto_id)}
+    if generico:
+        chaves.add((generico, PESO_GENERICO, produto_id))
+    palavras = nome.split()
+    for i in range(1, len(palavras)):
+        chaves.add((' '.join(palavras[i:]), PESO_PALAVRA, produto_id))
+
+    dados = {
+        'id': produto_id,
+        'nome': produto['nome'],
+        'nome_generico': produto['nome_generico'],
+        'concentracao': produto['concentracao'],
+    }
+    return dados, sorted(chaves)
+
+
+def _chave_mudanca(versao):
+    return f'autocomplete:mudanca:{versao}'
+
+
+_indice = IndicePrefixos()
+
+
+def sugerir(termo, limite=MAX_SUGESTOES):
+    _indice.sincronizar()
+    return _indice.sugerir(termo, limite)
+
+
+def registrar_mudanca(produto_id):
+    """Publica a alteração de um produto (depois do commit) para todos os processos."""
+    def publicar():
+        cache.add(_CHAVE_VERSAO, 0, None)
+        try:
+            versao = cache.incr(_CHAVE_VERSAO)
+        except ValueError:
+            return
+        cache.set(_chave_mudanca(versao), produto_id, TTL_MUDANCAS)
+
+    transaction.on_commit(publicar)
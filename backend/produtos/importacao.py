@@ -0,0 +1,397 @@
+"""
+Importação em massa de estoque a partir de CSV ou XLSX (onboarding de farmácias).
+
+O ficheiro é lido em streaming (csv.reader / openpyxl em modo read-only) e
+processado em blocos de `tamanho_lote` linhas, cada bloco na sua transação:
+- os produtos são resolvidos por `codigo_barras` numa query por bloco;
+- os lotes existentes (produto, lote, local) são atualizados com bulk_update;
+- os novos entram com COPY no PostgreSQL e bulk_create nos outros bancos;
+- o kardex é gravado com bulk_create (ENTRADA para lotes novos, AJUSTE
+  quando a quantidade de um lote existente muda).
+
+A memória usada depende só do tamanho do bloco: o relatório guarda no
+máximo MAX_ERROS erros detalhados (o total é sempre contado).
+
+Falhas: um ficheiro ilegível levanta ArquivoInvalido antes de gravar
+qualquer bloco. Se a leitura ou a gravação falhar a meio, os blocos já
+gravados ficam e o relatório indica em `falha` o bloco interrompido
+(linha inicial e erro); nada desse bloco nem dos seguintes é gravado.
+
+Colunas (cabeçalho na primeira linha, sem distinção de maiúsculas/acentos):
+codigo_barras e quantidade (obrigatórias), lote, local, data_validade,
+data_fabricacao, preco_custo, preco_venda, preco_promocional,
+quantidade_minima, localizacao_estoque.
+"""
+import csv
+import io
+import uuid
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import DatabaseError, connection, transaction
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.utils import timezone
+
+TAMANHO_LOTE = 2000
+MAX_ERROS = 1000
+
+ALIASES = {
+    'codigo_barras': 'codigo_barras', 'codigo': 'codigo_barras', 'ean': 'codigo_barras',
+    'codigo_de_barras': 'codigo_barras',
+    'quantidade': 'quantidade', 'qtd': 'quantidade',
+    'lote': 'lote',
+    'local': 'local',
+    'data_validade': 'data_validade', 'validade': 'data_validade',
+    'data_fabricacao': 'data_fabricacao', 'fabricacao': 'data_fabricacao',
+    'preco_custo': 'preco_custo', 'custo': 'preco_custo',
+    'preco_venda': 'preco_venda', 'preco': 'preco_venda',
+    'preco_promocional': 'preco_promocional',
+    'quantidade_minima': 'quantidade_minima', 'minimo': 'quantidade_minima',
+    'localizacao_estoque': 'localizacao_estoque', 'localizacao': 'localizacao_estoque',
+}
+
+CAMPOS_ATUALIZAVEIS = (
+    'quantidade', 'quantidade_minima', 'data_fabricacao', 'data_validade', 'preco_custo',
+    'preco_venda', 'preco_promocional', 'localizacao_estoque', 'data_atualizacao',
+)
+
+
+class ErroLinha(Exception):
+    pass
+
+
+class ArquivoInvalido(Exception):
+    """Ficheiro que não se consegue ler (formato, codificação ou CSV malformado)."""
+
+
+def ler_linhas(arquivo, nome):
+    """
+    Gera (número da linha, dict) a partir de um ficheiro CSV ou XLSX aberto em modo binário.
+    Levanta ArquivoInvalido se o ficheiro não puder ser lido.
+    """
+    try:
+        yield from _ler(arquivo, nome)
+    except (UnicodeDecodeError, csv.Error, zipfile.BadZipFile) as e:
+        raise ArquivoInvalido(str(e))
+
+
+def _ler(arquivo, nome):
+    if nome.lower().endswith(('.xlsx', '.xlsm')):
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+
+        try:
+            livro = load_workbook(arquivo, read_only=True, data_only=True)
+        except InvalidFileException as e:
+            raise ArquivoInvalido(str(e))
+        try:
+            linhas = livro.worksheets[0].iter_rows(values_only=True)
+            cabecalho = _cabecalho(next(linhas, ()))
+            for numero, valores in enumerate(linhas, start=2):
+                if any(v not in (None, '') for v in valores):
+                    yield numero, dict(zip(cabecalho, valores))
+        finally:
+            livro.close()
+        return
+
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    try:
+        amostra = texto.read(4096)
+        texto.seek(0)
+        delimitador = csv.Sniffer().sniff(amostra, delimiters=',;\t').delimiter if amostra else ','
+    except csv.Error:
+        delimitador = ','
+    leitor = csv.reader(texto, delimiter=delimitador)
+    cabecalho = _cabecalho(next(leitor, ()))
+    for valores in leitor:
+        if any(v.strip() for v in valores):
+            yield leitor.line_num, dict(zip(cabecalho, valores))
+    texto.detach()
+
+
+def importar(farmacia, linhas, usuario=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa as `linhas` (de `ler_linhas`) para o estoque da farmácia.
+    Retorna o relatório: linhas processadas, lotes criados/atualizados, erros
+    por linha e a `falha` que interrompeu a importação (ou None).
+    ArquivoInvalido só é propagado se nenhum bloco tiver sido gravado.
+    """
+    relatorio = {
+        'processadas': 0, 'criados': 0, 'atualizados': 0, 'total_erros': 0, 'erros': [], 'falha': None
+    }
+    bloco = []
+    ultima = 1  # cabeçalho
+    try:
+        for numero, dados in linhas:
+            bloco.append((numero, dados))
+            ultima = numero
+            if len(bloco) >= tamanho_lote:
+                _processar_bloco(farmacia, bloco, usuario, relatorio)
+                bloco = []
+        if bloco:
+            _processar_bloco(farmacia, bloco, usuario, relatorio)
+    except ArquivoInvalido as e:
+        if not relatorio['processadas']:
+            raise
+        relatorio['falha'] = {
+            'linha_inicial': bloco[0][0] if bloco else ultima + 1, 'erro': f'Ficheiro inválido: {e}'
+        }
+    except DatabaseError as e:
+        # O bloco foi desfeito pela sua transação; os anteriores ficam gravados
+        relatorio['falha'] = {'linha_inicial': bloco[0][0], 'erro': f'Erro ao gravar o bloco: {e}'}
+    return relatorio
+
+
+def _processar_bloco(farmacia, bloco, usuario, relatorio):
+    from .models import EstoqueProduto, MovimentacaoEstoque, Produto
+
+    validas = []
+    for numero, dados in bloco:
+        try:
+            validas.append((numero, _converter(dados)))
+        except ErroLinha as e:
+            _erro(relatorio, numero, str(e))
+
+    # 1. Produtos por código de barras (uma query)
+    produtos = dict(Produto.objects.filter(
+        codigo_barras__in={linha['codigo_barras'] for _, linha in validas}
+    ).values_list('codigo_barras', 'id'))
+
+    # A última ocorrência de um mesmo lote no bloco prevalece
+    por_chave = {}
+    for numero, linha in validas:
+        produto_id = produtos.get(linha.pop('codigo_barras'))
+        if produto_id is None:
+            _erro(relatorio, numero, 'Código de barras não encontrado no catálogo.')
+            continue
+        linha['produto_id'] = produto_id
+        if not linha['lote']:
+            linha['lote'] = f"AUTO-{timezone.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:4].upper()}"
+        por_chave[(produto_id, linha['lote'], linha['local'])] = (numero, linha)
+    if not por_chave:
+        relatorio['processadas'] += len(bloco)
+        return
+
+    with transaction.atomic():
+        # 2. Lotes existentes (uma query, bloqueados até ao fim do bloco)
+        existentes = {
+            (e.produto_id, e.lote, e.local): e
+            for e in EstoqueProduto.objects.select_for_update().filter(
+                farmacia=farmacia,
+                produto_id__in={chave[0] for chave in por_chave},
+                lote__in={chave[1] for chave in por_chave},
+            ).order_by()
+        }
+
+        agora = timezone.now()
+        atualizar, novos, anteriores = [], [], {}
+        for chave, (numero, linha) in por_chave.items():
+            estoque = existentes.get(chave)
+            if estoque is None:
+                if linha['preco_venda'] is None or linha['preco_custo'] is None:
+                    _erro(relatorio, numero, 'preco_custo e preco_venda são obrigatórios para lotes novos.')
+                    continue
+                novos.append(EstoqueProduto(
+                    farmacia=farmacia, data_criacao=agora, data_atualizacao=agora,
+                    **{campo: valor for campo, valor in linha.items() if valor is not None}
+                ))
+            else:
+                anteriores[estoque.id] = estoque.quantidade
+                for campo, valor in linha.items():
+                    if valor is not None:
+                        setattr(estoque, campo, valor)
+                estoque.data_atualizacao = agora
+                atualizar.append(estoque)
+
+        # 3. Gravação em massa
+        if atualizar:
+            EstoqueProduto.objects.bulk_update(atualizar, CAMPOS_ATUALIZAVEIS)
+        if novos:
+            if connection.vendor == 'postgresql':
+                _copiar(novos)
+            else:
+                EstoqueProduto.objects.bulk_create(novos, batch_size=TAMANHO_LOTE)
+            # Ids dos lotes novos (COPY não os devolve): uma query
+            chaves_novas = {(e.produto_id, e.lote, e.local) for e in novos}
+            criados = [
+                e for e in EstoqueProduto.objects.filter(
+                    farmacia=farmacia,
+                    produto_id__in={chave[0] for chave in chaves_novas},
+                    lote__in={chave[1] for chave in chaves_novas},
+                ).order_by() if (e.produto_id, e.lote, e.local) in chaves_novas
+            ]
+        else:
+            criados = []
+
+        # 4. Kardex e efeitos do save() (alertas, ofertas, cache do PDV)
+        movimentos = [
+            MovimentacaoEstoque(
+                estoque=e, tipo=MovimentacaoEstoque.TipoMovimentacao.ENTRADA,
+                quantidade=e.quantidade, quantidade_anterior=0, quantidade_nova=e.quantidade,
+                custo_unitario=e.preco_custo, usuario=usuario,
+                referencia_externa="IMPORTAÇÃO", motivo="Importação de estoque (ficheiro)"
+            ) for e in criados
+        ] + [
+            MovimentacaoEstoque(
+                estoque=e, tipo=MovimentacaoEstoque.TipoMovimentacao.AJUSTE,
+                quantidade=abs(e.quantidade - anteriores[e.id]),
+                quantidade_anterior=anteriores[e.id], quantidade_nova=e.quantidade,
+                custo_unitario=e.preco_custo, usuario=usuario,
+                referencia_externa="IMPORTAÇÃO", motivo="Importação de estoque (ficheiro)"
+            ) for e in atualizar if e.quantidade != anteriores[e.id]
+        ]
+        MovimentacaoEstoque.objects.bulk_create(movimentos, batch_size=TAMANHO_LOTE)
+        EstoqueProduto.registrar_alteracoes_em_massa(
+            [(e, None) for e in criados] + [(e, anteriores[e.id]) for e in atualizar]
+        )
+
+    relatorio['processadas'] += len(bloco)
+    relatorio['criados'] += len(criados)
+    relatorio['atualizados'] += len(atualizar)
+
+
+def _copiar(estoques):
+    """Insere os lotes novos com COPY ... FROM STDIN (PostgreSQL)."""
+    from .models import EstoqueProduto
+
+    campos = [
+        f for f in EstoqueProduto._meta.concrete_fields if not f.primary_key
+    ]
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for estoque in estoques:
+        valores = [f.get_db_prep_save(getattr(estoque, f.attname), connection) for f in campos]
+        escritor.writerow([r'\N' if valor is None else valor for valor in valores])
+    buffer.seek(0)
+
+    colunas = ', '.join(connection.ops.quote_name(f.column) for f in campos)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(EstoqueProduto._meta.db_table)} ({colunas}) "
+            f"FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+
+
+def _cabecalho(valores):
+    from .autocomplete import normalizar
+
+    return [ALIASES.get(normalizar(str(v or '')).replace(' ', '_'), None) for v in valores]
+
+
+def _converter(dados):
+    """Valida e converte uma linha do ficheiro. Campos ausentes ficam None (não alteram o lote)."""
+    from .models import EstoqueProduto
+
+    dados = {campo: valor for campo, valor in dados.items() if campo}
+    codigo = _texto(dados.get('codigo_barras'))
+    if not codigo:
+        raise ErroLinha('codigo_barras é obrigatório.')
+
+    quantidade = _inteiro(dados.get('quantidade'), 'quantidade')
+    if quantidade is None:
+        raise ErroLinha('quantidade é obrigatória.')
+
+    local = (_texto(dados.get('local')) or EstoqueProduto.LocalEstoque.LOJA).upper()
+    if local not in EstoqueProduto.LocalEstoque.values:
+        raise ErroLinha(f"local inválido: {local}.")
+
+    return {
+        'codigo_barras': codigo,
+        'quantidade': quantidade,
+        'lote': _limitar(_texto(dados.get('lote')), 'lote'),
+        'local': local,
+        'quantidade_minima': _inteiro(dados.get('quantidade_minima'), 'quantidade_minima'),
+        'data_validade': _data(dados.get('data_validade'), 'data_validade'),
+        'data_fabricacao': _data(dados.get('data_fabricacao'), 'data_fabricacao'),
+        'preco_custo': _decimal(dados.get('preco_custo'), 'preco_custo'),
+        'preco_venda': _decimal(dados.get('preco_venda'), 'preco_venda'),
+        'preco_promocional': _decimal(dados.get('preco_promocional'), 'preco_promocional'),
+        'localizacao_estoque': _limitar(_texto(dados.get('localizacao_estoque')), 'localizacao_estoque') or None,
+    }
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)  # Códigos numéricos lidos do Excel
+    return str(valor).strip()
+
+
+def _campo(campo):
+    from .models import EstoqueProduto
+    return EstoqueProduto._meta.get_field(campo)
+
+
+def _limitar(texto, campo):
+    """Rejeita texto maior que a coluna de EstoqueProduto."""
+    if len(texto) > _campo(campo).max_length:
+        raise ErroLinha(f"{campo} excede {_campo(campo).max_length} caracteres.")
+    return texto
+
+
+def _numero(texto, campo):
+    """Decimal finito a partir do texto da célula (nan, inf e afins são rejeitados)."""
+    try:
+        numero = Decimal(texto)
+    except InvalidOperation:
+        raise ErroLinha(f"Valor inválido em {campo}: {texto}.")
+    if not numero.is_finite():
+        raise ErroLinha(f"Valor inválido em {campo}: {texto}.")
+    return numero
+
+
+def _inteiro(valor, campo):
+    texto = _texto(valor)
+    if not texto:
+        return None
+    numero = _numero(texto.replace(',', '.'), campo)
+    if numero < 0 or numero != numero.to_integral_value():
+        raise ErroLinha(f"{campo} deve ser um inteiro não negativo.")
+    # Intervalo do tipo da coluna nos bancos que o impõem (o SQLite não impõe nenhum)
+    _, maximo = BaseDatabaseOperations.integer_field_ranges[_campo(campo).get_internal_type()]
+    if numero > maximo:
+        raise ErroLinha(f"{campo} excede o máximo permitido ({maximo}).")
+    return int(numero)
+
+
+def _decimal(valor, campo):
+    texto = _texto(valor)
+    if not texto:
+        return None
+    numero = _numero(texto.replace(' ', '').replace(',', '.'), campo)
+    if numero < 0:
+        raise ErroLinha(f"{campo} não pode ser negativo.")
+    field = _campo(campo)
+    # Dígitos inteiros que cabem na coluna (max_digits - decimal_places), antes e depois do arredondamento
+    limite = Decimal(10) ** (field.max_digits - field.decimal_places)
+    if numero >= limite:
+        raise ErroLinha(f"{campo} excede o valor máximo permitido.")
+    numero = numero.quantize(Decimal(10) ** -field.decimal_places)
+    if numero >= limite:
+        raise ErroLinha(f"{campo} excede o valor máximo permitido.")
+    return numero
+
+
+def _data(valor, campo):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = _texto(valor)
+    if not texto:
+        return None
+    for formato in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%m/%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ErroLinha(f"Data inválida em {campo}: {texto}.")
+
+
+def _erro(relatorio, numero, mensagem):
+    relatorio['total_erros'] += 1
+    if len(relatorio['erros']) < MAX_ERROS:
+        relatorio['erros'].append({'linha': numero, 'erro': mensagem})
@@ -0,0 +1,191 @@
+"""
+Inventário (contagem física) com reconciliação numa única transação.
+
+Fluxo: abre-se uma sessão (Inventario), as contagens vão sendo gravadas por
+lote (ContagemInventario, upsert em massa), a prévia compara-as com o
+estoque atual e `aplicar()` ajusta tudo de uma vez:
+- bloqueia os lotes contados numa query (ordem por id);
+- grava as novas quantidades com bulk_update e o kardex com bulk_create;
+- lança as perdas no financeiro como uma Despesa por categoria de produto.
+Se algo falhar nada é aplicado: a sessão continua aberta.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, IntegerField, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+TAMANHO_LOTE = 1000
+CATEGORIA_PERDAS = 'Perdas e Quebras de Estoque'
+
+
+class InventarioInvalido(Exception):
+    pass
+
+
+def registrar_contagens(inventario, contagens, usuario=None):
+    """
+    Grava (ou substitui) as contagens [{'estoque_id', 'quantidade', 'motivo'?}, ...].
+    Os lotes são validados numa query. Retorna (gravadas, erros).
+    """
+    from .models import ContagemInventario, EstoqueProduto
+
+    if inventario.status != inventario.StatusInventario.ABERTO:
+        raise InventarioInvalido('O inventário já não está aberto para contagens.')
+
+    validas, erros = {}, []
+    for i, contagem in enumerate(contagens):
+        try:
+            estoque_id = int(contagem['estoque_id'])
+            quantidade = int(contagem['quantidade'])
+            if quantidade < 0:
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            erros.append({'indice': i, 'erro': 'estoque_id e quantidade (inteiro >= 0) são obrigatórios.'})
+            continue
+        validas[estoque_id] = (quantidade, str(contagem.get('motivo') or '')[:100])
+
+    da_farmacia = set(EstoqueProduto.objects.filter(
+        farmacia_id=inventario.farmacia_id, pk__in=list(validas)
+    ).values_list('id', flat=True))
+    for estoque_id in set(validas) - da_farmacia:
+        erros.append({'estoque_id': estoque_id, 'erro': 'Lote não encontrado no estoque da farmácia.'})
+
+    registos = [
+        ContagemInventario(
+            inventario=inventario, estoque_id=estoque_id, quantidade_contada=quantidade,
+            motivo=motivo, contado_por=usuario
+        ) for estoque_id, (quantidade, motivo) in validas.items() if estoque_id in da_farmacia
+    ]
+    ContagemInventario.objects.bulk_create(
+        registos,
+        update_conflicts=True,
+        unique_fields=['inventario', 'estoque'],
+        update_fields=['quantidade_contada', 'motivo', 'contado_por', 'data_contagem'],
+        batch_size=TAMANHO_LOTE,
+    )
+    return len(registos), erros
+
+
+def diferencas(inventario, apenas_divergencias=True):
+    """Prévia: contagens x estoque atual, com a diferença e o seu valor a custo (calculados no SQL)."""
+    diferenca = ExpressionWrapper(F('quantidade_contada') - F('estoque__quantidade'), output_field=IntegerField())
+    linhas = inventario.contagens.annotate(
+        diferenca=diferenca,
+        valor_diferenca=ExpressionWrapper(
+            diferenca * F('estoque__preco_custo'), output_field=DecimalField(max_digits=14, decimal_places=2)
+        ),
+    )
+    if apenas_divergencias:
+        linhas = linhas.exclude(quantidade_contada=F('estoque__quantidade'))
+    return linhas.order_by('estoque__produto__nome', 'estoque__lote').values(
+        'estoque_id', 'estoque__produto__nome', 'estoque__produto__codigo_barras',
+        'estoque__lote', 'estoque__local', 'estoque__quantidade', 'quantidade_contada',
+        'diferenca', 'valor_diferenca', 'motivo',
+    )
+
+
+def resumo(inventario):
+    """Totais da prévia numa única agregação."""
+    diferenca = F('quantidade_contada') - F('estoque__quantidade')
+    valor = ExpressionWrapper(diferenca * F('estoque__preco_custo'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    zero = Decimal('0')
+    return inventario.contagens.aggregate(
+        lotes_contados=Count('id'),
+        lotes_divergentes=Count('id', filter=~Q(quantidade_contada=F('estoque__quantidade'))),
+        valor_sobras=Coalesce(Sum(valor, filter=Q(quantidade_contada__gt=F('estoque__quantidade'))), zero,
+                              output_field=DecimalField(max_digits=14, decimal_places=2)),
+        valor_perdas=Coalesce(Sum(valor, filter=Q(quantidade_contada__lt=F('estoque__quantidade'))), zero,
+                              output_field=DecimalField(max_digits=14, decimal_places=2)),
+    )
+
+
+def aplicar(inventario_id, farmacia, usuario=None):
+    """Aplica todas as contagens do inventário numa transação. Retorna o resumo do que foi ajustado."""
+    from financeiro.models import CategoriaDespesa, Despesa
+    from .models import ContagemInventario, EstoqueProduto, Inventario, MovimentacaoEstoque
+
+    with transaction.atomic():
+        try:
+            inventario = Inventario.objects.select_for_update().get(pk=inventario_id, farmacia=farmacia)
+        except Inventario.DoesNotExist:
+            raise InventarioInvalido('Inventário não encontrado.')
+        if inventario.status != Inventario.StatusInventario.ABERTO:
+            raise InventarioInvalido('Este inventário já foi aplicado ou cancelado.')
+
+        contagens = list(inventario.contagens.all())
+        estoques = {
+            e.id: e for e in EstoqueProduto.objects.select_for_update(of=('self',)).filter(
+                pk__in=[c.estoque_id for c in contagens]
+            ).select_related('produto__categoria').order_by('id')
+        }
+
+        ajustados, anteriores, movimentos = [], [], []
+        perdas = defaultdict(Decimal)  # categoria do produto -> valor a custo
+        referencia = f"INVENTÁRIO #{inventario.id}"
+        for contagem in contagens:
+            estoque = estoques[contagem.estoque_id]
+            contagem.quantidade_sistema = estoque.quantidade
+            if contagem.quantidade_contada == estoque.quantidade:
+                continue
+
+            anterior = estoque.quantidade
+            estoque.quantidade = contagem.quantidade_contada
+            estoque.data_atualizacao = timezone.now()
+            ajustados.append(estoque)
+            anteriores.append((estoque, anterior))
+            movimentos.append(MovimentacaoEstoque(
+                estoque=estoque,
+                tipo=MovimentacaoEstoque.TipoMovimentacao.AJUSTE,
+                quantidade=abs(estoque.quantidade - anterior),
+                quantidade_anterior=anterior,
+                quantidade_nova=estoque.quantidade,
+                custo_unitario=estoque.preco_custo,
+                usuario=usuario,
+                referencia_externa=referencia,
+                motivo=contagem.motivo or 'Inventário físico',
+            ))
+            if estoque.quantidade < anterior:
+                categoria = estoque.produto.categoria.nome if estoque.produto.categoria else 'Sem categoria'
+                perdas[categoria] += (anterior - estoque.quantidade) * estoque.preco_custo
+
+        EstoqueProduto.objects.bulk_update(ajustados, ['quantidade', 'data_atualizacao'], batch_size=TAMANHO_LOTE)
+        MovimentacaoEstoque.objects.bulk_create(movimentos, batch_size=TAMANHO_LOTE)
+        ContagemInventario.objects.bulk_update(contagens, ['quantidade_sistema'], batch_size=TAMANHO_LOTE)
+
+        # Financeiro: uma Despesa (perda consumada) por categoria de produto
+        if perdas:
+            cat_perda, _ = CategoriaDespesa.objects.get_or_create(
+                nome=CATEGORIA_PERDAS,
+                defaults={'descricao': 'Prejuízos com mercadoria'}
+            )
+            hoje = timezone.now().date()
+            Despesa.objects.bulk_create([
+                Despesa(
+                    farmacia=farmacia,
+                    categoria=cat_perda,
+                    titulo=f"Perda de Inventário #{inventario.id} - {categoria}"[:200],
+                    valor=valor,
+                    data_vencimento=hoje,
+                    data_pagamento=hoje,
+                    status=Despesa.StatusDespesa.PAGO,
+                    observacoes=f"Divergências de contagem do inventário #{inventario.id}",
+                    criado_por=usuario
+                ) for categoria, valor in sorted(perdas.items()) if valor > 0
+            ])
+
+        inventario.status = Inventario.StatusInventario.APLICADO
+        inventario.aplicado_por = usuario
+        inventario.data_aplicacao = timezone.now()
+        inventario.save(update_fields=['status', 'aplicado_por', 'data_aplicacao'])
+
+        # bulk_update não dispara save()/signals: alertas, ofertas e cache do PDV
+        EstoqueProduto.registrar_alteracoes_em_massa(anteriores)
+
+    return {
+        'lotes_contados': len(contagens),
+        'lotes_ajustados': len(ajustados),
+        'perdas_por_categoria': {categoria: valor for categoria, valor in sorted(perdas.items())},
+    }
@@ -0,0 +1,119 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import User
+from farmacias.models import Farmacia
+from produtos import ofertas, search
+from produtos.models import Produto, EstoqueProduto
+from produtos.views import BuscaGlobalView
+
+PALAVRAS = [
+    'paracetamol', 'ibuprofeno', 'amoxicilina', 'omeprazol', 'metformina',
+    'losartan', 'diclofenac', 'cetirizina', 'azitromicina', 'vitamina',
+    'xarope', 'pomada', 'capsula', 'comprimido', 'infantil', 'forte',
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a latência (p50/p95) da busca global sobre um catálogo sintético. '
+        'Os dados são criados numa transação e descartados no fim (use --manter para preservar).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=100_000)
+        parser.add_argument('--estoques', type=int, default=1_000_000)
+        parser.add_argument('--farmacias', type=int, default=200)
+        parser.add_argument('--consultas', type=int, default=200)
+        parser.add_argument('--manter', action='store_true', help='Não descartar os dados sintéticos.')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._popular(options)
+                self._medir(options['consultas'])
+                if not options['manter']:
+                    raise _Rollback()
+        except _Rollback:
+            self.stdout.write("Dados sintéticos descartados.")
+
+    def _popular(self, options):
+        rnd = random.Random(42)
+        inicio = time.perf_counter()
+
+        users = User.objects.bulk_create([
+            User(email=f"bench-farmacia-{i}@bench.local", tipo_usuario='FARMACIA', first_name='Bench')
+            for i in range(options['farmacias'])
+        ], batch_size=1000)
+        farmacias = Farmacia.objects.bulk_create([
+            Farmacia(
+                usuario=u, nome=f"Farmácia Bench {i}", nuit=f"BENCH{i:08d}",
+                telefone_principal='840000000', email=u.email, endereco='-',
+                bairro='-', cidade='Maputo', provincia='Maputo',
+                latitude=Decimal('-25.96') + Decimal(rnd.random()) / 10,
+                longitude=Decimal('32.58') + Decimal(rnd.random()) / 10,
+            ) for i, u in enumerate(users)
+        ], batch_size=1000)
+
+        produtos = Produto.objects.bulk_create([
+            Produto(
+                nome=f"{rnd.choice(PALAVRAS).title()} {rnd.choice(PALAVRAS)} {i}",
+                nome_generico=rnd.choice(PALAVRAS),
+                fabricante=f"Lab {i % 300}",
+                descricao=' '.join(rnd.choices(PALAVRAS, k=12)),
+            ) for i in range(options['produtos'])
+        ], batch_size=5000)
+        search.indexar_produtos()
+
+        lote = []
+        for i in range(options['estoques']):
+            lote.append(EstoqueProduto(
+                farmacia=farmacias[i % len(farmacias)],
+                produto=produtos[rnd.randrange(len(produtos))],
+                lote=f"B{i}",
+                quantidade=rnd.randint(0, 200),
+                preco_custo=Decimal('10.00'),
+                preco_venda=Decimal(rnd.randint(15, 500)),
+            ))
+            if len(lote) >= 10_000:
+                EstoqueProduto.objects.bulk_create(lote)
+                lote = []
+        if lote:
+            EstoqueProduto.objects.bulk_create(lote)
+        # bulk_create não dispara signals: projeta as ofertas de uma vez
+        ofertas.reconstruir()
+
+        self.stdout.write(
+            f"Catálogo sintético: {len(produtos)} produtos, {options['estoques']} estoques, "
+            f"{len(farmacias)} farmácias ({time.perf_counter() - inicio:.1f}s)"
+        )
+
+    def _medir(self, consultas):
+        rnd = random.Random(7)
+        factory = APIRequestFactory()
+        view = BuscaGlobalView.as_view()
+        tempos = []
+        for _ in range(consultas):
+            termo = rnd.choice(PALAVRAS)[:rnd.randint(3, 8)]
+            request = factory.get('/api/v1/produtos/catalogo/busca/', {'q': termo})
+            inicio = time.perf_counter()
+            response = view(request)
+            response.render()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+
+        tempos.sort()
+        p95 = tempos[int(len(tempos) * 0.95) - 1]
+        self.stdout.write(self.style.SUCCESS(
+            f"{consultas} buscas | p50={statistics.median(tempos):.1f}ms "
+            f"p95={p95:.1f}ms max={tempos[-1]:.1f}ms"
+        ))
@@ -0,0 +1,79 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from accounts.models import User
+from farmacias.models import Farmacia
+from fornecedores.models import Fornecedor
+from produtos.models import Produto
+from produtos.serializers import EntradaEstoqueSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o tempo de lançamento de uma nota de entrada (EntradaEstoqueSerializer) com N linhas. '
+        'Os dados são criados numa transação e descartados no fim.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=500)
+        parser.add_argument('--repeticoes', type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                request, fornecedor, produtos = self._popular(options['linhas'])
+                self._medir(request, fornecedor, produtos, options['repeticoes'])
+                raise _Rollback()
+        except _Rollback:
+            self.stdout.write("Dados sintéticos descartados.")
+
+    def _popular(self, linhas):
+        user = User.objects.create(email="bench-entrada@bench.local", tipo_usuario='FARMACIA', first_name='Bench')
+        farmacia = Farmacia.objects.create(
+            usuario=user, nome="Farmácia Bench Entrada", nuit="BENCHENT", telefone_principal='840000000',
+            email=user.email, endereco='-', bairro='-', cidade='Maputo', provincia='Maputo',
+            latitude=Decimal('-25.96'), longitude=Decimal('32.58'),
+        )
+        fornecedor = Fornecedor.objects.create(
+            farmacia=farmacia, razao_social='Grossista Bench', nome_fantasia='Grossista Bench',
+            telefone_principal='840000000',
+        )
+        produtos = Produto.objects.bulk_create([
+            Produto(nome=f"Produto Bench Entrada {i}", codigo_barras=f"BENCHENT{i}", unidades_por_caixa=10)
+            for i in range(linhas)
+        ])
+        request = APIRequestFactory().post('/api/v1/produtos/entradas/')
+        request.user = user
+        return request, fornecedor, produtos
+
+    def _medir(self, request, fornecedor, produtos, repeticoes):
+        for repeticao in range(repeticoes):
+            payload = {
+                'fornecedor': fornecedor.id,
+                'numero_nota': f"BENCH-{repeticao}",
+                'itens': [
+                    {
+                        'produto': p.id, 'quantidade': 5, 'tipo_unidade': 'CAIXA',
+                        'preco_custo_unitario': '120.00', 'lote': '-', 'data_validade': '2028-01-31',
+                    } for p in produtos
+                ],
+            }
+            inicio = time.perf_counter()
+            with CaptureQueriesContext(connection) as capturadas:
+                serializer = EntradaEstoqueSerializer(data=payload, context={'request': request})
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                serializer.data
+            segundos = time.perf_counter() - inicio
+            self.stdout.write(self.style.SUCCESS(
+                f"Nota de {len(produtos)} linhas: {segundos * 1000:.0f}ms, {len(capturadas)} queries"
+            ))
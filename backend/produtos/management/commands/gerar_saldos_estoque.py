@@ -0,0 +1,36 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from produtos import saldos
+
+
+class Command(BaseCommand):
+    help = (
+        'Grava os saldos de fecho (quantidade e custo por lote) de um dia. '
+        'Agendar diariamente após a meia-noite; por omissão fecha o dia anterior.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Dia a fechar (AAAA-MM-DD). Padrão: ontem.')
+        parser.add_argument('--reter-dias', type=int, default=90,
+                            help='Apaga fechos diários mais antigos (os de fim de mês ficam).')
+
+    def handle(self, *args, **options):
+        if options['data']:
+            try:
+                data = datetime.date.fromisoformat(options['data'])
+            except ValueError:
+                raise CommandError('Data inválida. Use AAAA-MM-DD.')
+        else:
+            data = timezone.localdate() - datetime.timedelta(days=1)
+
+        inicio = time.perf_counter()
+        gravados = saldos.gerar(data)
+        apagados = saldos.limpar(options['reter_dias'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Fecho de {data}: {gravados} saldos gravados, {apagados} fechos antigos removidos "
+            f"({time.perf_counter() - inicio:.1f}s)."
+        ))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from farmacias.models import Farmacia
+from produtos import importacao
+
+
+class Command(BaseCommand):
+    help = 'Importa o estoque de uma farmácia a partir de um ficheiro CSV ou XLSX (em streaming, por blocos).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('farmacia_id', type=int)
+        parser.add_argument('arquivo', help='Caminho do ficheiro .csv ou .xlsx')
+        parser.add_argument('--tamanho-lote', type=int, default=importacao.TAMANHO_LOTE,
+                            help='Linhas por bloco (uma transação por bloco).')
+
+    def handle(self, *args, **options):
+        try:
+            farmacia = Farmacia.objects.get(pk=options['farmacia_id'])
+        except Farmacia.DoesNotExist:
+            raise CommandError(f"Farmácia {options['farmacia_id']} não encontrada.")
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                relatorio = importacao.importar(
+                    farmacia,
+                    importacao.ler_linhas(arquivo, options['arquivo']),
+                    tamanho_lote=options['tamanho_lote']
+                )
+        except (OSError, importacao.ArquivoInvalido) as e:
+            raise CommandError(str(e))
+
+        for erro in relatorio['erros']:
+            self.stdout.write(self.style.WARNING(f"  Linha {erro['linha']}: {erro['erro']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{relatorio['processadas']} linhas em {time.perf_counter() - inicio:.1f}s: "
+            f"{relatorio['criados']} lotes criados, {relatorio['atualizados']} atualizados, "
+            f"{relatorio['total_erros']} erros."
+        ))
+        if relatorio['falha']:
+            falha = relatorio['falha']
+            raise CommandError(f"Importação interrompida na linha {falha['linha_inicial']}: {falha['erro']}")
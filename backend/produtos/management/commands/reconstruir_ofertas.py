@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from produtos import ofertas
+from produtos.models import OfertaProduto
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói a tabela de ofertas (produto x farmácia) a partir do estoque.'
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconstruindo ofertas do marketplace...")
+        with transaction.atomic():
+            ofertas.reconstruir()
+        total = OfertaProduto.objects.count()
+        self.stdout.write(self.style.SUCCESS(f"{total} ofertas reconstruídas."))
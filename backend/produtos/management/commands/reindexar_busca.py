@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from produtos import search
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de busca textual do catálogo (tsvector no Postgres, FTS5 no SQLite).'
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reindexando catálogo de produtos...")
+        search.indexar_produtos()
+        self.stdout.write(self.style.SUCCESS("Índice de busca reconstruído."))
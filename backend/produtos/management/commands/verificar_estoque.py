@@ -1,71 +1,96 @@
+import datetime
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
 from django.core.management.base import BaseCommand
+from django.db.models import F
 from django.utils import timezone
+
+from farmacias.models import Farmacia, Notificacao
+from produtos.alertas import DIAS_AVISO_VALIDADE, criar_notificacoes, sem_notificacao
 from produtos.models import EstoqueProduto
-from farmacias.models import Notificacao
-import datetime
+
 
 class Command(BaseCommand):
     help = 'Verifica Validade e Estoque e gera notificações para as farmácias.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--farmacias-por-lote', type=int, default=50,
+                            help='Quantas farmácias processar por bloco.')
+
     def handle(self, *args, **options):
         hoje = timezone.now().date()
-        proximos_30_dias = hoje + datetime.timedelta(days=30)
-        
+        limite_aviso = hoje + datetime.timedelta(days=DIAS_AVISO_VALIDADE)
+        self.tempos = defaultdict(float)
+        contagem = defaultdict(int)
+
         self.stdout.write(f"Iniciando verificação de estoque e validade em {hoje}...")
-        
-        # 1. Verificar Validade
-        estoques = EstoqueProduto.objects.filter(data_validade__isnull=False)
-        count_validade = 0
-        
-        for item in estoques:
-            dias_para_vencer = (item.data_validade - hoje).days
-            
-            if dias_para_vencer < 0:
-                # Já expirado
-                _, created = Notificacao.objects.get_or_create(
-                    farmacia=item.farmacia,
-                    tipo='EXPIRADO',
-                    titulo=f"PRODUTO EXPIRADO: {item.produto.nome}",
-                    defaults={'mensagem': f"O lote {item.lote} de {item.produto.nome} expirou em {item.data_validade}."}
+
+        ids = list(Farmacia.objects.order_by('id').values_list('id', flat=True))
+        tamanho = options['farmacias_por_lote']
+        for i in range(0, len(ids), tamanho):
+            estoques = EstoqueProduto.objects.filter(farmacia_id__in=ids[i:i + tamanho])
+
+            # 1. Validade: expirados e vencendo nos próximos 30 dias
+            with self._fase('validade'):
+                contagem['validade'] += self._notificar(
+                    sem_notificacao(estoques.filter(data_validade__lt=hoje), 'EXPIRADO', 'PRODUTO EXPIRADO: '),
+                    'EXPIRADO',
+                    lambda e: f"O lote {e['lote']} de {e['produto__nome']} expirou em {e['data_validade']}."
                 )
-                if created: count_validade += 1
-            
-            elif dias_para_vencer <= 30:
-                # Vencendo em breve
-                _, created = Notificacao.objects.get_or_create(
-                    farmacia=item.farmacia,
-                    tipo='VALIDADE',
-                    titulo=f"Validade Próxima: {item.produto.nome}",
-                    defaults={'mensagem': f"O lote {item.lote} de {item.produto.nome} vence em {dias_para_vencer} dias ({item.data_validade})."}
+                contagem['validade'] += self._notificar(
+                    sem_notificacao(
+                        estoques.filter(data_validade__gte=hoje, data_validade__lte=limite_aviso),
+                        'VALIDADE', 'Validade Próxima: '
+                    ),
+                    'VALIDADE',
+                    lambda e: (f"O lote {e['lote']} de {e['produto__nome']} vence em "
+                               f"{(e['data_validade'] - hoje).days} dias ({e['data_validade']}).")
                 )
-                if created: count_validade += 1
 
-        # 2. Verificar Ruptura de Estoque
-        rupturas = EstoqueProduto.objects.filter(quantidade=0)
-        count_ruptura = 0
-        for item in rupturas:
-            _, created = Notificacao.objects.get_or_create(
-                farmacia=item.farmacia,
-                tipo='ESTOQUE',
-                titulo=f"RUPTURA: {item.produto.nome}",
-                defaults={'mensagem': f"O produto {item.produto.nome} (Lote: {item.lote}) esgotou completamente no estoque."}
-            )
-            if created: count_ruptura += 1
+            # 2. Ruptura de Estoque
+            with self._fase('ruptura'):
+                contagem['ruptura'] += self._notificar(
+                    sem_notificacao(estoques.filter(quantidade=0), 'ESTOQUE', 'RUPTURA: '),
+                    'ESTOQUE',
+                    lambda e: f"O produto {e['produto__nome']} (Lote: {e['lote']}) esgotou completamente no estoque."
+                )
 
-        # 3. Verificar Estoque Baixo
-        baixo_estoque = EstoqueProduto.objects.all()
-        count_baixo = 0
-        for item in baixo_estoque:
-            if 0 < item.quantidade <= item.quantidade_minima:
-                _, created = Notificacao.objects.get_or_create(
-                    farmacia=item.farmacia,
-                    tipo='ESTOQUE',
-                    titulo=f"Estoque Baixo: {item.produto.nome}",
-                    defaults={'mensagem': f"O produto {item.produto.nome} atingiu o nível crítico ({item.quantidade} unidades)."}
+            # 3. Estoque Baixo
+            with self._fase('baixo'):
+                contagem['baixo'] += self._notificar(
+                    sem_notificacao(
+                        estoques.filter(quantidade__gt=0, quantidade__lte=F('quantidade_minima')),
+                        'ESTOQUE', 'Estoque Baixo: '
+                    ),
+                    'ESTOQUE',
+                    lambda e: f"O produto {e['produto__nome']} atingiu o nível crítico ({e['quantidade']} unidades)."
                 )
-                if created: count_baixo += 1
 
+        for fase, segundos in self.tempos.items():
+            self.stdout.write(f"  {fase}: {segundos:.2f}s")
         self.stdout.write(self.style.SUCCESS(
-            f"Verificação concluída: {count_validade} alertas de validade, "
-            f"{count_ruptura} rupturas e {count_baixo} estoques baixos notificados."
+            f"Verificação concluída: {contagem['validade']} alertas de validade, "
+            f"{contagem['ruptura']} rupturas e {contagem['baixo']} estoques baixos notificados."
         ))
+
+    def _notificar(self, queryset, tipo, mensagem):
+        """Uma query (com anti-join) para os candidatos e um bulk_create."""
+        candidatos = queryset.order_by('id').values(
+            'farmacia_id', 'titulo_alerta', 'lote', 'quantidade', 'data_validade', 'produto__nome'
+        )
+        novas = [
+            Notificacao(farmacia_id=e['farmacia_id'], tipo=tipo, titulo=e['titulo_alerta'], mensagem=mensagem(e))
+            for e in candidatos
+        ]
+        # Os candidatos já excluem o que existe; criar_notificacoes só junta lotes do mesmo produto
+        return len(criar_notificacoes(novas, verificar_existentes=False))
+
+    @contextmanager
+    def _fase(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tempos[nome] += time.perf_counter() - inicio
@@ -0,0 +1,205 @@
+import random
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import User
+from farmacias.analytics_views import AnalyticsReportView, DashboardStatsView
+from farmacias.models import Farmacia, Notificacao
+from farmacias.views import NotificacaoListView
+from pedidos.models import ItemPedido, Pedido
+from pedidos.views import PedidoListView
+from produtos import ofertas
+from produtos.models import EstoqueProduto, MovimentacaoEstoque, Produto
+from produtos.views import (
+    BuscaGlobalView, EstoqueFarmaciaListView, LeituraCodigoBarrasView,
+    MovimentacaoFarmaciaView, ProdutoDisponibilidadeView,
+)
+
+# Tabelas que crescem com o uso: nenhuma consulta pode lê-las por inteiro
+TABELAS_QUENTES = (
+    'pedidos_pedido', 'pedidos_itempedido', 'produtos_estoqueproduto',
+    'produtos_movimentacaoestoque', 'produtos_ofertaproduto', 'farmacias_notificacao',
+)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa os endpoints críticos sobre dados sintéticos, roda EXPLAIN em cada consulta '
+        'e falha se alguma fizer leitura completa de uma tabela quente. '
+        'Os dados são criados numa transação e descartados no fim.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farmacias', type=int, default=5)
+        parser.add_argument('--produtos', type=int, default=300)
+        parser.add_argument('--pedidos', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        falhas = []
+        try:
+            with transaction.atomic():
+                farmacia, produto = self._popular(options)
+                self._preparar_planejador()
+                for nome, view, path, kwargs in self._cenarios(farmacia, produto):
+                    falhas += self._verificar(nome, view, path, farmacia.usuario, kwargs)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        if falhas:
+            for nome, tabela, sql in falhas:
+                self.stderr.write(f"[{nome}] leitura completa de {tabela}:\n  {sql[:300]}")
+            raise CommandError(f"{len(falhas)} consulta(s) sem índice.")
+        self.stdout.write(self.style.SUCCESS("Todas as consultas usam índice."))
+
+    def _cenarios(self, farmacia, produto):
+        return [
+            ('dashboard', DashboardStatsView, '/', {}),
+            ('analytics', AnalyticsReportView, '/?periodo=30', {}),
+            ('pedidos', PedidoListView, '/', {}),
+            ('pedidos-cursor', PedidoListView, '/?cursor=', {}),
+            ('pedidos-status', PedidoListView, '/?status=PENDENTE', {}),
+            ('kardex', MovimentacaoFarmaciaView, '/', {}),
+            ('kardex-cursor', MovimentacaoFarmaciaView, '/?cursor=', {}),
+            ('notificacoes', NotificacaoListView, '/?cursor=', {}),
+            ('meu-estoque', EstoqueFarmaciaListView, '/', {}),
+            ('pdv-scan', LeituraCodigoBarrasView, f'/?codigo={produto.codigo_barras}', {}),
+            ('busca', BuscaGlobalView, '/?q=produto', {}),
+            ('disponibilidade', ProdutoDisponibilidadeView, '/', {'pk': produto.pk}),
+        ]
+
+    def _verificar(self, nome, view, path, usuario, kwargs):
+        request = APIRequestFactory().get(path)
+        force_authenticate(request, user=usuario)
+        with CaptureQueriesContext(connection) as capturadas:
+            response = view.as_view()(request, **kwargs)
+            response.render()
+        if response.status_code >= 400:
+            raise CommandError(f"[{nome}] respondeu {response.status_code}: {response.data}")
+
+        falhas = []
+        for consulta in capturadas.captured_queries:
+            sql = consulta['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            for tabela in self._leituras_completas(sql):
+                falhas.append((nome, tabela, sql))
+        self.stdout.write(f"{nome}: {len(capturadas.captured_queries)} consultas verificadas")
+        return falhas
+
+    # --- EXPLAIN ---
+
+    def _preparar_planejador(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Com poucos dados o Postgres prefere Seq Scan mesmo havendo índice;
+                # desligando-o, um Seq Scan só aparece quando não há índice utilizável.
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                for tabela in TABELAS_QUENTES:
+                    cursor.execute(f"ANALYZE {tabela}")
+            else:
+                cursor.execute("ANALYZE")
+
+    def _leituras_completas(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f"EXPLAIN {sql}")
+                linhas = [linha[0] for linha in cursor.fetchall()]
+                padrao = re.compile(r'Seq Scan on (\w+)')
+            else:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                linhas = [linha[-1] for linha in cursor.fetchall()]
+                # "SCAN t" lê a tabela toda; "SCAN t USING INDEX i" percorre o índice em ordem
+                padrao = re.compile(r'^SCAN (\w+)$')
+        tabelas = set()
+        for linha in linhas:
+            encontrado = padrao.search(linha.strip())
+            if encontrado and encontrado.group(1) in TABELAS_QUENTES:
+                tabelas.add(encontrado.group(1))
+        return tabelas
+
+    # --- Dados sintéticos ---
+
+    def _popular(self, options):
+        rnd = random.Random(7)
+        agora = timezone.now()
+        hoje = agora.date()
+
+        farmacias = []
+        for i in range(options['farmacias']):
+            usuario = User.objects.create(
+                email=f"plano-farmacia-{i}@bench.local", tipo_usuario='FARMACIA', first_name='Plano'
+            )
+            farmacias.append(Farmacia.objects.create(
+                usuario=usuario, nome=f"Farmácia Plano {i}", nuit=f"PLANO{i:08d}",
+                telefone_principal='840000000', email=usuario.email, endereco='-',
+                bairro='-', cidade='Maputo', provincia='Maputo',
+                latitude=Decimal('-25.96'), longitude=Decimal('32.58'),
+            ))
+        cliente = User.objects.create(email="plano-cliente@bench.local", tipo_usuario='CLIENTE')
+
+        produtos = Produto.objects.bulk_create([
+            Produto(nome=f"Produto Plano {i}", codigo_barras=f"PLANO{i:08d}")
+            for i in range(options['produtos'])
+        ])
+
+        estoques = EstoqueProduto.objects.bulk_create([
+            EstoqueProduto(
+                farmacia=f, produto=p, lote=f"L{j}", quantidade=rnd.randint(0, 100),
+                preco_custo=Decimal('10.00'), preco_venda=Decimal(rnd.randint(15, 300)),
+                data_validade=hoje + timedelta(days=rnd.randint(-60, 720)),
+            )
+            for f in farmacias for j, p in enumerate(produtos)
+        ], batch_size=2000)
+        ofertas.reconstruir()
+
+        MovimentacaoEstoque.objects.bulk_create([
+            MovimentacaoEstoque(
+                estoque=e, tipo='ENTRADA', quantidade=e.quantidade,
+                quantidade_anterior=0, quantidade_nova=e.quantidade, motivo='Carga inicial',
+            ) for e in estoques
+        ], batch_size=2000)
+
+        status = [s for s, _ in Pedido.StatusPedido.choices]
+        pedidos = Pedido.objects.bulk_create([
+            Pedido(
+                numero_pedido=f"PLANO{i:010d}", cliente=cliente, farmacia=farmacias[i % len(farmacias)],
+                status=rnd.choice(status), total=Decimal(rnd.randint(50, 5000)),
+            ) for i in range(options['pedidos'])
+        ], batch_size=2000)
+        # data_criacao é auto_now_add: espalha os pedidos pelos últimos 90 dias
+        for pedido in pedidos:
+            pedido.data_criacao = agora - timedelta(minutes=rnd.randint(0, 90 * 24 * 60))
+        Pedido.objects.bulk_update(pedidos, ['data_criacao'], batch_size=2000)
+
+        por_farmacia = {}
+        for e in estoques:
+            por_farmacia.setdefault(e.farmacia_id, []).append(e)
+        ItemPedido.objects.bulk_create([
+            ItemPedido(
+                pedido=pedido, produto_id=e.produto_id, estoque=e, quantidade=1,
+                preco_unitario=e.preco_venda, subtotal=e.preco_venda,
+            )
+            for pedido in pedidos
+            for e in rnd.sample(por_farmacia[pedido.farmacia_id], 2)
+        ], batch_size=2000)
+
+        Notificacao.objects.bulk_create([
+            Notificacao(
+                farmacia=farmacias[i % len(farmacias)], tipo='ESTOQUE',
+                titulo=f"Aviso {i}", mensagem='-', lida=bool(i % 3),
+            ) for i in range(options['pedidos'])
+        ], batch_size=2000)
+
+        return farmacias[0], produtos[0]
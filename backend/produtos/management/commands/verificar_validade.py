@@ -1,75 +1,123 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
-from datetime import timedelta
+
+from farmacias import painel
+from farmacias.models import Farmacia, Notificacao
+from produtos import ofertas, pdv
+from produtos.alertas import DIAS_AVISO_VALIDADE, criar_notificacoes, sem_notificacao
 from produtos.models import EstoqueProduto, MovimentacaoEstoque
-from farmacias.models import Notificacao
+
 
 class Command(BaseCommand):
     help = 'Verifica validade dos produtos, notifica vencimentos próximos e expira vencidos.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--farmacias-por-lote', type=int, default=50,
+                            help='Quantas farmácias processar por bloco (uma transação por bloco).')
+
     def handle(self, *args, **options):
         hoje = timezone.now().date()
-        aviso_data = hoje + timedelta(days=30)
-        
-        # 1. Processar Lotes JÁ Vencidos
-        vencidos = EstoqueProduto.objects.filter(
-            data_validade__lt=hoje, 
-            is_disponivel=True
-        )
-        
+        aviso_data = hoje + timedelta(days=DIAS_AVISO_VALIDADE)
+        self.tempos = defaultdict(float)
         count_vencidos = 0
-        for lote in vencidos:
-            # Desativa o lote
-            lote.is_disponivel = False
-            lote.save()
-            
-            # Registra PERDA no histórico (Abate financeiro)
-            MovimentacaoEstoque.objects.create(
-                estoque=lote,
-                tipo=MovimentacaoEstoque.TipoMovimentacao.PERDA,
-                quantidade=lote.quantidade,
-                quantidade_anterior=lote.quantidade,
-                quantidade_nova=0, # Perda total assumida por segurança
-                motivo="VALIDADE EXPIRADA - BAIXA AUTOMÁTICA",
-                observacoes=f"Lote {lote.lote} expirou em {lote.data_validade}"
-            )
-            
-            # Notifica a farmácia
-            Notificacao.objects.create(
-                farmacia=lote.farmacia,
-                tipo=Notificacao.TipoNotificacao.EXPIRADO,
-                titulo=f"Lote Expirado: {lote.produto.nome}",
-                mensagem=f"O lote {lote.lote} venceu em {lote.data_validade} e foi removido do estoque automaticamente."
-                f"Quantidade perdida: {lote.quantidade}. Prejuízo estimado: {lote.quantidade * lote.preco_custo} MT."
-            )
-            count_vencidos += 1
-            
-        self.stdout.write(self.style.SUCCESS(f'{count_vencidos} lotes expirados processados.'))
-
-        # 2. Notificar Lotes Vencendo em 30 Dias (ou menos)
-        proximos = EstoqueProduto.objects.filter(
-            data_validade__range=[hoje, aviso_data],
-            is_disponivel=True
-        )
-        
         count_avisos = 0
-        for lote in proximos:
-            # Verifica se já notificou hoje para não fazer spam (lógica simplificada aqui)
-            existe = Notificacao.objects.filter(
-                farmacia=lote.farmacia,
-                titulo__contains=f"Vence em Breve: {lote.produto.nome}",
-                data_criacao__date=hoje
-            ).exists()
-            
-            if not existe:
-                dias_restantes = (lote.data_validade - hoje).days
-                Notificacao.objects.create(
-                    farmacia=lote.farmacia,
-                    tipo=Notificacao.TipoNotificacao.VALIDADE,
-                    titulo=f"Vence em Breve: {lote.produto.nome}",
-                    mensagem=f"O lote {lote.lote} vence em {dias_restantes} dias ({lote.data_validade}). "
-                    f"Considere colocar em promoção!"
-                )
-                count_avisos += 1
-                
+
+        ids = list(Farmacia.objects.order_by('id').values_list('id', flat=True))
+        tamanho = options['farmacias_por_lote']
+        for i in range(0, len(ids), tamanho):
+            bloco = ids[i:i + tamanho]
+            with transaction.atomic():
+                count_vencidos += self._expirar(bloco, hoje)
+            with self._fase('avisos'):
+                count_avisos += self._avisar(bloco, hoje, aviso_data)
+
+        for fase, segundos in self.tempos.items():
+            self.stdout.write(f"  {fase}: {segundos:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f'{count_vencidos} lotes expirados processados.'))
         self.stdout.write(self.style.SUCCESS(f'{count_avisos} alertas de validade gerados.'))
+
+    def _expirar(self, farmacia_ids, hoje):
+        """Lotes JÁ vencidos: dá baixa total e desativa (1 UPDATE), registra PERDA e notifica (bulk_create)."""
+        with self._fase('selecao vencidos'):
+            vencidos = list(EstoqueProduto.objects.select_for_update(of=('self',)).filter(
+                farmacia_id__in=farmacia_ids,
+                data_validade__lt=hoje,
+                is_disponivel=True
+            ).order_by('id').values(
+                'id', 'farmacia_id', 'produto_id', 'produto__nome', 'lote',
+                'quantidade', 'preco_custo', 'data_validade'
+            ))
+        if not vencidos:
+            return 0
+
+        with self._fase('desativar'):
+            # update() não passa pelo save(): os alertas por lote são substituídos pela notificação abaixo.
+            # O lote fica a zero, como a PERDA registada no kardex (os saldos históricos somam esse efeito)
+            EstoqueProduto.objects.filter(pk__in=[v['id'] for v in vencidos]).update(quantidade=0, is_disponivel=False)
+            ofertas.agendar((v['produto_id'], v['farmacia_id']) for v in vencidos)
+            pdv.invalidar_farmacias(v['farmacia_id'] for v in vencidos)
+            painel.invalidar(v['farmacia_id'] for v in vencidos)
+
+        with self._fase('kardex'):
+            # Registra PERDA no histórico (Abate financeiro)
+            MovimentacaoEstoque.objects.bulk_create([
+                MovimentacaoEstoque(
+                    estoque_id=v['id'],
+                    tipo=MovimentacaoEstoque.TipoMovimentacao.PERDA,
+                    quantidade=v['quantidade'],
+                    quantidade_anterior=v['quantidade'],
+                    quantidade_nova=0,  # Perda total: o lote foi zerado acima
+                    motivo="VALIDADE EXPIRADA - BAIXA AUTOMÁTICA",
+                    observacoes=f"Lote {v['lote']} expirou em {v['data_validade']}"
+                ) for v in vencidos
+            ], batch_size=1000)
+
+        with self._fase('notificacoes vencidos'):
+            Notificacao.objects.bulk_create([
+                Notificacao(
+                    farmacia_id=v['farmacia_id'],
+                    tipo=Notificacao.TipoNotificacao.EXPIRADO,
+                    titulo=f"Lote Expirado: {v['produto__nome']}",
+                    mensagem=f"O lote {v['lote']} venceu em {v['data_validade']} e foi removido do estoque automaticamente."
+                    f"Quantidade perdida: {v['quantidade']}. Prejuízo estimado: {v['quantidade'] * v['preco_custo']} MT."
+                ) for v in vencidos
+            ], batch_size=1000)
+        return len(vencidos)
+
+    def _avisar(self, farmacia_ids, hoje, aviso_data):
+        """Lotes vencendo em 30 dias (ou menos): um aviso por produto e farmácia por dia."""
+        proximos = sem_notificacao(
+            EstoqueProduto.objects.filter(
+                farmacia_id__in=farmacia_ids,
+                data_validade__range=[hoje, aviso_data],
+                is_disponivel=True
+            ),
+            Notificacao.TipoNotificacao.VALIDADE,
+            'Vence em Breve: ',
+            data_criacao__date=hoje
+        ).order_by('id').values('farmacia_id', 'titulo_alerta', 'lote', 'data_validade')
+
+        novas = [
+            Notificacao(
+                farmacia_id=lote['farmacia_id'],
+                tipo=Notificacao.TipoNotificacao.VALIDADE,
+                titulo=lote['titulo_alerta'],
+                mensagem=f"O lote {lote['lote']} vence em {(lote['data_validade'] - hoje).days} dias "
+                f"({lote['data_validade']}). Considere colocar em promoção!"
+            ) for lote in proximos
+        ]
+        return len(criar_notificacoes(novas, verificar_existentes=False))
+
+    @contextmanager
+    def _fase(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tempos[nome] += time.perf_counter() - inicio
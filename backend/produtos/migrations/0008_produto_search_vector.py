@@ -0,0 +1,83 @@
+# Generated by Django 4.2.20 on 2026-10-18 07:55
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+POSTGRES_FORWARD = [
+    "CREATE INDEX IF NOT EXISTS produtos_produto_search_gin ON produtos_produto USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS produtos_produto_nome_trgm ON produtos_produto USING gin (nome gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS produtos_produto_generico_trgm ON produtos_produto USING gin (nome_generico gin_trgm_ops)",
+    """
+    UPDATE produtos_produto SET search_vector =
+        setweight(to_tsvector('simple', COALESCE(nome, '')), 'A') ||
+        setweight(to_tsvector('simple', COALESCE(nome_generico, '')), 'B') ||
+        setweight(to_tsvector('simple', COALESCE(fabricante, '')), 'C') ||
+        setweight(to_tsvector('portuguese', COALESCE(descricao, '')), 'D')
+    """,
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS produtos_produto_search_gin",
+    "DROP INDEX IF EXISTS produtos_produto_nome_trgm",
+    "DROP INDEX IF EXISTS produtos_produto_generico_trgm",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS produtos_produto_fts USING fts5(
+        nome, nome_generico, fabricante, descricao,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO produtos_produto_fts (rowid, nome, nome_generico, fabricante, descricao)
+    SELECT id, COALESCE(nome, ''), COALESCE(nome_generico, ''),
+           COALESCE(fabricante, ''), COALESCE(descricao, '')
+    FROM produtos_produto
+    """,
+]
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS produtos_produto_fts",
+]
+
+
+def criar_indices_busca(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = POSTGRES_FORWARD
+    elif vendor == 'sqlite':
+        statements = SQLITE_FORWARD
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def remover_indices_busca(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = POSTGRES_BACKWARD
+    elif vendor == 'sqlite':
+        statements = SQLITE_BACKWARD
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0007_itementrada_tipo_unidade'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='produto',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(criar_indices_busca, remover_indices_busca),
+    ]
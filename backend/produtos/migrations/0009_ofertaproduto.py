@@ -0,0 +1,48 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def popular_ofertas(apps, schema_editor):
+    from produtos import ofertas
+
+    ofertas.reconstruir(
+        apps.get_model('produtos', 'EstoqueProduto'),
+        apps.get_model('produtos', 'OfertaProduto'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmacias', '0008_farmacia_geohash'),
+        ('produtos', '0008_produto_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfertaProduto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade_total', models.PositiveIntegerField(default=0, verbose_name='quantidade total')),
+                ('total_lotes', models.PositiveIntegerField(default=0, verbose_name='total de lotes')),
+                ('preco_final', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='preço final')),
+                ('preco_venda', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='preço de venda')),
+                ('preco_promocional', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='preço promocional')),
+                ('em_promocao', models.BooleanField(default=False, verbose_name='em promoção')),
+                ('data_validade_proxima', models.DateField(blank=True, null=True, verbose_name='validade mais próxima')),
+                ('data_atualizacao', models.DateTimeField(auto_now=True, verbose_name='data de atualização')),
+                ('estoque_referencia', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='produtos.estoqueproduto', verbose_name='lote de referência')),
+                ('farmacia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ofertas', to='farmacias.farmacia', verbose_name='farmácia')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ofertas', to='produtos.produto', verbose_name='produto')),
+            ],
+            options={
+                'verbose_name': 'oferta de produto',
+                'verbose_name_plural': 'ofertas de produtos',
+                'indexes': [models.Index(fields=['produto', 'preco_final'], name='oferta_produto_preco_idx')],
+                'unique_together': {('produto', 'farmacia')},
+            },
+        ),
+        migrations.RunPython(popular_ofertas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0009_ofertaproduto'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['data_movimentacao', 'id'], name='movimentacao_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0010_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='estoqueproduto',
+            index=models.Index(fields=['farmacia', 'quantidade'], name='estoque_farmacia_qtd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='estoqueproduto',
+            index=models.Index(fields=['data_validade'], name='estoque_validade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentacaoestoque',
+            index=models.Index(fields=['estoque', 'data_movimentacao'], name='movimentacao_estoque_data_idx'),
+        ),
+    ]
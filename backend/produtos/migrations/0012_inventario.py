@@ -0,0 +1,53 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('farmacias', '0010_hot_query_indexes'),
+        ('produtos', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Inventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descricao', models.CharField(blank=True, max_length=200, verbose_name='descrição')),
+                ('status', models.CharField(choices=[('ABERTO', 'Em contagem'), ('APLICADO', 'Aplicado'), ('CANCELADO', 'Cancelado')], default='ABERTO', max_length=10, verbose_name='status')),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('data_aplicacao', models.DateTimeField(blank=True, null=True, verbose_name='data de aplicação')),
+                ('aplicado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventarios_aplicados', to=settings.AUTH_USER_MODEL)),
+                ('criado_por', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventarios_criados', to=settings.AUTH_USER_MODEL)),
+                ('farmacia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventarios', to='farmacias.farmacia', verbose_name='farmácia')),
+            ],
+            options={
+                'verbose_name': 'inventário',
+                'verbose_name_plural': 'inventários',
+                'ordering': ['-data_criacao'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ContagemInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade_contada', models.PositiveIntegerField(verbose_name='quantidade contada')),
+                ('motivo', models.CharField(blank=True, max_length=100, verbose_name='motivo da divergência')),
+                ('quantidade_sistema', models.PositiveIntegerField(blank=True, null=True, verbose_name='quantidade no sistema')),
+                ('data_contagem', models.DateTimeField(auto_now=True)),
+                ('contado_por', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='contagens_inventario', to=settings.AUTH_USER_MODEL)),
+                ('estoque', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contagens_inventario', to='produtos.estoqueproduto', verbose_name='estoque')),
+                ('inventario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contagens', to='produtos.inventario')),
+            ],
+            options={
+                'verbose_name': 'contagem de inventário',
+                'verbose_name_plural': 'contagens de inventário',
+                'unique_together': {('inventario', 'estoque')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.20 on 2026-10-18 08:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmacias', '0010_hot_query_indexes'),
+        ('produtos', '0012_inventario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='data do fecho')),
+                ('quantidade', models.PositiveIntegerField(verbose_name='quantidade')),
+                ('custo_unitario', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='custo unitário')),
+                ('fecho_mes', models.BooleanField(default=False, verbose_name='fecho de mês')),
+                ('estoque', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='produtos.estoqueproduto', verbose_name='estoque')),
+                ('farmacia', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_estoque', to='farmacias.farmacia')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos_estoque', to='produtos.produto')),
+            ],
+            options={
+                'verbose_name': 'saldo de estoque',
+                'verbose_name_plural': 'saldos de estoque',
+                'indexes': [models.Index(fields=['farmacia', 'data'], name='saldo_farmacia_data_idx')],
+                'unique_together': {('estoque', 'data')},
+            },
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from django.utils import timezone
+from django.contrib.postgres.search import SearchVectorField
 from farmacias.models import Farmacia
 
 
@@ -124,6 +125,9 @@ class Produto(models.Model):
         help_text=_('Comissão paga ao vendedor por cada unidade vendida')
     )
     
+    # Busca textual (mantido por produtos.search; índices GIN criados na migração)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     # Metadata
     data_criacao = models.DateTimeField(_('data de criação'), auto_now_add=True)
     data_atualizacao = models.DateTimeField(_('data de atualização'), auto_now=True)
@@ -137,6 +141,24 @@ class Produto(models.Model):
         return f"{self.nome} - {self.concentracao}" if self.concentracao else self.nome
 
 
+def formatar_quantidade(quantidade, produto):
+    """Formata uma quantidade em unidades como 'X cx + Y un'."""
+    upc = produto.unidades_por_caixa or 1
+    if upc <= 1:
+        return f"{quantidade} {produto.get_unidade_medida_display()}"
+
+    caixas = quantidade // upc
+    restante = quantidade % upc
+
+    partes = []
+    if caixas > 0:
+        partes.append(f"{caixas} cx")
+    if restante > 0 or caixas == 0:
+        partes.append(f"{restante} un")
+
+    return " + ".join(partes)
+
+
 class EstoqueProduto(models.Model):
     """Product stock model for each pharmacy."""
     
@@ -213,6 +235,10 @@ class EstoqueProduto(models.Model):
         verbose_name_plural = _('estoques de produtos')
         ordering = ['-data_criacao']
         unique_together = ['farmacia', 'produto', 'lote', 'local']
+        indexes = [
+            models.Index(fields=['farmacia', 'quantidade'], name='estoque_farmacia_qtd_idx'),
+            models.Index(fields=['data_validade'], name='estoque_validade_idx'),
+        ]
     
     def __str__(self):
         return f"{self.produto.nome} - {self.farmacia.nome} (Qtd: {self.quantidade})"
@@ -232,25 +258,33 @@ class EstoqueProduto(models.Model):
     @property
     def quantidade_formatada(self):
         """Retorna o estoque formatado como 'X Caixas e Y Carteiras'."""
-        upc = self.produto.unidades_por_caixa or 1
-        if upc <= 1:
-            return f"{self.quantidade} {self.produto.get_unidade_medida_display()}"
-        
-        caixas = self.quantidade // upc
-        restante = self.quantidade % upc
-        
-        partes = []
-        if caixas > 0:
-            partes.append(f"{caixas} cx")
-        if restante > 0 or caixas == 0:
-            partes.append(f"{restante} un")
-            
-        return " + ".join(partes)
+        return formatar_quantidade(self.quantidade, self.produto)
+
+    @staticmethod
+    def registrar_alteracoes_em_massa(lotes):
+        """
+        Efeitos que save()/signals teriam, para gravações feitas com update()
+        ou bulk_create: alertas, ofertas do marketplace, cache do PDV e do dashboard.
+        `lotes` é uma lista de (estoque, quantidade_anterior ou None se novo).
+        """
+        from farmacias import painel
+        from . import alertas, ofertas, pdv
+
+        alertas.agendar_lotes((estoque.pk, anterior) for estoque, anterior in lotes)
+        ofertas.agendar((estoque.produto_id, estoque.farmacia_id) for estoque, _ in lotes)
+        pdv.invalidar_farmacias(estoque.farmacia_id for estoque, _ in lotes)
+        painel.invalidar(estoque.farmacia_id for estoque, _ in lotes)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Quantidade lida do banco: base para os alertas (produtos.alertas) sem reler a linha
+        instance._quantidade_original = instance.__dict__.get('quantidade')
+        return instance
 
     def save(self, *args, **kwargs):
-        from farmacias.models import Notificacao
         from django.utils import timezone
-        import datetime
+        from . import alertas
         import uuid
 
         # Gerar lote automático se vazio
@@ -259,63 +293,78 @@ class EstoqueProduto(models.Model):
             unique_id = str(uuid.uuid4())[:4].upper()
             self.lote = f"AUTO-{hoje_str}-{unique_id}"
 
-        is_new = self.pk is None
-        old_qty = 0
-        if not is_new:
-            try:
-                old_qty = EstoqueProduto.objects.get(pk=self.pk).quantidade
-            except EstoqueProduto.DoesNotExist:
-                old_qty = 0
-            
+        quantidade_anterior = None if self._state.adding else getattr(self, '_quantidade_original', None)
+        if quantidade_anterior is None and not self._state.adding:
+            quantidade_anterior = self.quantidade  # Instância sem leitura prévia: sem cruzamento conhecido
+
         super().save(*args, **kwargs)
+        self._quantidade_original = self.quantidade
+
+        # Notificações de ruptura, estoque baixo e validade: avaliadas em lote depois do commit
+        alertas.agendar(self.pk, quantidade_anterior)
 
-        # 1. Notificação de Ruptura ou Estoque Baixo
-        if self.quantidade == 0:
-            Notificacao.objects.get_or_create(
-                farmacia=self.farmacia,
-                tipo='ESTOQUE',
-                titulo=f"RUPTURA: {self.produto.nome}",
-                defaults={
-                    'mensagem': f"O produto {self.produto.nome} (Lote: {self.lote}) esgotou completamente no estoque.",
-                    'lida': False
-                }
-            )
-        elif self.estoque_baixo and (is_new or old_qty > self.quantidade_minima):
-            Notificacao.objects.get_or_create(
-                farmacia=self.farmacia,
-                tipo='ESTOQUE',
-                titulo=f"Estoque Baixo: {self.produto.nome}",
-                defaults={
-                    'mensagem': f"O produto {self.produto.nome} (Lote: {self.lote}) atingiu o nível crítico ({self.quantidade} unidades).",
-                    'lida': False
-                }
-            )
-
-        # 2. Notificação de Validade (Verificação imediata ao salvar)
-        if self.data_validade:
-            hoje = timezone.now().date()
-            dias_para_vencer = (self.data_validade - hoje).days
-            
-            if dias_para_vencer < 0:
-                Notificacao.objects.get_or_create(
-                    farmacia=self.farmacia,
-                    tipo='EXPIRADO',
-                    titulo=f"PRODUTO EXPIRADO: {self.produto.nome}",
-                    defaults={
-                        'mensagem': f"O lote {self.lote} de {self.produto.nome} expirou em {self.data_validade}.",
-                        'lida': False
-                    }
-                )
-            elif dias_para_vencer <= 30:
-                Notificacao.objects.get_or_create(
-                    farmacia=self.farmacia,
-                    tipo='VALIDADE',
-                    titulo=f"Validade Próxima: {self.produto.nome}",
-                    defaults={
-                        'mensagem': f"O lote {self.lote} de {self.produto.nome} vence em {dias_para_vencer} dias ({self.data_validade}).",
-                        'lida': False
-                    }
-                )
+
+class OfertaProduto(models.Model):
+    """
+    Projeção desnormalizada do estoque vendável de um produto numa farmácia.
+    Mantida por produtos.ofertas; lida pelos endpoints públicos do marketplace.
+    """
+
+    produto = models.ForeignKey(
+        Produto,
+        on_delete=models.CASCADE,
+        related_name='ofertas',
+        verbose_name=_('produto')
+    )
+    farmacia = models.ForeignKey(
+        Farmacia,
+        on_delete=models.CASCADE,
+        related_name='ofertas',
+        verbose_name=_('farmácia')
+    )
+    # Lote mais barato (FEFO no empate): é o id usado pelo carrinho
+    estoque_referencia = models.ForeignKey(
+        EstoqueProduto,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        verbose_name=_('lote de referência')
+    )
+
+    quantidade_total = models.PositiveIntegerField(_('quantidade total'), default=0)
+    total_lotes = models.PositiveIntegerField(_('total de lotes'), default=0)
+    preco_final = models.DecimalField(_('preço final'), max_digits=10, decimal_places=2)
+    preco_venda = models.DecimalField(_('preço de venda'), max_digits=10, decimal_places=2)
+    preco_promocional = models.DecimalField(
+        _('preço promocional'),
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True
+    )
+    em_promocao = models.BooleanField(_('em promoção'), default=False)
+    data_validade_proxima = models.DateField(_('validade mais próxima'), null=True, blank=True)
+
+    data_atualizacao = models.DateTimeField(_('data de atualização'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('oferta de produto')
+        verbose_name_plural = _('ofertas de produtos')
+        unique_together = ['produto', 'farmacia']
+        indexes = [
+            models.Index(fields=['produto', 'preco_final'], name='oferta_produto_preco_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.produto_id} @ {self.farmacia_id}: {self.preco_final} ({self.quantidade_total})"
+
+    @property
+    def is_disponivel(self):
+        return self.quantidade_total > 0
+
+    @property
+    def quantidade_formatada(self):
+        return formatar_quantidade(self.quantidade_total, self.produto)
 
 
 class MovimentacaoEstoque(models.Model):
@@ -366,6 +415,11 @@ class MovimentacaoEstoque(models.Model):
         verbose_name = _('movimentação de estoque')
         verbose_name_plural = _('movimentações de estoque')
         ordering = ['-data_movimentacao']
+        indexes = [
+            # Paginação por cursor do kardex (config.pagination)
+            models.Index(fields=['data_movimentacao', 'id'], name='movimentacao_keyset_idx'),
+            models.Index(fields=['estoque', 'data_movimentacao'], name='movimentacao_estoque_data_idx'),
+        ]
     
 
 class EntradaEstoque(models.Model):
@@ -446,3 +500,121 @@ class ItemEntrada(models.Model):
     @property
     def subtotal(self):
         return self.quantidade * self.preco_custo_unitario
+
+
+class Inventario(models.Model):
+    """Sessão de contagem física do estoque (inventário). Aplicada de uma vez em produtos.inventario."""
+
+    class StatusInventario(models.TextChoices):
+        ABERTO = 'ABERTO', _('Em contagem')
+        APLICADO = 'APLICADO', _('Aplicado')
+        CANCELADO = 'CANCELADO', _('Cancelado')
+
+    farmacia = models.ForeignKey(
+        Farmacia,
+        on_delete=models.CASCADE,
+        related_name='inventarios',
+        verbose_name=_('farmácia')
+    )
+    descricao = models.CharField(_('descrição'), max_length=200, blank=True)
+    status = models.CharField(
+        _('status'),
+        max_length=10,
+        choices=StatusInventario.choices,
+        default=StatusInventario.ABERTO
+    )
+
+    criado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='inventarios_criados'
+    )
+    aplicado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='inventarios_aplicados'
+    )
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    data_aplicacao = models.DateTimeField(_('data de aplicação'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('inventário')
+        verbose_name_plural = _('inventários')
+        ordering = ['-data_criacao']
+
+    def __str__(self):
+        return f"Inventário #{self.id} - {self.farmacia} ({self.get_status_display()})"
+
+
+class ContagemInventario(models.Model):
+    """Quantidade contada de um lote numa sessão de inventário."""
+
+    inventario = models.ForeignKey(
+        Inventario,
+        on_delete=models.CASCADE,
+        related_name='contagens'
+    )
+    estoque = models.ForeignKey(
+        EstoqueProduto,
+        on_delete=models.CASCADE,
+        related_name='contagens_inventario',
+        verbose_name=_('estoque')
+    )
+    quantidade_contada = models.PositiveIntegerField(_('quantidade contada'))
+    motivo = models.CharField(_('motivo da divergência'), max_length=100, blank=True)
+
+    # Preenchidos ao aplicar (histórico do que foi ajustado)
+    quantidade_sistema = models.PositiveIntegerField(_('quantidade no sistema'), null=True, blank=True)
+
+    contado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='contagens_inventario'
+    )
+    data_contagem = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('contagem de inventário')
+        verbose_name_plural = _('contagens de inventário')
+        unique_together = ['inventario', 'estoque']
+
+    def __str__(self):
+        return f"{self.estoque} - contado: {self.quantidade_contada}"
+
+
+class SaldoEstoque(models.Model):
+    """
+    Fotografia do saldo de um lote no fecho de um dia (quantidade e custo).
+    Gerada por produtos.saldos; serve de ponto de partida para consultas de
+    saldo numa data passada (saldo do fecho + movimentações posteriores).
+    """
+
+    estoque = models.ForeignKey(
+        EstoqueProduto,
+        on_delete=models.CASCADE,
+        related_name='saldos',
+        verbose_name=_('estoque')
+    )
+    # Desnormalizados para as consultas por farmácia/produto sem JOIN
+    farmacia = models.ForeignKey(Farmacia, on_delete=models.CASCADE, related_name='saldos_estoque')
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='saldos_estoque')
+
+    data = models.DateField(_('data do fecho'))
+    quantidade = models.PositiveIntegerField(_('quantidade'))
+    custo_unitario = models.DecimalField(_('custo unitário'), max_digits=10, decimal_places=2)
+    fecho_mes = models.BooleanField(_('fecho de mês'), default=False)
+
+    class Meta:
+        verbose_name = _('saldo de estoque')
+        verbose_name_plural = _('saldos de estoque')
+        unique_together = ['estoque', 'data']
+        indexes = [
+            models.Index(fields=['farmacia', 'data'], name='saldo_farmacia_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.estoque_id} em {self.data}: {self.quantidade}"
@@ -0,0 +1,131 @@
+"""
+Manutenção da projeção OfertaProduto (produto x farmácia).
+
+Cada oferta resume os lotes vendáveis (quantidade > 0 e disponíveis) de um
+produto numa farmácia: quantidade total, melhor preço final, validade mais
+próxima e o lote de referência (o mais barato, FEFO no empate), cujo id é o
+que o carrinho usa.
+
+As gravações de EstoqueProduto agendam os pares afetados (signals em
+produtos.signals) e a projeção é recalculada uma vez por transação.
+Operações em massa (`queryset.update`, `bulk_create`) não disparam signals:
+quem as usa deve chamar `agendar()` com os pares tocados.
+"""
+from collections import defaultdict
+
+from django.db.models import Case, F, Q, When
+
+from .transacao import agendar_pos_commit
+
+TAMANHO_LOTE = 1000
+
+
+def preco_final_expr(prefixo=''):
+    """Expressão SQL equivalente a EstoqueProduto.preco_final."""
+    return Case(
+        When(**{
+            f'{prefixo}em_promocao': True,
+            f'{prefixo}preco_promocional__gt': 0,
+            'then': F(f'{prefixo}preco_promocional'),
+        }),
+        default=F(f'{prefixo}preco_venda'),
+    )
+
+
+def agendar(pares):
+    """Agenda o recálculo dos pares (produto_id, farmacia_id) para depois do commit."""
+    agendar_pos_commit('produtos.ofertas', pares, atualizar)
+
+
+def atualizar(pares):
+    """Recalcula imediatamente as ofertas dos pares (produto_id, farmacia_id) indicados."""
+    from .models import EstoqueProduto, OfertaProduto
+
+    pares = list(pares)
+    for i in range(0, len(pares), TAMANHO_LOTE):
+        bloco = pares[i:i + TAMANHO_LOTE]
+        por_farmacia = defaultdict(set)
+        for produto_id, farmacia_id in bloco:
+            por_farmacia[farmacia_id].add(produto_id)
+        # Um termo por farmácia (e não um OR por par): planos estáveis em blocos grandes
+        filtro = Q()
+        for farmacia_id, produto_ids in por_farmacia.items():
+            filtro |= Q(farmacia_id=farmacia_id, produto_id__in=produto_ids)
+        _sincronizar(EstoqueProduto, OfertaProduto, EstoqueProduto.objects.filter(filtro), bloco)
+
+
+def reconstruir(EstoqueProduto=None, OfertaProduto=None):
+    """Reconstrói toda a projeção a partir do estoque (também usado pela migração)."""
+    if EstoqueProduto is None or OfertaProduto is None:
+        from .models import EstoqueProduto, OfertaProduto
+
+    OfertaProduto.objects.all().delete()
+    _sincronizar(EstoqueProduto, OfertaProduto, EstoqueProduto.objects.all(), pares=None)
+
+
+def _sincronizar(EstoqueProduto, OfertaProduto, estoques, pares):
+    """
+    Agrega os lotes vendáveis de `estoques` por (produto, farmácia) e grava as ofertas.
+    Se `pares` for dado, os pares sem lote vendável têm a oferta removida.
+    """
+    lotes = estoques.filter(quantidade__gt=0, is_disponivel=True).annotate(
+        preco_final_db=preco_final_expr()
+    ).order_by('farmacia_id', 'produto_id', 'preco_final_db', F('data_validade').asc(nulls_last=True), 'id').values_list(
+        'id', 'produto_id', 'farmacia_id', 'quantidade', 'preco_final_db',
+        'preco_venda', 'preco_promocional', 'em_promocao', 'data_validade'
+    )
+
+    ofertas = []
+    vistos = set()
+    atual = None
+    for (estoque_id, produto_id, farmacia_id, quantidade, preco_final,
+         preco_venda, preco_promocional, em_promocao, validade) in lotes.iterator(chunk_size=2000):
+        if atual is None or (atual.produto_id, atual.farmacia_id) != (produto_id, farmacia_id):
+            # Primeiro lote do par = o mais barato (ordenação acima)
+            atual = OfertaProduto(
+                produto_id=produto_id,
+                farmacia_id=farmacia_id,
+                estoque_referencia_id=estoque_id,
+                quantidade_total=0,
+                total_lotes=0,
+                preco_final=preco_final,
+                preco_venda=preco_venda,
+                preco_promocional=preco_promocional,
+                em_promocao=em_promocao,
+                data_validade_proxima=validade,
+            )
+            ofertas.append(atual)
+            vistos.add((produto_id, farmacia_id))
+        atual.quantidade_total += quantidade
+        atual.total_lotes += 1
+        if validade and (atual.data_validade_proxima is None or validade < atual.data_validade_proxima):
+            atual.data_validade_proxima = validade
+
+        if len(ofertas) > TAMANHO_LOTE:
+            _gravar(OfertaProduto, ofertas[:-1])
+            ofertas = ofertas[-1:]
+
+    _gravar(OfertaProduto, ofertas)
+
+    if pares is not None:
+        remover = Q()
+        for produto_id, farmacia_id in set(pares) - vistos:
+            remover |= Q(produto_id=produto_id, farmacia_id=farmacia_id)
+        if remover:
+            OfertaProduto.objects.filter(remover).delete()
+
+
+def _gravar(OfertaProduto, ofertas):
+    if not ofertas:
+        return
+    OfertaProduto.objects.bulk_create(
+        ofertas,
+        update_conflicts=True,
+        unique_fields=['produto', 'farmacia'],
+        update_fields=[
+            'estoque_referencia', 'quantidade_total', 'total_lotes', 'preco_final',
+            'preco_venda', 'preco_promocional', 'em_promocao',
+            'data_validade_proxima', 'data_atualizacao',
+        ],
+        batch_size=TAMANHO_LOTE,
+    )
@@ -0,0 +1,106 @@
+"""
+Leitura de código de barras no PDV (balcão).
+
+`escanear(farmacia_id, codigo)` devolve o produto e os lotes vendáveis da
+farmácia em ordem FEFO. A busca é por igualdade em `Produto.codigo_barras`
+(índice único) e o resultado fica em cache por farmácia.
+
+Invalidação por versão: cada farmácia tem um contador em cache que entra na
+chave das leituras; gravações de EstoqueProduto incrementam o contador da
+farmácia (uma vez por transação) e gravações de Produto o do catálogo.
+"""
+from django.core.cache import cache
+from django.utils import timezone
+
+from .transacao import agendar_pos_commit
+
+TIMEOUT = 60 * 10
+_VERSAO_CATALOGO = 'pdv:versao:catalogo'
+
+
+def _chave_versao(farmacia_id):
+    return f'pdv:versao:{farmacia_id}'
+
+
+def _versao(chave):
+    return cache.get_or_set(chave, 1, None)
+
+
+def _incrementar(chave):
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.set(chave, 2, None)
+
+
+def invalidar_farmacias(farmacia_ids):
+    """Agenda a invalidação do cache das farmácias para depois do commit."""
+    agendar_pos_commit('produtos.pdv', farmacia_ids, _invalidar)
+
+
+def _invalidar(farmacia_ids):
+    for farmacia_id in farmacia_ids:
+        _incrementar(_chave_versao(farmacia_id))
+
+
+def invalidar_catalogo():
+    """Invalida as leituras de todas as farmácias (dados do produto mudaram)."""
+    _incrementar(_VERSAO_CATALOGO)
+
+
+def escanear(farmacia_id, codigo):
+    """
+    Retorna {'produto': {...}, 'lotes': [...]} ou None se o código não existir.
+    Lotes vencidos, indisponíveis ou sem quantidade não são vendáveis.
+    """
+    hoje = timezone.localdate()
+    chave = 'pdv:{}:{}:{}:{}:{}'.format(
+        farmacia_id, _versao(_chave_versao(farmacia_id)), _versao(_VERSAO_CATALOGO),
+        hoje.isoformat(), codigo
+    )
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = _consultar(farmacia_id, codigo, hoje) or {}
+        cache.set(chave, resultado, TIMEOUT)
+    return resultado or None
+
+
+def _consultar(farmacia_id, codigo, hoje):
+    from django.db.models import F, Q
+    from .models import Produto, EstoqueProduto
+    from .serializers import EstoqueGestaoSerializer
+
+    produto = Produto.objects.filter(codigo_barras=codigo).first()
+    if produto is None:
+        return None
+
+    lotes = EstoqueProduto.objects.filter(
+        farmacia_id=farmacia_id,
+        produto=produto,
+        quantidade__gt=0,
+        is_disponivel=True,
+    ).filter(
+        Q(data_validade__isnull=True) | Q(data_validade__gte=hoje)
+    ).order_by(F('data_validade').asc(nulls_last=True), 'id')
+
+    # Os lotes partilham o mesmo produto: evita o join e uma query por linha
+    lotes = list(lotes)
+    for lote in lotes:
+        lote.produto = produto
+
+    return {
+        'produto': {
+            'id': produto.id,
+            'nome': produto.nome,
+            'codigo_barras': produto.codigo_barras,
+            'unidades_por_caixa': produto.unidades_por_caixa,
+            'permite_venda_avulsa': produto.permite_venda_avulsa,
+            'requer_receita': produto.requer_receita,
+            'is_isento_iva': produto.is_isento_iva,
+            'taxa_iva': str(produto.taxa_iva),
+        },
+        'lotes': [
+            dict(dados, preco_final=str(lote.preco_final))
+            for lote, dados in zip(lotes, EstoqueGestaoSerializer(lotes, many=True).data)
+        ],
+    }
@@ -0,0 +1,165 @@
+"""
+Saldos de estoque numa data passada (fechos diários/mensais).
+
+`gerar(data)` grava, para cada lote com saldo, a quantidade e o custo no fim
+do dia `data` (SaldoEstoque). Pode correr depois da meia-noite ou para datas
+anteriores: o saldo do fecho é a quantidade atual menos o efeito das
+movimentações posteriores ao fim desse dia.
+
+`saldos_em(farmacia, data)` parte do último fecho até `data` e soma o
+efeito (quantidade_nova - quantidade_anterior) das movimentações entre o
+fecho e o fim de `data`: uma leitura de fecho e uma agregação do kardex,
+em vez de percorrer o kardex inteiro a partir do saldo atual.
+
+Lotes sem fecho contam como saldo zero nessa data. O custo é o do fecho
+(ou o custo atual, para lotes que entraram depois dele). Para datas
+anteriores ao primeiro fecho, parte-se do saldo atual e desfazem-se as
+movimentações posteriores (o caminho lento, como antes dos fechos).
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+TAMANHO_LOTE = 5000
+
+
+def fim_do_dia(data):
+    return timezone.make_aware(datetime.datetime.combine(data + datetime.timedelta(days=1), datetime.time.min))
+
+
+def _efeito_movimentacoes(inicio, fim, **filtros):
+    """{estoque_id: soma de (quantidade_nova - quantidade_anterior)} no intervalo [inicio, fim)."""
+    from .models import MovimentacaoEstoque
+
+    movimentos = MovimentacaoEstoque.objects.filter(**filtros)
+    if inicio is not None:
+        movimentos = movimentos.filter(data_movimentacao__gte=inicio)
+    if fim is not None:
+        movimentos = movimentos.filter(data_movimentacao__lt=fim)
+    return dict(movimentos.order_by().values('estoque_id').annotate(
+        efeito=Sum(F('quantidade_nova') - F('quantidade_anterior'))
+    ).values_list('estoque_id', 'efeito'))
+
+
+def gerar(data, farmacia_ids=None):
+    """Grava (ou regrava) os saldos de fecho do dia `data`. Retorna quantos lotes foram gravados."""
+    from .models import EstoqueProduto, SaldoEstoque
+
+    fim = fim_do_dia(data)
+    fecho_mes = (data + datetime.timedelta(days=1)).day == 1
+    filtro_farmacia = {'farmacia_id__in': farmacia_ids} if farmacia_ids is not None else {}
+
+    posteriores = _efeito_movimentacoes(
+        fim, None, **({'estoque__farmacia_id__in': farmacia_ids} if farmacia_ids is not None else {})
+    )
+    lotes = EstoqueProduto.objects.filter(data_criacao__lt=fim, **filtro_farmacia).order_by('id').values_list(
+        'id', 'farmacia_id', 'produto_id', 'quantidade', 'preco_custo'
+    )
+
+    gravados = 0
+    with transaction.atomic():
+        SaldoEstoque.objects.filter(data=data, **filtro_farmacia).delete()
+        bloco = []
+        for estoque_id, farmacia_id, produto_id, quantidade, custo in lotes.iterator(chunk_size=TAMANHO_LOTE):
+            quantidade -= posteriores.get(estoque_id, 0)
+            if quantidade <= 0:
+                continue
+            bloco.append(SaldoEstoque(
+                estoque_id=estoque_id, farmacia_id=farmacia_id, produto_id=produto_id,
+                data=data, quantidade=quantidade, custo_unitario=custo, fecho_mes=fecho_mes
+            ))
+            if len(bloco) >= TAMANHO_LOTE:
+                SaldoEstoque.objects.bulk_create(bloco)
+                gravados += len(bloco)
+                bloco = []
+        SaldoEstoque.objects.bulk_create(bloco)
+        gravados += len(bloco)
+    return gravados
+
+
+def limpar(reter_dias):
+    """Remove fechos diários antigos; os fechos de mês ficam sempre."""
+    from .models import SaldoEstoque
+
+    limite = timezone.now().date() - datetime.timedelta(days=reter_dias)
+    apagados, _ = SaldoEstoque.objects.filter(data__lt=limite, fecho_mes=False).delete()
+    return apagados
+
+
+def saldos_em(farmacia_id, data, produto_id=None):
+    """
+    Saldo de cada lote da farmácia no fim do dia `data`.
+    Retorna (data do fecho usado ou None, {estoque_id: {'produto_id', 'quantidade', 'custo_unitario'}}).
+    """
+    from .models import EstoqueProduto, SaldoEstoque
+
+    fechos = SaldoEstoque.objects.filter(farmacia_id=farmacia_id, data__lte=data)
+    movimentos = {'estoque__farmacia_id': farmacia_id}
+    if produto_id is not None:
+        fechos = fechos.filter(produto_id=produto_id)
+        movimentos['estoque__produto_id'] = produto_id
+    base = SaldoEstoque.objects.filter(farmacia_id=farmacia_id, data__lte=data).aggregate(base=Max('data'))['base']
+
+    if base is None:
+        # Data anterior ao primeiro fecho: parte do saldo atual e desfaz o que veio depois
+        lotes = EstoqueProduto.objects.filter(farmacia_id=farmacia_id, data_criacao__lt=fim_do_dia(data))
+        if produto_id is not None:
+            lotes = lotes.filter(produto_id=produto_id)
+        saldos = {
+            estoque_id: {'produto_id': produto, 'quantidade': quantidade, 'custo_unitario': custo}
+            for estoque_id, produto, quantidade, custo in lotes.values_list('id', 'produto_id', 'quantidade', 'preco_custo')
+        }
+        for estoque_id, efeito in _efeito_movimentacoes(fim_do_dia(data), None, **movimentos).items():
+            if estoque_id in saldos:
+                saldos[estoque_id]['quantidade'] -= efeito
+        return None, {estoque_id: s for estoque_id, s in saldos.items() if s['quantidade'] > 0}
+
+    saldos = {}
+    for estoque_id, produto, quantidade, custo in fechos.filter(data=base).values_list(
+        'estoque_id', 'produto_id', 'quantidade', 'custo_unitario'
+    ):
+        saldos[estoque_id] = {'produto_id': produto, 'quantidade': quantidade, 'custo_unitario': custo}
+
+    efeitos = _efeito_movimentacoes(fim_do_dia(base), fim_do_dia(data), **movimentos)
+
+    # Lotes que só aparecem nas movimentações posteriores ao fecho: custo atual
+    novos = set(efeitos) - set(saldos)
+    for estoque_id, produto, custo in EstoqueProduto.objects.filter(pk__in=novos).values_list(
+        'id', 'produto_id', 'preco_custo'
+    ):
+        saldos[estoque_id] = {'produto_id': produto, 'quantidade': 0, 'custo_unitario': custo}
+
+    for estoque_id, efeito in efeitos.items():
+        if estoque_id in saldos:
+            saldos[estoque_id]['quantidade'] += efeito
+    return base, {estoque_id: s for estoque_id, s in saldos.items() if s['quantidade'] > 0}
+
+
+def valorizacao(farmacia_id, data, produto_id=None):
+    """Valorização do estoque (quantidade x custo) no fim de `data`, por produto."""
+    from .models import Produto
+
+    base, saldos = saldos_em(farmacia_id, data, produto_id)
+    por_produto = defaultdict(lambda: {'quantidade': 0, 'valor': Decimal('0'), 'lotes': 0})
+    for saldo in saldos.values():
+        linha = por_produto[saldo['produto_id']]
+        linha['quantidade'] += saldo['quantidade']
+        linha['valor'] += saldo['quantidade'] * saldo['custo_unitario']
+        linha['lotes'] += 1
+
+    nomes = dict(Produto.objects.filter(pk__in=list(por_produto)).values_list('id', 'nome'))
+    produtos = sorted(
+        ({'produto_id': pid, 'produto_nome': nomes.get(pid, ''), **linha} for pid, linha in por_produto.items()),
+        key=lambda linha: linha['produto_nome']
+    )
+    return {
+        'data': data,
+        'fecho_base': base,
+        'total_quantidade': sum(linha['quantidade'] for linha in produtos),
+        'valor_total': sum((linha['valor'] for linha in produtos), Decimal('0')),
+        'produtos': produtos,
+    }
@@ -0,0 +1,159 @@
+"""
+Motor de busca textual do catálogo de produtos.
+
+Em PostgreSQL cada Produto mantém um `search_vector` (tsvector com pesos)
+indexado por GIN, complementado por um índice de trigramas em `nome` e
+`nome_generico` para tolerar erros de digitação.
+Em SQLite (desenvolvimento) o mesmo papel é feito por uma tabela virtual FTS5.
+
+A relevância dá mais peso ao nome comercial, depois ao nome genérico e
+por último à descrição.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, F, FloatField, Value, When
+
+TABELA_FTS = 'produtos_produto_fts'
+
+# Campos indexados (em ordem de peso) e seus pesos
+CAMPOS_BUSCA = ('nome', 'nome_generico', 'fabricante', 'descricao')
+PESOS_POSTGRES = {'nome': 'A', 'nome_generico': 'B', 'fabricante': 'C', 'descricao': 'D'}
+PESOS_FTS5 = (10.0, 6.0, 2.0, 1.0)
+
+# Teto de candidatos trazidos do índice FTS5 (apenas SQLite)
+LIMITE_CANDIDATOS = 500
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def tokenizar(termo):
+    """Quebra o termo em palavras limpas (sem operadores de busca)."""
+    return _TOKEN_RE.findall(termo or '')
+
+
+def vetor_busca():
+    """Expressão SearchVector com pesos usada para manter `Produto.search_vector`."""
+    from django.contrib.postgres.search import SearchVector
+
+    vetor = None
+    for campo in CAMPOS_BUSCA:
+        config = 'portuguese' if campo == 'descricao' else 'simple'
+        parte = SearchVector(campo, weight=PESOS_POSTGRES[campo], config=config)
+        vetor = parte if vetor is None else vetor + parte
+    return vetor
+
+
+def _query_postgres(tokens):
+    from django.contrib.postgres.search import SearchQuery
+
+    # Busca por prefixo em cada palavra para funcionar durante a digitação
+    expressao = ' & '.join(f"{t}:*" for t in tokens)
+    return SearchQuery(expressao, search_type='raw', config='simple')
+
+
+def _query_fts5(tokens):
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+
+# --- Indexação ---
+
+def indexar_produtos(ids=None):
+    """
+    (Re)indexa os produtos indicados (ou todo o catálogo se `ids` for None).
+    """
+    from .models import Produto
+
+    if is_postgres():
+        qs = Produto.objects.all()
+        if ids is not None:
+            qs = qs.filter(pk__in=ids)
+        qs.update(search_vector=vetor_busca())
+        return
+
+    colunas = ', '.join(CAMPOS_BUSCA)
+    selecao = ', '.join(f"COALESCE({c}, '')" for c in CAMPOS_BUSCA)
+    with connection.cursor() as cursor:
+        if ids is None:
+            cursor.execute(f"DELETE FROM {TABELA_FTS}")
+            cursor.execute(
+                f"INSERT INTO {TABELA_FTS} (rowid, {colunas}) "
+                f"SELECT id, {selecao} FROM produtos_produto"
+            )
+            return
+        ids = list(ids)
+        if not ids:
+            return
+        marcadores = ', '.join(['%s'] * len(ids))
+        cursor.execute(f"DELETE FROM {TABELA_FTS} WHERE rowid IN ({marcadores})", ids)
+        cursor.execute(
+            f"INSERT INTO {TABELA_FTS} (rowid, {colunas}) "
+            f"SELECT id, {selecao} FROM produtos_produto WHERE id IN ({marcadores})",
+            ids
+        )
+
+
+def remover_do_indice(produto_id):
+    """Remove um produto apagado do índice FTS5 (no Postgres a coluna some com a linha)."""
+    if is_postgres():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABELA_FTS} WHERE rowid = %s", [produto_id])
+
+
+# --- Consulta ---
+
+def filtrar_por_termo(queryset, termo, prefixo='produto__'):
+    """
+    Filtra `queryset` pelos produtos que casam com `termo` e anota `relevancia`
+    (maior = mais relevante).
+
+    `prefixo` é o caminho até ao Produto a partir do modelo do queryset
+    ('produto__' para EstoqueProduto, '' para o próprio Produto).
+    """
+    tokens = tokenizar(termo)
+    if not tokens:
+        return queryset.annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+    if is_postgres():
+        from django.db.models import Q
+        from django.contrib.postgres.search import SearchRank, TrigramSimilarity
+
+        query = _query_postgres(tokens)
+        termo_limpo = ' '.join(tokens)
+        return queryset.filter(
+            Q(**{f'{prefixo}search_vector': query}) |
+            Q(**{f'{prefixo}nome__trigram_similar': termo_limpo}) |
+            Q(**{f'{prefixo}nome_generico__trigram_similar': termo_limpo})
+        ).annotate(
+            relevancia=SearchRank(F(f'{prefixo}search_vector'), query) +
+            TrigramSimilarity(f'{prefixo}nome', termo_limpo)
+        )
+
+    ranking = _ranking_fts5(tokens)
+    campo_id = f'{prefixo}id' if prefixo else 'id'
+    if not ranking:
+        return queryset.none().annotate(relevancia=Value(0.0, output_field=FloatField()))
+    return queryset.filter(**{f'{campo_id}__in': list(ranking)}).annotate(
+        relevancia=Case(
+            *[When(**{campo_id: pid}, then=Value(score)) for pid, score in ranking.items()],
+            default=Value(0.0),
+            output_field=FloatField()
+        )
+    )
+
+
+def _ranking_fts5(tokens):
+    """Retorna {produto_id: score} dos melhores candidatos no índice FTS5."""
+    pesos = ', '.join(str(p) for p in PESOS_FTS5)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, -bm25({TABELA_FTS}, {pesos}) AS score FROM {TABELA_FTS} "
+            f"WHERE {TABELA_FTS} MATCH %s ORDER BY score DESC LIMIT %s",
+            [_query_fts5(tokens), LIMITE_CANDIDATOS]
+        )
+        return {row[0]: float(row[1]) for row in cursor.fetchall()}
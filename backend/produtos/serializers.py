@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import CategoriaProduto, Produto, EstoqueProduto, MovimentacaoEstoque
+from .models import CategoriaProduto, Produto, EstoqueProduto, MovimentacaoEstoque, OfertaProduto, Inventario
 from farmacias.models import Farmacia
 
 class CategoriaProdutoSerializer(serializers.ModelSerializer):
@@ -28,21 +28,30 @@ class ProdutoSerializer(serializers.ModelSerializer):
 
 
 class EstoqueFarmaciaSerializer(serializers.ModelSerializer):
-    """Serializer de estoque com dados da farmácia (para o cliente ver quem tem o produto)."""
+    """
+    Oferta de um produto por farmácia (para o cliente ver quem tem o produto).
+    `id` é o lote de referência (mais barato), usado pelo carrinho.
+    """
+    id = serializers.IntegerField(source='estoque_referencia_id', read_only=True)
+    oferta_id = serializers.IntegerField(source='id', read_only=True)
     farmacia_id = serializers.IntegerField(source='farmacia.id', read_only=True)
     farmacia_nome = serializers.CharField(source='farmacia.nome', read_only=True)
     farmacia_latitude = serializers.FloatField(source='farmacia.latitude', read_only=True)
     farmacia_longitude = serializers.FloatField(source='farmacia.longitude', read_only=True)
+    distancia = serializers.FloatField(read_only=True, required=False) # Anotada por farmacias.geo
     preco_final = serializers.FloatField(read_only=True)
+    quantidade = serializers.IntegerField(source='quantidade_total', read_only=True)
+    data_validade = serializers.DateField(source='data_validade_proxima', read_only=True)
     
     class Meta:
-        model = EstoqueProduto
+        model = OfertaProduto
         fields = (
-            'id', 'farmacia_id', 'farmacia_nome', 
-            'farmacia_latitude', 'farmacia_longitude',
+            'id', 'oferta_id', 'farmacia_id', 'farmacia_nome', 
+            'farmacia_latitude', 'farmacia_longitude', 'distancia',
             'preco_venda', 'preco_promocional', 
             'em_promocao', 'preco_final',
-            'quantidade', 'quantidade_formatada', 'is_disponivel', 'data_validade'
+            'quantidade', 'quantidade_formatada', 'total_lotes',
+            'is_disponivel', 'data_validade'
         )
 
 
@@ -80,7 +89,10 @@ class BuscaGlobalSerializer(serializers.ModelSerializer):
     """
     Serializer otimizado para a busca global.
     Retorna dados do produto e da oferta (preço/farmácia) em um único objeto.
+    `id` é o lote de referência da oferta, usado pelo carrinho.
     """
+    id = serializers.IntegerField(source='estoque_referencia_id', read_only=True)
+    oferta_id = serializers.IntegerField(source='id', read_only=True)
     produto_nome = serializers.CharField(source='produto.nome', read_only=True)
     produto_descricao = serializers.CharField(source='produto.descricao', read_only=True)
     produto_imagem = serializers.ImageField(source='produto.imagem_principal', read_only=True)
@@ -93,40 +105,54 @@ class BuscaGlobalSerializer(serializers.ModelSerializer):
     farmacia_bairro = serializers.CharField(source='farmacia.bairro', read_only=True)
     farmacia_logo = serializers.ImageField(source='farmacia.logotipo', read_only=True)
     farmacia_recomendada = serializers.SerializerMethodField()
+    distancia = serializers.FloatField(read_only=True, required=False) # Anotada por farmacias.geo
     
     preco_final = serializers.FloatField(read_only=True)
+    quantidade = serializers.IntegerField(source='quantidade_total', read_only=True)
     
     def get_farmacia_recomendada(self, obj):
-        """Verifica se a farmácia tem prioridade ativa."""
-        from prioridade.models import AssinaturaPrioridade
-        from django.utils import timezone
-        
-        return AssinaturaPrioridade.objects.filter(
-            farmacia=obj.farmacia,
-            status='ATIVA',
-            data_fim__gte=timezone.now()
-        ).exists()
+        """Verifica se a farmácia tem prioridade ativa (conjunto em cache, sem query por linha)."""
+        prioritarias = self.context.get('farmacias_prioritarias')
+        if prioritarias is None:
+            from prioridade.cache import farmacias_prioritarias
+            prioritarias = farmacias_prioritarias()
+        return obj.farmacia_id in prioritarias
 
     class Meta:
-        model = EstoqueProduto
+        model = OfertaProduto
         fields = (
-            'id', 'produto_id', 'produto_nome', 'produto_descricao', 
+            'id', 'oferta_id', 'produto_id', 'produto_nome', 'produto_descricao', 
             'produto_imagem', 'produto_categoria', 'produto_fabricante',
             'produto_concentracao',
             'farmacia_id', 'farmacia_nome', 'farmacia_endereco', 
-            'farmacia_bairro', 'farmacia_logo', 'farmacia_recomendada',
+            'farmacia_bairro', 'farmacia_logo', 'farmacia_recomendada', 'distancia',
             'preco_venda', 'preco_promocional', 'em_promocao', 'preco_final',
-            'quantidade', 'is_disponivel'
+            'quantidade', 'total_lotes', 'data_validade_proxima', 'is_disponivel'
         )
 
 # --- Entrada de Estoque ---
 from .models import EntradaEstoque, ItemEntrada
 from financeiro.models import Despesa, CategoriaDespesa
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 
 from django.utils import timezone
 
+class ProdutoPreCarregadoField(serializers.PrimaryKeyRelatedField):
+    """Usa os produtos carregados de uma vez pelo serializer pai (context['produtos']), se houver."""
+
+    def to_internal_value(self, data):
+        produtos = self.context.get('produtos')
+        if produtos is not None:
+            try:
+                return produtos[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
 class ItemEntradaSerializer(serializers.ModelSerializer):
+    produto = ProdutoPreCarregadoField(queryset=Produto.objects.all())
     produto_nome = serializers.CharField(source='produto.nome', read_only=True)
     
     class Meta:
@@ -148,6 +174,19 @@ class EntradaEstoqueSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('farmacia', 'processada', 'financeiro_gerado', 'criado_por')
 
+    def to_internal_value(self, data):
+        # Todos os produtos da nota numa query (a validação de cada item usa este cache)
+        itens = data.get('itens') if hasattr(data, 'get') else None
+        if isinstance(itens, list):
+            ids = set()
+            for item in itens:
+                try:
+                    ids.add(int(item.get('produto')))
+                except (AttributeError, TypeError, ValueError):
+                    continue
+            self.context['produtos'] = Produto.objects.in_bulk(ids)
+        return super().to_internal_value(data)
+
     @transaction.atomic
     def create(self, validated_data):
         itens_data = validated_data.pop('itens')
@@ -159,72 +198,99 @@ class EntradaEstoqueSerializer(serializers.ModelSerializer):
         validated_data['criado_por'] = request.user
         validated_data['processada'] = True # Processamos imediatamente
         validated_data['financeiro_gerado'] = True
+        # O default do modelo (timezone.now) é um datetime num DateField
+        validated_data.setdefault('data_entrada', timezone.localdate())
         
         entrada = EntradaEstoque.objects.create(**validated_data)
         
-        total_entrada = 0
         import uuid
-        
+        from decimal import Decimal
+
+        # Geração Automática de Lote (Sistema)
+        # Formato: L-AAMMDD-4CHARS (Ex: L-260125-A1B2)
+        data_str = timezone.now().strftime('%y%m%d')
+        itens = []
         for item_data in itens_data:
-            # Geração Automática de Lote (Sistema)
-            # Formato: L-AAMMDD-4CHARS (Ex: L-260125-A1B2)
-            suffix = str(uuid.uuid4())[:4].upper()
-            data_str = timezone.now().strftime('%y%m%d')
-            lote_gerado = f"L-{data_str}-{suffix}"
-            
-            # Forçar o lote gerado
-            item_data['lote'] = lote_gerado
-            
-            item = ItemEntrada.objects.create(entrada=entrada, **item_data)
-            total_entrada += (item.quantidade * item.preco_custo_unitario)
-            
-            # 1. Calcular quantidade real de entrada (converter caixas para unidades se necessário)
-            # Verifica se a entrada foi informada como UNIDADE ou CAIXA
-            tipo_u = item_data.get('tipo_unidade', 'CAIXA')
-            if tipo_u == 'CAIXA':
+            item_data['lote'] = f"L-{data_str}-{str(uuid.uuid4())[:4].upper()}"
+            itens.append(ItemEntrada(entrada=entrada, **item_data))
+        total_entrada = sum((item.quantidade * item.preco_custo_unitario for item in itens), Decimal('0'))
+
+        # 1. Lotes já existentes (mesmo produto e lote) numa query, bloqueados
+        lotes = {}
+        for estoque in EstoqueProduto.objects.select_for_update().filter(
+            farmacia=farmacia,
+            produto_id__in={item.produto_id for item in itens},
+            lote__in={item.lote for item in itens}
+        ).order_by('id'):
+            lotes.setdefault((estoque.produto_id, estoque.lote), estoque)
+        anteriores = {estoque.id: estoque.quantidade for estoque in lotes.values()}
+
+        # 2. Quantidades e custo médio ponderado em memória (linha a linha, como no kardex)
+        agora = timezone.now()
+        novos = {}
+        saldos = []  # (item, estoque, qtd_unidades_entrada, quantidade_anterior)
+        for item in itens:
+            # Calcular quantidade real de entrada (converter caixas para unidades se necessário)
+            if item.tipo_unidade == 'CAIXA':
                 qtd_unidades_entrada = item.quantidade * item.produto.unidades_por_caixa
             else:
                 qtd_unidades_entrada = item.quantidade # Já é a unidade final (carteira)
-            
-            estoque, created = EstoqueProduto.objects.get_or_create(
-                farmacia=farmacia,
-                produto=item.produto,
-                lote=item.lote,
-                defaults={
-                    'preco_custo': item.preco_custo_unitario,
-                    'preco_venda': item.preco_custo_unitario * 1.5,
-                    'data_validade': item.data_validade,
-                    'quantidade': 0 # Começa com zero para somar abaixo
-                }
-            )
-            
-            # Atualizar custo médio ponderado
-            nova_qtd_total = estoque.quantidade + qtd_unidades_entrada
-            if not created and nova_qtd_total > 0:
-                custo_total = (estoque.quantidade * estoque.preco_custo) + (item.quantidade * item.preco_custo_unitario)
-                estoque.preco_custo = custo_total / nova_qtd_total
-            
+
+            chave = (item.produto_id, item.lote)
+            estoque = lotes.get(chave)
+            if estoque is None:
+                estoque = EstoqueProduto(
+                    farmacia=farmacia,
+                    produto=item.produto,
+                    lote=item.lote,
+                    preco_custo=item.preco_custo_unitario,
+                    preco_venda=item.preco_custo_unitario * Decimal('1.5'),
+                    data_validade=item.data_validade,
+                    quantidade=0 # Começa com zero para somar abaixo
+                )
+                lotes[chave] = novos[chave] = estoque
+            else:
+                # Atualizar custo médio ponderado
+                nova_qtd_total = estoque.quantidade + qtd_unidades_entrada
+                if nova_qtd_total > 0:
+                    custo_total = (estoque.quantidade * estoque.preco_custo) + (item.quantidade * item.preco_custo_unitario)
+                    estoque.preco_custo = (custo_total / nova_qtd_total).quantize(Decimal('0.01'))
+
+            saldos.append((item, estoque, qtd_unidades_entrada, estoque.quantidade))
             estoque.quantidade += qtd_unidades_entrada
-            if item.data_validade: 
+            if item.data_validade:
                 estoque.data_validade = item.data_validade
-            estoque.save()
-            
-            # 2. Gerar Kardex (Movimentação) com a quantidade real (unidades/carteiras)
-            MovimentacaoEstoque.objects.create(
+            estoque.data_atualizacao = agora
+
+        # 3. Gravação em massa: itens, lotes novos/existentes e kardex
+        ItemEntrada.objects.bulk_create(itens)
+        EstoqueProduto.objects.bulk_create(novos.values())
+        existentes = [estoque for chave, estoque in lotes.items() if chave not in novos]
+        EstoqueProduto.objects.bulk_update(
+            existentes, ['quantidade', 'preco_custo', 'data_validade', 'data_atualizacao']
+        )
+        MovimentacaoEstoque.objects.bulk_create([
+            MovimentacaoEstoque(
                 estoque=estoque,
                 tipo='ENTRADA',
                 quantidade=qtd_unidades_entrada,
-                quantidade_anterior=estoque.quantidade - qtd_unidades_entrada,
-                quantidade_nova=estoque.quantidade,
+                quantidade_anterior=quantidade_anterior,
+                quantidade_nova=quantidade_anterior + qtd_unidades_entrada,
                 custo_unitario=item.preco_custo_unitario,
                 usuario=request.user,
                 referencia_externa=f"Nota {entrada.numero_nota}",
                 motivo=f"Entrada NF - {item.quantidade} cx convertidas para {qtd_unidades_entrada} un"
-            )
+            ) for item, estoque, qtd_unidades_entrada, quantidade_anterior in saldos
+        ])
+
+        # bulk_create/bulk_update não disparam save()/signals: alertas, ofertas e cache do PDV
+        EstoqueProduto.registrar_alteracoes_em_massa(
+            [(estoque, None) for estoque in novos.values()] + [(estoque, anteriores[estoque.id]) for estoque in existentes]
+        )
 
         # Atualizar total da entrada se não foi passado ou for diferente
         entrada.valor_total = total_entrada
-        entrada.save()
+        entrada.save(update_fields=['valor_total'])
 
         # 3. Gerar Conta a Pagar (Financeiro)
         # Buscar categoria "Fornecedores" ou criar
@@ -250,4 +316,20 @@ class EntradaEstoqueSerializer(serializers.ModelSerializer):
             criado_por=request.user
         )
 
+        # A resposta lista os itens com o nome do produto: carrega-os de uma vez
+        prefetch_related_objects([entrada], Prefetch('itens', queryset=ItemEntrada.objects.select_related('produto')))
         return entrada
+
+
+class InventarioSerializer(serializers.ModelSerializer):
+    """Sessão de inventário (contagem física)."""
+    total_contagens = serializers.IntegerField(read_only=True)
+    criado_por_nome = serializers.CharField(source='criado_por.get_full_name', read_only=True)
+
+    class Meta:
+        model = Inventario
+        fields = (
+            'id', 'descricao', 'status', 'total_contagens', 'criado_por_nome',
+            'data_criacao', 'data_aplicacao'
+        )
+        read_only_fields = ('status', 'data_criacao', 'data_aplicacao')
@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from config.cache_http import marcar_alteracao
+from farmacias import painel
+from .models import CategoriaProduto, Produto, EstoqueProduto
+from . import autocomplete, ofertas, pdv, search
+
+
+@receiver(post_save, sender=Produto)
+def reindexar_produto(sender, instance, created, update_fields=None, **kwargs):
+    """Mantém o índice de busca atualizado quando um produto é salvo."""
+    if update_fields and not set(update_fields) & set(search.CAMPOS_BUSCA):
+        return
+    search.indexar_produtos([instance.pk])
+
+
+@receiver(post_delete, sender=Produto)
+def remover_produto_indice(sender, instance, **kwargs):
+    search.remover_do_indice(instance.pk)
+
+
+@receiver(post_save, sender=EstoqueProduto)
+@receiver(post_delete, sender=EstoqueProduto)
+def atualizar_oferta(sender, instance, **kwargs):
+    """Recalcula a oferta (produto x farmácia) do lote depois do commit."""
+    ofertas.agendar([(instance.produto_id, instance.farmacia_id)])
+
+
+@receiver(post_save, sender=EstoqueProduto)
+@receiver(post_delete, sender=EstoqueProduto)
+def invalidar_cache_pdv(sender, instance, **kwargs):
+    pdv.invalidar_farmacias([instance.farmacia_id])
+
+
+@receiver(post_save, sender=EstoqueProduto)
+@receiver(post_delete, sender=EstoqueProduto)
+def invalidar_painel(sender, instance, **kwargs):
+    painel.invalidar([instance.farmacia_id])
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+def invalidar_catalogo_pdv(sender, instance, **kwargs):
+    transaction.on_commit(pdv.invalidar_catalogo)
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+def atualizar_autocomplete(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not set(update_fields) & {'nome', 'nome_generico', 'concentracao', 'is_ativo'}:
+        return
+    autocomplete.registrar_mudanca(instance.pk)
+
+
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+@receiver(post_save, sender=CategoriaProduto)
+@receiver(post_delete, sender=CategoriaProduto)
+def renovar_cache_http(sender, **kwargs):
+    """Invalida os ETags do catálogo público (config.cache_http)."""
+    marcar_alteracao(sender)
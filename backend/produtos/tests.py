@@ -1,3 +1,202 @@
+import datetime
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+
+
+class PlanoConsultasTest(TestCase):
+    """As consultas dos endpoints críticos não podem ler tabelas quentes por inteiro."""
+
+    def test_consultas_usam_indices(self):
+        # verificar_planos levanta CommandError se algum EXPLAIN mostrar leitura completa
+        call_command('verificar_planos', farmacias=2, produtos=100, pedidos=500, stdout=StringIO())
+
+
+class ExpiracaoSaldosTest(TestCase):
+    """A baixa automática de lotes vencidos zera o lote, como a PERDA registada no kardex."""
+
+    def setUp(self):
+        from accounts.models import User
+        from farmacias.models import Farmacia
+        from .models import EstoqueProduto, Produto
+
+        usuario = User.objects.create_user(email='farmacia@teste.com', password='x', tipo_usuario='FARMACIA')
+        self.farmacia = Farmacia.objects.create(
+            usuario=usuario, nome='Farmácia Teste', nuit='123456789', telefone_principal='840000000',
+            email=usuario.email, endereco='-', bairro='-', cidade='Maputo', provincia='Maputo',
+            latitude=Decimal('-25.96'), longitude=Decimal('32.58'),
+        )
+        self.hoje = timezone.now().date()
+        self.lote = EstoqueProduto.objects.create(
+            farmacia=self.farmacia, produto=Produto.objects.create(nome='Amoxicilina 500mg', codigo_barras='560000000002'),
+            lote='V1', quantidade=7, preco_custo=Decimal('10'), preco_venda=Decimal('15'),
+            data_validade=self.hoje - datetime.timedelta(days=2),
+        )
+        EstoqueProduto.objects.filter(pk=self.lote.pk).update(
+            data_criacao=timezone.now() - datetime.timedelta(days=10)
+        )
+
+    def test_valorizacao_depois_da_expiracao(self):
+        from .saldos import valorizacao
+
+        call_command('verificar_validade', stdout=StringIO())
+
+        self.lote.refresh_from_db()
+        self.assertEqual((self.lote.quantidade, self.lote.is_disponivel), (0, False))
+
+        antes = valorizacao(self.farmacia.id, self.hoje - datetime.timedelta(days=5))
+        self.assertEqual(antes['total_quantidade'], 7)
+        self.assertEqual(antes['valor_total'], Decimal('70'))
+        self.assertEqual(valorizacao(self.farmacia.id, self.hoje)['total_quantidade'], 0)
+
+
+class CarimboCacheHttpTest(TestCase):
+    """O carimbo dos ETags do catálogo só é renovado depois do commit."""
+
+    def test_carimbo_renovado_apos_commit(self):
+        from django.core.cache import cache
+        from config.cache_http import _chave
+        from .models import Produto
+
+        cache.set(_chave(Produto), 1.0, None)
+        with self.captureOnCommitCallbacks(execute=True):
+            Produto.objects.create(nome='Ibuprofeno 400mg', codigo_barras='560000000003')
+            self.assertEqual(cache.get(_chave(Produto)), 1.0)
+        self.assertGreater(cache.get(_chave(Produto)), 1.0)
+
+
+class ImportacaoEstoqueTest(TestCase):
+    """Ficheiro ilegível é rejeitado; uma falha a meio devolve o relatório parcial com o bloco interrompido."""
+
+    def setUp(self):
+        from accounts.models import User
+        from farmacias.models import Farmacia
+        from .models import Produto
+
+        self.usuario = User.objects.create_user(email='farmacia@teste.com', password='x', tipo_usuario='FARMACIA')
+        self.farmacia = Farmacia.objects.create(
+            usuario=self.usuario, nome='Farmácia Teste', nuit='123456789', telefone_principal='840000000',
+            email=self.usuario.email, endereco='-', bairro='-', cidade='Maputo', provincia='Maputo',
+            latitude=Decimal('-25.96'), longitude=Decimal('32.58'),
+        )
+        self.usuario = User.objects.get(pk=self.usuario.pk)
+        Produto.objects.create(nome='Paracetamol 500mg', codigo_barras='560000000001')
+
+    def _csv(self, linhas):
+        texto = 'codigo_barras,quantidade,lote,preco_custo,preco_venda\n' + ''.join(
+            f'560000000001,{i + 1},L{i},10,15\n' for i in range(linhas)
+        )
+        return texto.encode()
+
+    def test_ficheiro_invalido(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from rest_framework.test import APIClient
+
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        resposta = cliente.post('/api/v1/produtos/meu-estoque/importar/', {
+            'arquivo': SimpleUploadedFile('estoque.xlsx', b'isto nao e um xlsx'),
+        }, format='multipart')
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_falha_na_gravacao_de_um_bloco(self):
+        from unittest import mock
+        from django.db import DatabaseError
+        from . import importacao
+        from .models import EstoqueProduto, MovimentacaoEstoque
+
+        original = MovimentacaoEstoque.objects.bulk_create
+        chamadas = []
+
+        def bulk_create(*args, **kwargs):
+            chamadas.append(1)
+            if len(chamadas) == 2:
+                raise DatabaseError('falha simulada')
+            return original(*args, **kwargs)
+
+        with mock.patch.object(MovimentacaoEstoque.objects, 'bulk_create', side_effect=bulk_create):
+            relatorio = importacao.importar(
+                self.farmacia, importacao.ler_linhas(BytesIO(self._csv(6)), 'estoque.csv'), tamanho_lote=2
+            )
+
+        self.assertEqual(relatorio['falha']['linha_inicial'], 4)
+        self.assertEqual((relatorio['processadas'], relatorio['criados']), (2, 2))
+        self.assertEqual(EstoqueProduto.objects.filter(farmacia=self.farmacia).count(), 2)
+
+    def test_ficheiro_corrompido_a_meio(self):
+        from . import importacao
+        from .models import EstoqueProduto
+
+        conteudo = self._csv(1000) + b'\xff\xfe,1\n'
+        relatorio = importacao.importar(
+            self.farmacia, importacao.ler_linhas(BytesIO(conteudo), 'estoque.csv'), tamanho_lote=100
+        )
+
+        self.assertIsNotNone(relatorio['falha'])
+        self.assertGreater(relatorio['criados'], 0)
+        self.assertEqual(EstoqueProduto.objects.filter(farmacia=self.farmacia).count(), relatorio['criados'])
+
+    def _importar(self, conteudo):
+        from . import importacao
+
+        return importacao.importar(self.farmacia, importacao.ler_linhas(BytesIO(conteudo), 'estoque.csv'))
+
+    def test_numeros_nao_finitos_sao_erro_da_linha(self):
+        conteudo = (
+            'codigo_barras,quantidade,lote,preco_custo,preco_venda\n'
+            '560000000001,nan,L1,10,15\n'
+            '560000000001,inf,L2,10,15\n'
+            '560000000001,1e999,L3,10,15\n'
+            '560000000001,5,L4,sNaN,15\n'
+            '560000000001,5,L5,10,-inf\n'
+            '560000000001,5,L6,10,15\n'
+        ).encode()
+        relatorio = self._importar(conteudo)
+
+        self.assertEqual([erro['linha'] for erro in relatorio['erros']], [2, 3, 4, 5, 6])
+        self.assertEqual(relatorio['criados'], 1)
+
+    def test_valores_fora_da_coluna_sao_erro_da_linha(self):
+        conteudo = (
+            'codigo_barras,quantidade,lote,preco_custo,preco_venda,localizacao\n'
+            '560000000001,2147483648,L1,10,15,\n'      # acima do PositiveIntegerField
+            '560000000001,5,L2,100000000,15,\n'        # acima de max_digits=10 (8 inteiros)
+            '560000000001,5,L3,10,99999999.999,\n'     # arredonda para 100000000.00
+            f'560000000001,5,{"X" * 51},10,15,\n'     # lote acima de max_length
+            '560000000001,2147483647,L5,99999999.99,15,A1\n'
+        ).encode()
+        relatorio = self._importar(conteudo)
+
+        self.assertEqual([erro['linha'] for erro in relatorio['erros']], [2, 3, 4, 5])
+        self.assertEqual(relatorio['criados'], 1)
+        self.assertIsNone(relatorio['falha'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY só existe no PostgreSQL')
+    def test_lotes_novos_por_copy(self):
+        from unittest import mock
+        from . import importacao
+        from .models import EstoqueProduto, MovimentacaoEstoque
+
+        conteudo = (
+            'codigo_barras,quantidade,lote,data_validade,preco_custo,preco_venda,localizacao\n'
+            '560000000001,5,L1,2027-01-31,10.5,15,"Prateleira 1, B"\n'
+            '560000000001,7,L2,,10,15,\n'
+        ).encode()
+        with mock.patch.object(importacao, '_copiar', wraps=importacao._copiar) as copiar:
+            relatorio = self._importar(conteudo)
 
-# Create your tests here.
+        copiar.assert_called_once()
+        self.assertEqual(relatorio['criados'], 2)
+        l1 = EstoqueProduto.objects.get(farmacia=self.farmacia, lote='L1')
+        self.assertEqual(
+            (l1.quantidade, l1.data_validade, l1.preco_custo, l1.localizacao_estoque),
+            (5, datetime.date(2027, 1, 31), Decimal('10.50'), 'Prateleira 1, B'),
+        )
+        self.assertIsNone(EstoqueProduto.objects.get(farmacia=self.farmacia, lote='L2').data_validade)
+        self.assertEqual(MovimentacaoEstoque.objects.filter(estoque__farmacia=self.farmacia, tipo='ENTRADA').count(), 2)
@@ -0,0 +1,42 @@
+"""
+Agrupamento de efeitos colaterais por transação.
+
+`agendar_pos_commit(chave, itens, callback)` acumula `itens` num conjunto
+associado à transação corrente e chama `callback(conjunto)` UMA vez, depois
+do commit. Fora de um bloco atômico o callback é executado imediatamente.
+
+Se a transação (ou o savepoint) em que o callback foi registado for desfeita,
+o conjunto pendente é descartado junto e recriado no próximo agendamento.
+"""
+from django.db import transaction
+
+
+def agendar_pos_commit(chave, itens, callback, using=None):
+    itens = set(itens)
+    if not itens:
+        return
+
+    conn = transaction.get_connection(using)
+    if not conn.in_atomic_block:
+        callback(itens)
+        return
+
+    pendentes = conn.__dict__.setdefault('_pos_commit_pendentes', {})
+    entrada = pendentes.get(chave)
+    if entrada is not None and not _registado(conn, entrada['flush']):
+        entrada = None  # Callback descartado por rollback
+
+    if entrada is None:
+        def flush():
+            dados = pendentes.pop(chave, None)
+            if dados:
+                callback(dados['itens'])
+
+        entrada = pendentes[chave] = {'itens': set(), 'flush': flush}
+        transaction.on_commit(flush, using=using)
+
+    entrada['itens'] |= itens
+
+
+def _registado(conn, func):
+    return any(registo[1] is func for registo in conn.run_on_commit)
@@ -2,17 +2,20 @@ from django.urls import path
 from .views import (
     CategoriaListView, ProdutoListView, ProdutoDetailView, 
     ProdutoDisponibilidadeView, EstoqueFarmaciaListView,
-    BuscaGlobalView
+    BuscaGlobalView, LeituraCodigoBarrasView, AutocompleteView, ImportacaoEstoqueView
 )
 
 urlpatterns = [
     # Gestão (Privado para Farmácias)
     path('meu-estoque/', EstoqueFarmaciaListView.as_view(), name='farmacia_estoque_list'),
+    path('meu-estoque/importar/', ImportacaoEstoqueView.as_view(), name='farmacia_estoque_importar'),
+    path('pdv/scan/', LeituraCodigoBarrasView.as_view(), name='pdv_scan'),
 
     # Catálogo (Público)
     path('categorias/', CategoriaListView.as_view(), name='categoria_list'),
     path('catalogo/', ProdutoListView.as_view(), name='produto_list'),
     path('catalogo/busca/', BuscaGlobalView.as_view(), name='produto_busca_global'),
+    path('catalogo/autocomplete/', AutocompleteView.as_view(), name='produto_autocomplete'),
     path('catalogo/<int:pk>/', ProdutoDetailView.as_view(), name='produto_detail'),
     path('catalogo/<int:pk>/disponibilidade/', ProdutoDisponibilidadeView.as_view(), name='produto_disponibilidade'),
 ]
@@ -20,7 +23,9 @@ urlpatterns = [
 from rest_framework.routers import DefaultRouter
 from .views import (
     EntradaEstoqueViewSet, AjusteEstoqueView, EstoqueHistoricoView, 
-    ReajustePrecoView, TransferenciaEstoqueView, MovimentacaoFarmaciaView
+    ReajustePrecoView, TransferenciaEstoqueView, MovimentacaoFarmaciaView,
+    InventarioListCreateView, InventarioContagemView, InventarioDiferencasView,
+    InventarioAplicarView, InventarioCancelarView, ValorizacaoEstoqueView
 )
 
 router = DefaultRouter()
@@ -32,4 +37,10 @@ urlpatterns += [
     path('transferencia/', TransferenciaEstoqueView.as_view(), name='estoque_transferencia'),
     path('meu-estoque/<int:pk>/historico/', EstoqueHistoricoView.as_view(), name='estoque_historico'),
     path('kardex/', MovimentacaoFarmaciaView.as_view(), name='kardex_global'),
+    path('valorizacao/', ValorizacaoEstoqueView.as_view(), name='estoque_valorizacao'),
+    path('inventarios/', InventarioListCreateView.as_view(), name='inventario_list'),
+    path('inventarios/<int:pk>/contagens/', InventarioContagemView.as_view(), name='inventario_contagens'),
+    path('inventarios/<int:pk>/diferencas/', InventarioDiferencasView.as_view(), name='inventario_diferencas'),
+    path('inventarios/<int:pk>/aplicar/', InventarioAplicarView.as_view(), name='inventario_aplicar'),
+    path('inventarios/<int:pk>/cancelar/', InventarioCancelarView.as_view(), name='inventario_cancelar'),
 ] + router.urls
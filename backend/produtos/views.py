@@ -2,72 +2,105 @@ from rest_framework import generics, permissions, filters, status, serializers,
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import CategoriaProduto, Produto, EstoqueProduto
+from .models import CategoriaProduto, Produto, EstoqueProduto, OfertaProduto
 from .serializers import (
     CategoriaProdutoSerializer, ProdutoSerializer, 
     CategoriaProdutoSerializer, ProdutoSerializer, 
     EstoqueFarmaciaSerializer, EstoqueGestaoSerializer,
     BuscaGlobalSerializer
 )
-from django.db.models import Q
 from django.utils import timezone
+from config.cache_http import CacheCondicionalMixin
+from config.pagination import PaginacaoCursorOpcional
+from farmacias.geo import aplicar_filtro_geografico
+from . import search
 
 class BuscaGlobalView(generics.ListAPIView):
     """
     Busca pública de medicamentos em todas as farmácias.
+    Lê a projeção OfertaProduto (uma linha por produto x farmácia).
     Query params:
-        q: termo de busca (nome do produto ou genérico)
+        q: termo de busca (nome do produto, genérico, fabricante ou descrição),
+           ordenado por relevância via produtos.search
+        lat, lng, raio_km: limita às farmácias próximas (farmacias.geo)
+        entrega: 'true' para apenas farmácias que entregam no ponto
     """
     serializer_class = BuscaGlobalSerializer
     permission_classes = (permissions.AllowAny,)
     
+    def get_farmacias_prioritarias(self):
+        # Conjunto em cache, lido uma vez por request (view + serializer)
+        if not hasattr(self, '_farmacias_prioritarias'):
+            from prioridade.cache import farmacias_prioritarias
+            self._farmacias_prioritarias = farmacias_prioritarias()
+        return self._farmacias_prioritarias
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['farmacias_prioritarias'] = self.get_farmacias_prioritarias()
+        return context
+
     def get_queryset(self):
         from django.db.models import Case, When, Value, IntegerField
-        from prioridade.models import AssinaturaPrioridade
-        from django.utils import timezone
         
-        # Buscar farmácias com prioridade ativa
-        farmacias_prioritarias = AssinaturaPrioridade.objects.filter(
-            status='ATIVA',
-            data_fim__gte=timezone.now()
-        ).values_list('farmacia_id', flat=True)
+        farmacias_prioritarias = self.get_farmacias_prioritarias()
         
-        queryset = EstoqueProduto.objects.filter(
-            quantidade__gt=0,
-            is_disponivel=True,
+        queryset = OfertaProduto.objects.filter(
             farmacia__is_ativa=True,
             produto__is_ativo=True
         ).select_related('produto', 'farmacia', 'produto__categoria')
         
         termo = self.request.query_params.get('q', None)
+        ordenacao = ['tem_prioridade', 'preco_final']
         if termo:
-            queryset = queryset.filter(
-                Q(produto__nome__icontains=termo) | 
-                Q(produto__nome_generico__icontains=termo) |
-                Q(produto__descricao__icontains=termo)
-            )
+            # Índice textual (tsvector/trigramas no Postgres, FTS5 no SQLite)
+            queryset = search.filtrar_por_termo(queryset, termo)
+            ordenacao.insert(1, '-relevancia')
         
-        # Ordenar: 1) Farmácias com prioridade, 2) Resto, 3) Por preço
-        queryset = queryset.annotate(
-            tem_prioridade=Case(
-                When(farmacia_id__in=farmacias_prioritarias, then=Value(0)),
+        # Filtro por proximidade (?lat=&lng=&raio_km=)
+        queryset, com_distancia = aplicar_filtro_geografico(queryset, self.request, prefixo='farmacia__')
+        if com_distancia:
+            ordenacao.insert(-1, 'distancia')
+        
+        # Ordenar: 1) Farmácias com prioridade, 2) Relevância, 3) Distância, 4) Por preço
+        if farmacias_prioritarias:
+            tem_prioridade = Case(
+                When(farmacia_id__in=list(farmacias_prioritarias), then=Value(0)),
                 default=Value(1),
                 output_field=IntegerField()
             )
-        ).order_by('tem_prioridade', 'preco_venda')
+        else:
+            tem_prioridade = Value(1, output_field=IntegerField())
+        queryset = queryset.annotate(tem_prioridade=tem_prioridade).order_by(*ordenacao)
         
         return queryset
 
 
-class CategoriaListView(generics.ListAPIView):
-    """Lista todas as categorias ativas."""
+class AutocompleteView(APIView):
+    """
+    Sugestões para a caixa de busca: GET ?q=<prefixo>.
+    Até 10 produtos por prefixo do nome ou do genérico, sem acentos (produtos.autocomplete).
+    """
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request):
+        from . import autocomplete
+
+        return Response(autocomplete.sugerir(request.query_params.get('q', '')))
+
+
+class CategoriaListView(CacheCondicionalMixin, generics.ListAPIView):
+    """Lista todas as categorias ativas (com ETag/304)."""
+    modelos_cache = (CategoriaProduto,)
+    max_age_cache = 300
     queryset = CategoriaProduto.objects.filter(is_ativa=True).order_by('ordem', 'nome')
     serializer_class = CategoriaProdutoSerializer
     permission_classes = (permissions.AllowAny,)
 
 
-class ProdutoListView(generics.ListCreateAPIView):
-    """Lista o catálogo global de produtos ou adiciona novo."""
+class ProdutoListView(CacheCondicionalMixin, generics.ListCreateAPIView):
+    """Lista o catálogo global de produtos (com ETag/304) ou adiciona novo."""
+    modelos_cache = (Produto, CategoriaProduto)
     queryset = Produto.objects.filter(is_ativo=True)
     serializer_class = ProdutoSerializer
     permission_classes = (permissions.AllowAny,)
@@ -77,8 +110,9 @@ class ProdutoListView(generics.ListCreateAPIView):
     ordering_fields = ('nome', 'fabricante')
 
 
-class ProdutoDetailView(generics.RetrieveUpdateAPIView):
-    """Detalhes e Atualização de um produto."""
+class ProdutoDetailView(CacheCondicionalMixin, generics.RetrieveUpdateAPIView):
+    """Detalhes (com ETag/304) e Atualização de um produto."""
+    modelos_cache = (Produto, CategoriaProduto)
     queryset = Produto.objects.all()
     serializer_class = ProdutoSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
@@ -88,19 +122,23 @@ class ProdutoDisponibilidadeView(generics.ListAPIView):
     """
     Lista em quais farmácias um produto específico está disponível (com preço).
     Útil para o marketplace: "Onde encontrar este remédio?"
+    Aceita ?lat=&lng=&raio_km= (e ?entrega=true) para ordenar por distância.
     """
     serializer_class = EstoqueFarmaciaSerializer
     permission_classes = (permissions.AllowAny,)
     
     def get_queryset(self):
         produto_id = self.kwargs.get('pk')
-        # Retorna apenas estoques com quantidade > 0 e de farmácias ativas
-        return EstoqueProduto.objects.filter(
+        # Uma oferta por farmácia ativa (só existem ofertas com estoque vendável)
+        queryset = OfertaProduto.objects.filter(
             produto_id=produto_id,
-            quantidade__gt=0,
-            is_disponivel=True,
             farmacia__is_ativa=True
-        ).select_related('farmacia')
+        ).select_related('farmacia', 'produto').order_by('preco_final', 'id')
+        
+        queryset, com_distancia = aplicar_filtro_geografico(queryset, self.request, prefixo='farmacia__')
+        if com_distancia:
+            queryset = queryset.order_by('distancia', 'preco_final')
+        return queryset
 
 
 class EstoqueFarmaciaListView(generics.ListCreateAPIView):
@@ -116,7 +154,9 @@ class EstoqueFarmaciaListView(generics.ListCreateAPIView):
     def get_queryset(self):
         # Filtra pelo usuário logado que deve ser dono de uma farmácia
         if hasattr(self.request.user, 'farmacia'):
-            return EstoqueProduto.objects.filter(farmacia=self.request.user.farmacia)
+            return EstoqueProduto.objects.filter(
+                farmacia=self.request.user.farmacia
+            ).select_related('produto')
         return EstoqueProduto.objects.none()
 
     def post(self, request, *args, **kwargs):
@@ -135,6 +175,61 @@ class EstoqueFarmaciaListView(generics.ListCreateAPIView):
         else:
             raise serializers.ValidationError("Usuário não possui farmácia vinculada.")
 
+class LeituraCodigoBarrasView(APIView):
+    """
+    Leitura de código de barras no PDV: GET ?codigo=<código exato>.
+    Retorna o produto e os lotes vendáveis da farmácia logada em ordem FEFO
+    (cache por farmácia em produtos.pdv).
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request):
+        from . import pdv
+
+        farmacia = request.user.farmacia
+        if not farmacia:
+            return Response({'error': 'Usuário não possui farmácia vinculada.'}, status=status.HTTP_403_FORBIDDEN)
+
+        codigo = (request.query_params.get('codigo') or '').strip()
+        if not codigo:
+            return Response({'error': 'Informe o código de barras.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        resultado = pdv.escanear(farmacia.id, codigo)
+        if resultado is None:
+            return Response({'error': 'Produto não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(resultado)
+
+
+class ImportacaoEstoqueView(APIView):
+    """
+    Importação em massa do estoque da farmácia logada: POST multipart com
+    `arquivo` (.csv ou .xlsx). Responde com o relatório por linha (produtos.importacao);
+    se a importação parar a meio, `falha` indica o bloco interrompido.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request):
+        from . import importacao
+
+        farmacia = request.user.farmacia
+        if not farmacia:
+            return Response({'error': 'Usuário não possui farmácia vinculada.'}, status=status.HTTP_403_FORBIDDEN)
+
+        arquivo = request.FILES.get('arquivo')
+        if not arquivo:
+            return Response({'error': 'Envie o ficheiro no campo "arquivo".'}, status=status.HTTP_400_BAD_REQUEST)
+        if not arquivo.name.lower().endswith(('.csv', '.txt', '.xlsx', '.xlsm')):
+            return Response({'error': 'Formato não suportado. Use CSV ou XLSX.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            relatorio = importacao.importar(
+                farmacia, importacao.ler_linhas(arquivo, arquivo.name), usuario=request.user
+            )
+        except importacao.ArquivoInvalido as e:
+            return Response({'error': f'Ficheiro inválido: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(relatorio)
+
+
 class EstoqueFarmaciaDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Visualiza, atualiza e remove um item do estoque da farmácia."""
     serializer_class = EstoqueGestaoSerializer
@@ -393,8 +488,13 @@ class TransferenciaEstoqueView(APIView):
             return Response({'error': str(e)}, status=500)
 
 class MovimentacaoFarmaciaView(generics.ListAPIView):
-    """Lista TODAS as movimentações de estoque da farmácia (Kardex Global)."""
+    """
+    Lista TODAS as movimentações de estoque da farmácia (Kardex Global).
+    `?cursor=` ativa a paginação por keyset (data_movimentacao, id).
+    """
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PaginacaoCursorOpcional
+    ordenacao_cursor = ('-data_movimentacao', '-id')
     filter_backends = (filters.SearchFilter, filters.OrderingFilter)
     search_fields = ('estoque__produto__nome', 'motivo', 'referencia_externa')
     ordering = ('-data_movimentacao',)
@@ -420,3 +520,129 @@ class MovimentacaoFarmaciaView(generics.ListAPIView):
                     'motivo', 'usuario_nome'
                 )
         return KardexGlobalSerializer
+
+
+class ValorizacaoEstoqueView(APIView):
+    """
+    Valorização do estoque a custo no fim de um dia (fecho de ano, balanço):
+    GET ?data=AAAA-MM-DD[&produto=<id>]. Usa os fechos de produtos.saldos.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        import datetime
+        from . import saldos
+
+        farmacia = request.user.farmacia
+        if not farmacia:
+            return Response({'error': 'Usuário não possui farmácia vinculada.'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            data = datetime.date.fromisoformat(request.query_params.get('data', ''))
+            produto_id = int(request.query_params['produto']) if request.query_params.get('produto') else None
+        except ValueError:
+            return Response({'error': 'Parâmetros inválidos. Use ?data=AAAA-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+        if data > timezone.localdate():
+            return Response({'error': 'A data não pode ser futura.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(saldos.valorizacao(farmacia.id, data, produto_id))
+
+
+# --- Inventário (contagem física) ---
+
+class InventarioListCreateView(generics.ListCreateAPIView):
+    """Lista ou abre sessões de inventário da farmácia logada."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_serializer_class(self):
+        from .serializers import InventarioSerializer
+        return InventarioSerializer
+
+    def get_queryset(self):
+        from django.db.models import Count
+        from .models import Inventario
+        return Inventario.objects.filter(
+            farmacia=self.request.user.farmacia
+        ).select_related('criado_por').annotate(total_contagens=Count('contagens')).order_by('-data_criacao')
+
+    def perform_create(self, serializer):
+        if not self.request.user.farmacia:
+            raise serializers.ValidationError("Usuário não possui farmácia vinculada.")
+        serializer.save(farmacia=self.request.user.farmacia, criado_por=self.request.user)
+
+
+class InventarioContagemView(APIView):
+    """
+    POST {"contagens": [{"estoque_id": 1, "quantidade": 10, "motivo": "..."}, ...]}
+    Grava (ou corrige) contagens em massa; pode ser chamado várias vezes durante a contagem.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        from . import inventario as servico
+        from .models import Inventario
+
+        try:
+            sessao = Inventario.objects.get(pk=pk, farmacia=request.user.farmacia)
+        except Inventario.DoesNotExist:
+            return Response({'error': 'Inventário não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+        contagens = request.data.get('contagens')
+        if not isinstance(contagens, list) or not contagens:
+            return Response({'error': 'Envie a lista "contagens".'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            gravadas, erros = servico.registrar_contagens(sessao, contagens, request.user)
+        except servico.InventarioInvalido as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'gravadas': gravadas, 'erros': erros})
+
+
+class InventarioDiferencasView(APIView):
+    """Prévia das divergências (contado x sistema) antes de aplicar. `?todos=true` inclui lotes sem divergência."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        from . import inventario as servico
+        from .models import Inventario
+
+        try:
+            sessao = Inventario.objects.get(pk=pk, farmacia=request.user.farmacia)
+        except Inventario.DoesNotExist:
+            return Response({'error': 'Inventário não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+        todos = request.query_params.get('todos') == 'true'
+        return Response({
+            'status': sessao.status,
+            'resumo': servico.resumo(sessao),
+            'diferencas': list(servico.diferencas(sessao, apenas_divergencias=not todos)),
+        })
+
+
+class InventarioAplicarView(APIView):
+    """Aplica todas as contagens numa única transação (estoque, kardex e perdas no financeiro)."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        from . import inventario as servico
+
+        try:
+            resultado = servico.aplicar(pk, request.user.farmacia, request.user)
+        except servico.InventarioInvalido as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resultado)
+
+
+class InventarioCancelarView(APIView):
+    """Cancela uma sessão de inventário aberta (as contagens ficam, nada é ajustado)."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        from .models import Inventario
+
+        alterados = Inventario.objects.filter(
+            pk=pk, farmacia=request.user.farmacia, status=Inventario.StatusInventario.ABERTO
+        ).update(status=Inventario.StatusInventario.CANCELADO)
+        if not alterados:
+            return Response({'error': 'Inventário não encontrado ou já encerrado.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': Inventario.StatusInventario.CANCELADO})
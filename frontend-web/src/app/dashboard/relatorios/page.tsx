@@ -66,7 +66,16 @@ export default function RelatoriosPage() {
         try {
             toast.info('Gerando relatório PDF...');
 
-            const response = await api.get('/pedidos/relatorios/vendas-pdf/', {
+            // Geração em segundo plano: pede o relatório e consulta o estado até ficar pronto
+            let job = (await api.post('/pedidos/relatorios/vendas-pdf/', {})).data;
+            for (let tentativa = 0; job.status !== 'CONCLUIDO' && tentativa < 120; tentativa++) {
+                if (job.status === 'ERRO') throw new Error(job.erro);
+                await new Promise((resolve) => setTimeout(resolve, 1000));
+                job = (await api.get(`/pedidos/relatorios/${job.id}/`)).data;
+            }
+            if (job.status !== 'CONCLUIDO') throw new Error('Tempo esgotado a gerar o relatório');
+
+            const response = await api.get(`/pedidos/relatorios/${job.id}/download/`, {
                 responseType: 'blob',
             });
 
@@ -244,7 +253,7 @@ export default function RelatoriosPage() {
                         </div>
                     </div>
                     <p className="text-xs font-black text-gray-400 uppercase tracking-widest">Transações</p>
-                    <h2 className="text-3xl font-black text-gray-900 mt-1">{report?.transacoes?.length || 0}</h2>
+                    <h2 className="text-3xl font-black text-gray-900 mt-1">{report?.transacoes_total ?? report?.transacoes?.length ?? 0}</h2>
                     <p className="text-[10px] text-gray-400 mt-1">Movimentos totais</p>
                 </div>
             </div>
@@ -361,7 +370,7 @@ export default function RelatoriosPage() {
                         Fluxo de Caixa Detalhado
                     </h3>
                     <span className="text-xs font-bold text-gray-500 bg-gray-100 px-3 py-1 rounded-full">
-                        {report?.transacoes?.length || 0} movimentos
+                        {report?.transacoes_total ?? report?.transacoes?.length ?? 0} movimentos
                     </span>
                 </div>
 